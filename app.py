@@ -1,11 +1,34 @@
 import streamlit as st
 import pandas as pd
 import math
-from math import radians, sin, cos, sqrt, atan2, degrees
-from pyproj import Transformer, CRS
-import re
-import io
+from math import radians, sin, cos
+from fss_survey import (
+    DSM_LCC_ZONES, ENHANCED_KALIANPUR_ZONES, WGS84_ZONES,
+    distance_3d, bearing_grid,
+    format_bearing, decimal_to_dms, dms_to_decimal,
+    detect_kalianpur_zone, detect_dsm_zone,
+)
+from fss_survey.dms_arrays import format_dms_array, parse_dms_array
+from fss_survey.zone_index import detect_kalianpur_zones
+from fss_survey import metrics, points
+from fss_survey.crs_pool import get_pool, start_warmup
+from fss_survey.memo import get_result_cache
+from fss_survey.batch import (
+    PREVIEW_ROWS, DEFAULT_CHUNK_SIZE, GRID_DSM, GRID_ESM, ROUTING_AUTO, ROUTING_COLUMN, ROUTING_FIXED,
+    dsm_to_esm_frame, esm_to_dsm_frame, grid_to_latlon_frame, input_columns, stream_table, zone_stats_frame,
+)
+from fss_survey.jobs import ACTIVE_STATUSES, RESUMABLE_STATUSES, STATUS_DONE, get_job_manager
+from fss_survey.formats import EXTENSIONS, FORMATS, MIME_TYPES, SUFFIXES, format_from_name, frame_bytes, open_output, read_frame
+from fss_survey.parallel import DEFAULT_WORKERS, parallel_grid_to_latlon_frame, parallel_stream_table
+from fss_survey.store import STORE_SUFFIX, import_points, remove_store, store_dir
+from fss_survey.traverse import ADJUST_BOWDITCH, ADJUST_TRANSIT, stream_traverse
+from fss_survey.control import ControlPoints
+from fss_survey.geodesic import ELLIPSOID_WGS84, ELLIPSOIDS, METHOD_ELLIPSOIDAL, METHOD_SPHERICAL
+from fss_survey.lattice import LatticePool, flag_values, refine_frame
+from fss_survey.parcels import CLOSURE_TOLERANCE, DEFAULT_PARCEL_COL, parcel_frames, parcel_summary
 import os
+import tempfile
+import time
 
 # ==========================================
 # 0. PATH SETUP (Fix for missing images)
@@ -16,17 +39,30 @@ logo_path = os.path.join(current_dir, "FSS Logo.png")
 icon_path = os.path.join(current_dir, "icon.ico")
 result_img_path = os.path.join(current_dir, "result.jpg")
 
+@st.cache_resource(show_spinner=False)
+def static_asset(path):
+    # Read once per server process rather than on every rerun; None if missing
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
 # ==========================================
 # 1. CONFIGURATION & CONSTANTS
 # ==========================================
 
 st.set_page_config(
     page_title="FSS Survey Calculator",
-    page_icon=icon_path if os.path.exists(icon_path) else None, # Uses the .ico file
+    page_icon=icon_path if static_asset(icon_path) else None, # Uses the .ico file
     layout="wide",
     initial_sidebar_state="expanded"
 )
 
+# Builds every zone's CRS/transformers in the background, once per server process
+start_warmup()
+# Whole-rerun time, reported per tab in the Metrics panel when FSS_METRICS is set
+render_start = time.perf_counter()
+
 # Custom CSS to mimic the Kivy app's style
 st.markdown("""
     <style>
@@ -56,58 +92,26 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- ZONE DEFINITIONS (Ported exactly from Kivy App) ---
-
-ENHANCED_KALIANPUR_ZONES = {
-    'Zone I': {'epsg': 24378, 'bounds': {'lat_min': 28.0, 'lat_max': 35.51, 'lon_min': 70.35, 'lon_max': 81.64}, 'description': 'Northern India (J&K, HP, Punjab, Haryana, Uttarakhand, North UP)', 'central_meridian': 78.0},
-    'Zone IIa': {'epsg': 24379, 'bounds': {'lat_min': 21.0, 'lat_max': 28.01, 'lon_min': 68.13, 'lon_max': 82.01}, 'description': 'Northwest India (Rajasthan, Gujarat, West MP, South UP)', 'central_meridian': 75.0},
-    'Zone IIb': {'epsg': 24380, 'bounds': {'lat_min': 21.0, 'lat_max': 29.47, 'lon_min': 82.0, 'lon_max': 97.42}, 'description': 'Northeast India (Assam, Meghalaya, Manipur, Mizoram)', 'central_meridian': 90.0},
-    'Zone IIIa': {'epsg': 24381, 'bounds': {'lat_min': 15.0, 'lat_max': 21.01, 'lon_min': 70.14, 'lon_max': 87.15}, 'description': 'Central India (Maharashtra, East MP, Chhattisgarh)', 'central_meridian': 78.0},
-    'Zone IIIb': {'epsg': 24382, 'bounds': {'lat_min': 15.0, 'lat_max': 21.01, 'lon_min': 87.15, 'lon_max': 97.42}, 'description': 'East Central India (Jharkhand, Odisha, East Bengal)', 'central_meridian': 92.0},
-    'Zone IVa': {'epsg': 24383, 'bounds': {'lat_min': 8.02, 'lat_max': 15.01, 'lon_min': 73.94, 'lon_max': 80.4}, 'description': 'Southwest India (Karnataka, Kerala, Tamil Nadu West)', 'central_meridian': 77.0},
-    'Zone IVb': {'epsg': 24384, 'bounds': {'lat_min': 8.02, 'lat_max': 15.01, 'lon_min': 80.4, 'lon_max': 87.18}, 'description': 'Southeast India (Andhra Pradesh, Tamil Nadu East)', 'central_meridian': 84.0},
-    'Zone Va': {'epsg': 24385, 'bounds': {'lat_min': 5.0, 'lat_max': 8.02, 'lon_min': 73.94, 'lon_max': 80.4}, 'description': 'Far South India (South Kerala, South Tamil Nadu)', 'central_meridian': 77.0},
-    'Zone Vb': {'epsg': 24386, 'bounds': {'lat_min': 5.0, 'lat_max': 8.02, 'lon_min': 80.4, 'lon_max': 87.18}, 'description': 'Far Southeast India (South Tamil Nadu, South Andhra)', 'central_meridian': 84.0}
-}
-
-DSM_LCC_ZONES = {
-    "5C": {"epsg": 2001, "extent": (68.00, 36.00, 76.00, 42.00)}, "5D": {"epsg": 2007, "extent": (68.00, 30.00, 76.00, 36.00)},
-    "5E": {"epsg": 2013, "extent": (68.00, 24.00, 76.00, 30.00)}, "5F": {"epsg": 2019, "extent": (68.00, 18.00, 76.00, 24.00)},
-    "5G": {"epsg": 2025, "extent": (68.00, 12.00, 76.00, 18.00)}, "5H": {"epsg": 2031, "extent": (68.00, 6.00, 76.00, 12.00)},
-    "6C": {"epsg": 2002, "extent": (76.00, 36.00, 84.00, 42.00)}, "6D": {"epsg": 2008, "extent": (76.00, 30.00, 84.00, 36.00)},
-    "6E": {"epsg": 2014, "extent": (76.00, 24.00, 84.00, 30.00)}, "6F": {"epsg": 2020, "extent": (76.00, 18.00, 84.00, 24.00)},
-    "6G": {"epsg": 2026, "extent": (76.00, 12.00, 84.00, 18.00)}, "6H": {"epsg": 2032, "extent": (76.00, 6.00, 84.00, 12.00)},
-    "7C": {"epsg": 2003, "extent": (84.00, 36.00, 92.00, 42.00)}, "7D": {"epsg": 2009, "extent": (84.00, 30.00, 92.00, 36.00)},
-    "7E": {"epsg": 2015, "extent": (84.00, 24.00, 92.00, 30.00)}, "7F": {"epsg": 2021, "extent": (84.00, 18.00, 92.00, 24.00)},
-    "7G": {"epsg": 2027, "extent": (84.00, 12.00, 92.00, 18.00)}, "7H": {"epsg": 2033, "extent": (84.00, 6.00, 92.00, 12.00)},
-    "8C": {"epsg": 2004, "extent": (92.00, 36.00, 100.00, 42.00)}, "8D": {"epsg": 2010, "extent": (92.00, 30.00, 100.00, 36.00)},
-    "8E": {"epsg": 2016, "extent": (92.00, 24.00, 100.00, 30.00)}, "8F": {"epsg": 2022, "extent": (92.00, 18.00, 100.00, 24.00)},
-    "8G": {"epsg": 2028, "extent": (92.00, 12.00, 100.00, 18.00)}, "8H": {"epsg": 2034, "extent": (92.00, 6.00, 100.00, 12.00)},
-}
-
-WGS84_ZONES = {
-    'India Northeast': {'epsg': 7771, 'bounds': {'lat_min': 21.94, 'lat_max': 29.47, 'lon_min': 89.69, 'lon_max': 97.42}},
-    'India NSF LCC': {'epsg': 7755, 'bounds': {'lat_min': 3.87, 'lat_max': 35.51, 'lon_min': 65.6, 'lon_max': 97.42}},
-    'Uttar Pradesh': {'epsg': 7775, 'bounds': {'lat_min': 25.0, 'lat_max': 31.5, 'lon_min': 78.0, 'lon_max': 84.0}},
-    'Kerala': {'epsg': 7781, 'bounds': {'lat_min': 8.0, 'lat_max': 13.0, 'lon_min': 74.0, 'lon_max': 77.0}},
-    'Lakshadweep': {'epsg': 7782, 'bounds': {'lat_min': 10.0, 'lat_max': 13.0, 'lon_min': 71.0, 'lon_max': 74.0}},
-    'Tamil Nadu': {'epsg': 7785, 'bounds': {'lat_min': 8.02, 'lat_max': 13.59, 'lon_min': 76.22, 'lon_max': 80.4}},
-    'Jammu and Kashmir': {'epsg': 7764, 'bounds': {'lat_min': 32.0, 'lat_max': 37.0, 'lon_min': 73.0, 'lon_max': 78.0}},
-    'Gujarat': {'epsg': 7761, 'bounds': {'lat_min': 20.0, 'lat_max': 24.0, 'lon_min': 68.0, 'lon_max': 74.0}},
-    'Maharashtra': {'epsg': 7767, 'bounds': {'lat_min': 17.0, 'lat_max': 22.0, 'lon_min': 72.0, 'lon_max': 80.0}},
-}
-
-DSM_PARAMS = {
-    "5": {"central_meridian": 72, "latitude_of_origin": 4, "false_easting": 500000, "false_northing": -2010760, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"},
-    "6": {"central_meridian": 80, "latitude_of_origin": 4, "false_easting": 500010, "false_northing": -2010750, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"},
-    "7": {"central_meridian": 88, "latitude_of_origin": 4, "false_easting": 500000, "false_northing": -2010760, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"},
-    "8": {"central_meridian": 96, "latitude_of_origin": 4, "false_easting": 500000, "false_northing": -2010760, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"}
-}
+# Zone tables and all geodesy live in the headless fss_survey package
 
 # ==========================================
 # 2. HELPER FUNCTIONS
 # ==========================================
 
+def new_batch_output_path(suffix=".csv", state_key="batch_output_path"):
+    # One temp file per session and tool; the previous run's output is discarded
+    old_path = st.session_state.get(state_key)
+    if old_path and os.path.exists(old_path):
+        os.remove(old_path)
+    fd, path = tempfile.mkstemp(prefix="fss_batch_", suffix=suffix)
+    os.close(fd)
+    st.session_state[state_key] = path
+    return path
+
+def read_file_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
 def validate_input(input_str):
     if not input_str or str(input_str).strip() == "":
         return None
@@ -116,95 +120,171 @@ def validate_input(input_str):
     except ValueError:
         return None
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    lat1_rad, lon1_rad = radians(lat1), radians(lon1)
-    lat2_rad, lon2_rad = radians(lat2), radians(lon2)
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    a = sin(dlat / 2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return round(R * c, 3)
-
-def bearing_latlon(lat1, lon1, lat2, lon2):
-    lat1_rad, lon1_rad = radians(lat1), radians(lon1)
-    lat2_rad, lon2_rad = radians(lat2), radians(lon2)
-    dlon = lon2_rad - lon1_rad
-    x = sin(dlon) * cos(lat2_rad)
-    y = cos(lat1_rad) * sin(lat2_rad) - sin(lat1_rad) * cos(lat2_rad) * cos(dlon)
-    bearing_rad = atan2(x, y)
-    bearing_deg = degrees(bearing_rad)
-    bearing_deg = (bearing_deg + 360) % 360
-    return round(bearing_deg, 2)
-
-def format_bearing(bearing_deg):
-    degrees_part = int(bearing_deg)
-    minutes_float = (bearing_deg - degrees_part) * 60
-    minutes_part = int(minutes_float)
-    seconds_part = round((minutes_float - minutes_part) * 60, 1)
-    return f"{degrees_part}°{minutes_part}'{seconds_part}\""
-
-def decimal_to_dms(decimal_degrees, coord_type):
-    abs_degrees = abs(decimal_degrees)
-    degrees = int(abs_degrees)
-    minutes_float = (abs_degrees - degrees) * 60
-    minutes = int(minutes_float)
-    seconds = (minutes_float - minutes) * 60
-    if coord_type == 'lat':
-        direction = 'N' if decimal_degrees >= 0 else 'S'
+def parallel_summary(timing):
+    return (f"{timing['workers']} worker(s), {timing['shards']} chunk(s): {timing['wall_seconds']:.2f} s wall, "
+            f"{timing['busy_seconds']:.2f} s CPU in workers, {timing['parallelism']:.1f} workers busy on average "
+            f"(an estimate of the speedup, not timed against one process)")
+
+@st.cache_resource(show_spinner="Loading interpolation lattices...", max_entries=4)
+def batch_lattice_pool(tolerance_m):
+    """Lattice pool for Batch Process's approximate mode; lattices load on first use of a zone."""
+    return LatticePool(tolerance_m=tolerance_m)
+
+@st.cache_resource(show_spinner="Importing into a point store...", max_entries=4, scope="session",
+                   on_release=lambda store: remove_store(store.path))
+def batch_point_store(file_id, _uploaded, input_format):
+    """Point store for one upload, imported once and memory-mapped by reruns.
+
+    The store is deleted from disk when its entry is evicted or the session ends.
+    """
+    _uploaded.seek(0)
+    return import_points(_uploaded, os.path.join(store_dir(), file_id + STORE_SUFFIX), input_format)
+
+def lattice_summary(pool, refined):
+    st.caption(f"Approximate mode: lattice error per zone pair (\"exact\" pairs exceed the max error), "
+               f"{refined:,} row(s) refined exactly")
+    errors = pd.DataFrame(pool.errors(), columns=["source", "target", "interpolation", "nodes", "error_m"])
+    st.dataframe(errors)
+
+def zone_routing_inputs(grid, key):
+    """Source-zone routing widgets; returns ``routing``/``zone``/``zone_col`` keyword arguments."""
+    routing_labels = {"Fixed zone": ROUTING_FIXED, "Zone column": ROUTING_COLUMN}
+    if grid == GRID_ESM:
+        routing_labels["Auto-detect (back-projection)"] = ROUTING_AUTO
+    routing = routing_labels[st.selectbox("Zone Routing", list(routing_labels), key=f"{key}_routing", persist_state="session")]
+    
+    zone, zone_col = None, "zone"
+    if routing == ROUTING_FIXED:
+        zone_choices = list(ENHANCED_KALIANPUR_ZONES.keys()) if grid == GRID_ESM else list(DSM_LCC_ZONES.keys())
+        zone = st.selectbox("Zone", zone_choices, key=f"{key}_zone_{grid}", persist_state="session")
+    elif routing == ROUTING_COLUMN:
+        zone_col = st.text_input("Zone column", "zone", key=f"{key}_zone_col", persist_state="session",
+                                 help="Zone name (Zone IIa / IIa), EPSG code, or DSM sheet (6E) per row")
     else:
-        direction = 'E' if decimal_degrees >= 0 else 'W'
-    return f"{degrees}°{minutes}'{seconds:.2f}\"{direction}"
-
-def dms_to_decimal(dms_str):
-    pattern = r"(\d+)°(\d+)'(\d+(?:\.\d+)?)\"?([NSEW])"
-    match = re.match(pattern, dms_str.strip())
-    if not match:
-        raise ValueError(f"Invalid DMS format: {dms_str}")
-    degrees, minutes, seconds, hemisphere = match.groups()
-    decimal = float(degrees) + float(minutes) / 60 + float(seconds) / 3600
-    if hemisphere in ['S', 'W']:
-        decimal = -decimal
-    return decimal
-
-def detect_kalianpur_zone(lat, lon):
-    for zone_name, zone_info in ENHANCED_KALIANPUR_ZONES.items():
-        bounds = zone_info['bounds']
-        if bounds['lat_min'] <= lat <= bounds['lat_max'] and bounds['lon_min'] <= lon <= bounds['lon_max']:
-            return zone_name, zone_info['epsg'], zone_info['description']
-    return None, None, None
-
-def detect_dsm_zone(lat, lon):
-    for zone_name, zone_info in DSM_LCC_ZONES.items():
-        extent = zone_info['extent']
-        if extent[1] <= lat <= extent[3] and extent[0] <= lon <= extent[2]:
-            return zone_name, zone_info['epsg']
-    return None, None
-
-def detect_wgs84_zone(lat, lon):
-    for zone_name, zone_info in WGS84_ZONES.items():
-        bounds = zone_info['bounds']
-        if bounds['lat_min'] <= lat <= bounds['lat_max'] and bounds['lon_min'] <= lon <= bounds['lon_max']:
-            return zone_name, zone_info['epsg']
-    return None, None
-
-def distance_3d(x1, y1, z1, x2, y2, z2):
-    dx = x2 - x1
-    dy = y2 - y1
-    dz = z2 - z1
-    horizontal_distance = sqrt(dx**2 + dy**2)
-    slope_distance = sqrt(dx**2 + dy**2 + dz**2)
-    return round(horizontal_distance, 3), round(slope_distance, 3)
-
-def bearing_grid(x1, y1, x2, y2):
-    dx = x2 - x1
-    dy = y2 - y1
-    if dx == 0 and dy == 0:
-        return 0.0
-    bearing_rad = atan2(dx, dy)
-    bearing_deg = degrees(bearing_rad)
-    bearing_deg = (bearing_deg + 360) % 360
-    return round(bearing_deg, 2)
+        st.caption("Each row is inverse-projected through every Kalianpur zone. Rows that fit more than one zone "
+                   "are flagged as ambiguous instead of guessed; add a zone column for those.")
+    return dict(routing=routing, zone=zone, zone_col=zone_col)
+
+def grid_csv_converter(convert_frame, grid, key, file_name):
+    """CSV mode of the ESM/DSM tabs: upload, route zones, convert array-wide, download."""
+    st.info("Columns required: `easting`, `northing`, `height` (optional), `point_id` (optional)")
+    uploaded = st.file_uploader("Upload CSV", type=['csv'], key=f"{key}_file")
+    options = zone_routing_inputs(grid, key)
+    if uploaded:
+        df = read_frame(uploaded)
+        st.dataframe(df.head())
+        
+        if st.button("Convert File", key=f"{key}_convert"):
+            try:
+                start = time.perf_counter()
+                with metrics.run(key, grid=grid, **options) as timed_run:
+                    res_df = convert_frame(df, **options)
+                    timed_run.points = len(res_df)
+                elapsed = time.perf_counter() - start
+                failed = int((res_df['status'] != "Success").sum())
+                st.success(f"Converted {len(res_df):,} rows in {elapsed:.2f} s"
+                           + (f" ({len(res_df) / elapsed:,.0f} points/s)" if elapsed else "")
+                           + (f", {failed:,} failed" if failed else ""))
+                st.dataframe(res_df)
+                st.download_button("💾 Export Results", frame_bytes(res_df), file_name, "text/csv",
+                                   key=f"{key}_download")
+            except Exception as e:
+                st.error(f"Batch Error: {e}")
+
+def batch_job_panel(job_ids, polling):
+    """Progress and actions for the background jobs named in the page URL.
+
+    Runs as a fragment that polls the job manager while a job is queued or
+    running, so progress updates without rerunning the whole page.
+    """
+    manager = get_job_manager()
+    active = False
+    for job_id in job_ids:
+        job = manager.status(job_id)
+        if job is None:
+            continue
+        active = active or job['status'] in ACTIVE_STATUSES
+        with st.container(border=True):
+            st.write(f"**{job['name']}** · job `{job_id}` · {job['status']}")
+            st.progress(min(job['fraction'], 1.0),
+                        text=f"{job['rows']:,} rows, {job['failed']:,} failed, {job['seconds']:.1f} s")
+            if job['error']:
+                st.error(f"Batch Error: {job['error']}")
+            c1, c2, c3 = st.columns(3)
+            if job['status'] in ACTIVE_STATUSES:
+                if c1.button("Cancel", key=f"job_cancel_{job_id}"):
+                    manager.cancel(job_id)
+            else:
+                if job['status'] in RESUMABLE_STATUSES and c1.button("Resume", key=f"job_resume_{job_id}"):
+                    manager.resume(job_id)
+                    st.rerun()
+                if c3.button("Remove", key=f"job_remove_{job_id}"):
+                    manager.remove(job_id)
+                    st.query_params["job"] = [j for j in job_ids if j != job_id]
+                    st.rerun()
+            if job['status'] == STATUS_DONE:
+                fmt = job['output_format']
+                c2.download_button("💾 Export Results", lambda path=job['result']: read_file_bytes(path),
+                                   "results" + SUFFIXES[fmt], MIME_TYPES[fmt], key=f"job_download_{job_id}",
+                                   on_click="ignore")
+                zone_stats = {key: {"rows": rows, "seconds": seconds} for key, rows, seconds in job['zone_stats']}
+                st.dataframe(zone_stats_frame(zone_stats, job['options'].get('grid', GRID_ESM)))
+    if polling and not active:
+        # Stop polling: the page decides run_every on a full rerun
+        st.rerun()
+
+@st.cache_data(show_spinner=False)
+def zone_reference(system):
+    """Zone List content for one system, built once per process.
+
+    Kalianpur zones are ``(title, body)`` pairs for expanders; the other
+    systems are a single markdown block.
+    """
+    if system == "Kalianpur 1975":
+        return [(f"{k} (EPSG:{v['epsg']})", f"Bounds: {v['bounds']}\n\nDesc: {v['description']}")
+                for k, v in ENHANCED_KALIANPUR_ZONES.items()]
+    if system == "DSM LCC":
+        return "\n\n".join(f"**Zone {k}**: EPSG {v['epsg']} | Extent: {v['extent']}" for k, v in DSM_LCC_ZONES.items())
+    return "\n\n".join(f"**{k}**: EPSG {v['epsg']}" for k, v in WGS84_ZONES.items())
+
+def column_pickers(columns, key):
+    """Latitude/longitude column selectboxes, preselecting columns named like lat/lon."""
+    columns = list(columns)
+    def guess(token, fallback):
+        return next((i for i, c in enumerate(columns) if token in str(c).lower()), min(fallback, len(columns) - 1))
+    c1, c2 = st.columns(2)
+    lat_col = c1.selectbox("Latitude column", columns, index=guess("lat", 0), key=f"{key}_lat_col", persist_state="session")
+    lon_col = c2.selectbox("Longitude column", columns, index=guess("lon", 1), key=f"{key}_lon_col", persist_state="session")
+    return lat_col, lon_col
+
+def point_file_inputs(label, key):
+    """Upload and coordinate widgets for one point file; returns ``(uploaded, input_format, options)``.
+
+    ``options`` are the ``frame_points`` keyword arguments: ``grid`` plus
+    the lat/lon columns or the zone routing.
+    """
+    uploaded = st.file_uploader(f"{label} (CSV, Parquet or Feather)", type=[e[1:] for e in EXTENSIONS], key=f"{key}_file")
+    coords = st.radio("Coordinates", ["Lat/Lon (WGS84)", "ESM (Kalianpur)", "DSM"], horizontal=True,
+                      key=f"{key}_coords", persist_state="session")
+    options = dict(grid={"ESM (Kalianpur)": GRID_ESM, "DSM": GRID_DSM}.get(coords))
+    input_format = format_from_name(uploaded.name) if uploaded else None
+    preview = None
+    if uploaded:
+        uploaded.seek(0)
+        preview = read_frame(uploaded, input_format, nrows=5)
+        st.dataframe(preview)
+    if options['grid'] is None:
+        if preview is not None:
+            options['lat_col'], options['lon_col'] = column_pickers(preview.columns, key)
+    else:
+        options.update(zone_routing_inputs(options['grid'], key))
+    return uploaded, input_format, options
+
+@st.cache_resource(show_spinner="Indexing control points...", max_entries=4)
+def control_points_store(file_id, _uploaded, input_format, options):
+    """Control point index for one upload, built once and reused by reruns and other sessions."""
+    _uploaded.seek(0)
+    return ControlPoints.load(_uploaded, input_format, **options)
 
 # ==========================================
 # 3. UI LAYOUT & TABS
@@ -214,8 +294,8 @@ def bearing_grid(x1, y1, x2, y2):
 col1, col2 = st.columns([1, 4])
 with col1:
     # Use absolute path to ensure logo loads
-    if os.path.exists(logo_path):
-        st.image(logo_path, width=120)
+    if static_asset(logo_path):
+        st.image(static_asset(logo_path), width=120)
     else:
         # Fallback text if image still fails
         st.write("FSS Logo")
@@ -227,485 +307,853 @@ with col2:
 tabs = st.tabs([
     "Lat/Lon Calc", "Grid Calc", "DD to DMS", "DMS to DD", 
     "Lat/Lon to Grid", "Grid to Lat/Lon", "ESM to DSM", 
-    "DSM to Lat/Lon", "DSM to ESM", "Deg & Dist Calc", "Batch Process", "Zone List", "About"
-])
+    "DSM to Lat/Lon", "DSM to ESM", "Deg & Dist Calc", "Batch Process", "Control Points", "Zone List", "About"
+], key="active_tab", on_change="rerun")
 
 # --- TAB 1: LAT/LON CALCULATION ---
 with tabs[0]:
-    st.markdown('<div class="header-style">📍 Calculate Distance & Bearing (Lat/Lon)</div>', unsafe_allow_html=True)
-    st.info("Input: Decimal degrees (e.g., 30.3165, 78.0322)")
-    
-    col_a, col_b = st.columns(2)
-    with col_a:
-        st.subheader("Point A")
-        lat1 = st.text_input("Lat A", "30.3165")
-        lon1 = st.text_input("Lon A", "78.0322")
-    with col_b:
-        st.subheader("Point B")
-        lat2 = st.text_input("Lat B", "30.5000")
-        lon2 = st.text_input("Lon B", "78.5000")
-        
-    col_btn1, col_btn2 = st.columns([2, 1])
-    calc_pressed = col_btn1.button("Calculate Distance & Bearing")
-    detect_pressed = col_btn2.button("Auto Detect Zones")
-    
-    if calc_pressed:
-        try:
-            l1, ln1 = validate_input(lat1), validate_input(lon1)
-            l2, ln2 = validate_input(lat2), validate_input(lon2)
+    if tabs[0].open:
+        st.markdown('<div class="header-style">📍 Calculate Distance & Bearing (Lat/Lon)</div>', unsafe_allow_html=True)
+        st.info("Input: Decimal degrees (e.g., 30.3165, 78.0322)")
+        
+        col_a, col_b = st.columns(2)
+        with col_a:
+            st.subheader("Point A")
+            lat1 = st.text_input("Lat A", "30.3165", key="ll_lat_a", persist_state="session")
+            lon1 = st.text_input("Lon A", "78.0322", key="ll_lon_a", persist_state="session")
+        with col_b:
+            st.subheader("Point B")
+            lat2 = st.text_input("Lat B", "30.5000", key="ll_lat_b", persist_state="session")
+            lon2 = st.text_input("Lon B", "78.5000", key="ll_lon_b", persist_state="session")
+        
+        method_labels = {"Spherical (haversine)": METHOD_SPHERICAL, "Ellipsoidal (geodesic)": METHOD_ELLIPSOIDAL}
+        ll_method = method_labels[st.radio("Distance method", list(method_labels), horizontal=True, key="ll_method",
+                                           persist_state="session",
+                                           help="The sphere is up to about 0.6% off on distance and 0.2° on bearing; "
+                                                "the geodesic is exact on the chosen ellipsoid.")]
+        ll_ellipsoid = ELLIPSOID_WGS84
+        if ll_method == METHOD_ELLIPSOIDAL:
+            ll_ellipsoid = st.selectbox("Ellipsoid", list(ELLIPSOIDS), key="ll_ellipsoid", persist_state="session",
+                                        help="The ellipsoid of the coordinates' datum: WGS84 for GPS coordinates.")
             
-            if None in [l1, ln1, l2, ln2]:
-                st.error("Please enter valid numeric coordinates.")
-            else:
-                dist_km = haversine(l1, ln1, l2, ln2)
-                bearing = bearing_latlon(l1, ln1, l2, ln2)
+        col_btn1, col_btn2 = st.columns([2, 1])
+        calc_pressed = col_btn1.button("Calculate Distance & Bearing")
+        detect_pressed = col_btn2.button("Auto Detect Zones")
+        
+        if calc_pressed:
+            try:
+                l1, ln1 = validate_input(lat1), validate_input(lon1)
+                l2, ln2 = validate_input(lat2), validate_input(lon2)
                 
-                # Zone detection
-                k1, e1, _ = detect_kalianpur_zone(l1, ln1)
-                k2, e2, _ = detect_kalianpur_zone(l2, ln2)
+                if None in [l1, ln1, l2, ln2]:
+                    st.error("Please enter valid numeric coordinates.")
+                else:
+                    # Distance, bearing and zone detection, memoized across sessions
+                    dist_km, bearing, k1, e1, k2, e2 = get_result_cache().get_or_compute(
+                        *points.distance_cache_key(ll_method, ll_ellipsoid), (l1, ln1, l2, ln2),
+                        lambda: points.distance_bearing(l1, ln1, l2, ln2, ll_method, ll_ellipsoid))
+                    method_note = "sphere" if ll_method == METHOD_SPHERICAL else f"{ll_ellipsoid} geodesic"
+                    
+                    st.markdown(f"""
+                    <div class="result-box">
+                        <h4>✅ Results</h4>
+                        <p><b>Distance:</b> {dist_km} km ({dist_km * 1000:.2f} m, {method_note})</p>
+                        <p><b>Bearing:</b> {bearing}° ({format_bearing(bearing)})</p>
+                        <hr>
+                        <p><b>Zones:</b> A: {k1 or 'Outside'} (EPSG:{e1 or 'N/A'}) | B: {k2 or 'Outside'} (EPSG:{e2 or 'N/A'})</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                    # SHOW RESULT IMAGE HERE
+                    if static_asset(result_img_path):
+                        st.image(static_asset(result_img_path), caption="Reference Map", use_container_width=True)
+
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+        if detect_pressed:
+            try:
+                l1, ln1 = validate_input(lat1), validate_input(lon1)
+                k_zone, k_epsg, desc = detect_kalianpur_zone(l1, ln1)
+                dsm_zone, dsm_epsg = detect_dsm_zone(l1, ln1)
                 
                 st.markdown(f"""
                 <div class="result-box">
-                    <h4>✅ Results</h4>
-                    <p><b>Distance:</b> {dist_km} km ({dist_km * 1000:.2f} m)</p>
-                    <p><b>Bearing:</b> {bearing}° ({format_bearing(bearing)})</p>
-                    <hr>
-                    <p><b>Zones:</b> A: {k1 or 'Outside'} (EPSG:{e1 or 'N/A'}) | B: {k2 or 'Outside'} (EPSG:{e2 or 'N/A'})</p>
+                    <h4>🔍 Zone Detection (Point A)</h4>
+                    <ul>
+                        <li><b>Kalianpur:</b> {k_zone} (EPSG:{k_epsg}) - {desc}</li>
+                        <li><b>DSM Zone:</b> {dsm_zone} (EPSG:{dsm_epsg})</li>
+                    </ul>
                 </div>
                 """, unsafe_allow_html=True)
-
-                # SHOW RESULT IMAGE HERE
-                if os.path.exists(result_img_path):
-                    st.image(result_img_path, caption="Reference Map", use_container_width=True)
-
-        except Exception as e:
-            st.error(f"Error: {e}")
-
-    if detect_pressed:
-        try:
-            l1, ln1 = validate_input(lat1), validate_input(lon1)
-            k_zone, k_epsg, desc = detect_kalianpur_zone(l1, ln1)
-            dsm_zone, dsm_epsg = detect_dsm_zone(l1, ln1)
-            
-            st.markdown(f"""
-            <div class="result-box">
-                <h4>🔍 Zone Detection (Point A)</h4>
-                <ul>
-                    <li><b>Kalianpur:</b> {k_zone} (EPSG:{k_epsg}) - {desc}</li>
-                    <li><b>DSM Zone:</b> {dsm_zone} (EPSG:{dsm_epsg})</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Show map in detection as well if useful
-            if os.path.exists(result_img_path):
-                st.image(result_img_path, caption="Reference Map", use_container_width=True)
-        except:
-            st.error("Invalid input for Point A")
+                
+                # Show map in detection as well if useful
+                if static_asset(result_img_path):
+                    st.image(static_asset(result_img_path), caption="Reference Map", use_container_width=True)
+            except:
+                st.error("Invalid input for Point A")
 
 # --- TAB 2: GRID CALCULATION ---
 with tabs[1]:
-    st.markdown('<div class="header-style">📐 Calculate 3D Distance (Grid)</div>', unsafe_allow_html=True)
-    st.info("Input: Meters (Indian Grid System)")
-    
-    c1, c2, c3 = st.columns(3)
-    with c1: e1 = st.text_input("Easting A", "3877983.50")
-    with c2: n1 = st.text_input("Northing A", "756073.40")
-    with c3: h1 = st.text_input("Height A", "600.0")
-    
-    c4, c5, c6 = st.columns(3)
-    with c4: e2 = st.text_input("Easting B", "3878500.20")
-    with c5: n2 = st.text_input("Northing B", "756500.10")
-    with c6: h2 = st.text_input("Height B", "650.0")
-    
-    if st.button("Calculate 3D Distance"):
-        try:
-            ve1, vn1, vh1 = validate_input(e1), validate_input(n1), validate_input(h1)
-            ve2, vn2, vh2 = validate_input(e2), validate_input(n2), validate_input(h2)
+    if tabs[1].open:
+        st.markdown('<div class="header-style">📐 Calculate 3D Distance (Grid)</div>', unsafe_allow_html=True)
+        st.info("Input: Meters (Indian Grid System)")
+        
+        grid_mode = st.radio("Input", ["Single segment", "Parcel file"], horizontal=True, key="grid_mode", persist_state="session")
+        
+        if grid_mode == "Parcel file":
+            st.info("Columns required: parcel ID, `easting`, `northing` (m), one row per vertex in ring order; optional `point_id` "
+                    "and a vertex order column. A last vertex repeating the first closes the ring.")
+            parcel_file = st.file_uploader("Upload parcel vertices", type=[e[1:] for e in EXTENSIONS], key="parcel_file")
             
-            if None in [ve1, vn1, vh1, ve2, vn2, vh2]:
-                st.error("Invalid Grid Coordinates")
-            else:
-                h_dist, s_dist = distance_3d(ve1, vn1, vh1, ve2, vn2, vh2)
-                b_grid = bearing_grid(ve1, vn1, ve2, vn2)
-                dh = vh2 - vh1
+            cp1, cp2, cp3 = st.columns(3)
+            with cp1: parcel_col = st.text_input("Parcel ID column", DEFAULT_PARCEL_COL, key="parcel_col", persist_state="session")
+            with cp2: parcel_order = st.text_input("Vertex order column (optional)", "", key="parcel_order", persist_state="session")
+            with cp3: parcel_tol = st.number_input("Closure tolerance (m)", min_value=0.0, value=CLOSURE_TOLERANCE, step=0.01,
+                                                   format="%.3f", key="parcel_tolerance", persist_state="session")
+            parcel_dms = st.checkbox("Edge bearings in D°M'S\"", key="parcel_dms", persist_state="session",
+                                     help="Adds a `bearing_dms` column to the edges; slower on millions of edges.")
+            parcel_format = st.selectbox("Output format", FORMATS, format_func=str.capitalize, key="parcel_output_format",
+                                         persist_state="session")
+            
+            if parcel_file and st.button("Compute Parcels"):
+                try:
+                    parcel_col, order_col = parcel_col.strip(), parcel_order.strip() or None
+                    parcel_input_format = format_from_name(parcel_file.name)
+                    parcel_file.seek(0)
+                    vertices = read_frame(parcel_file, parcel_input_format,
+                                          columns=[parcel_col, "easting", "northing", "point_id"] + ([order_col] if order_col else []))
+                    with metrics.run("parcels", input_format=parcel_input_format, output_format=parcel_format) as timed_run:
+                        parcels, edges = parcel_frames(vertices, parcel_col, order_col, parcel_tol, parcel_dms)
+                        timed_run.points = len(vertices)
+                    totals = parcel_summary(parcels)
+                    
+                    st.success(f"Computed {totals['parcels']:,} parcels from {totals['vertices']:,} vertices.")
+                    st.markdown(f"""
+                    <div class="result-box">
+                        <h4>🗺️ Parcel Summary</h4>
+                        <p><b>Closed:</b> {totals['ok']:,} | <b>Not closed:</b> {totals['not_closed']:,} | <b>Errors:</b> {totals['failed']:,}</p>
+                        <p><b>Total Area:</b> {totals['area_m2']:,.3f} m² ({totals['area_m2'] / 10_000:,.4f} ha)</p>
+                        <p><b>Total Perimeter:</b> {totals['perimeter_m']:,.3f} m</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    st.caption(f"Showing the first {min(len(parcels), PREVIEW_ROWS):,} parcels")
+                    st.dataframe(parcels.head(PREVIEW_ROWS))
+                    
+                    cd1, cd2 = st.columns(2)
+                    with cd1:
+                        st.download_button("💾 Export Parcels", lambda: frame_bytes(parcels, parcel_format),
+                                           "parcels" + SUFFIXES[parcel_format], MIME_TYPES[parcel_format], on_click="ignore")
+                    with cd2:
+                        st.download_button("💾 Export Edges", lambda: frame_bytes(edges, parcel_format),
+                                           "parcel_edges" + SUFFIXES[parcel_format], MIME_TYPES[parcel_format], on_click="ignore")
+                except Exception as e:
+                    st.error(f"Parcel Error: {e}")
+        else:
+            c1, c2, c3 = st.columns(3)
+            with c1: e1 = st.text_input("Easting A", "3877983.50", key="grid_e_a", persist_state="session")
+            with c2: n1 = st.text_input("Northing A", "756073.40", key="grid_n_a", persist_state="session")
+            with c3: h1 = st.text_input("Height A", "600.0", key="grid_h_a", persist_state="session")
+        
+            c4, c5, c6 = st.columns(3)
+            with c4: e2 = st.text_input("Easting B", "3878500.20", key="grid_e_b", persist_state="session")
+            with c5: n2 = st.text_input("Northing B", "756500.10", key="grid_n_b", persist_state="session")
+            with c6: h2 = st.text_input("Height B", "650.0", key="grid_h_b", persist_state="session")
+        
+            if st.button("Calculate 3D Distance"):
+                try:
+                    ve1, vn1, vh1 = validate_input(e1), validate_input(n1), validate_input(h1)
+                    ve2, vn2, vh2 = validate_input(e2), validate_input(n2), validate_input(h2)
                 
-                st.markdown(f"""
-                <div class="result-box">
-                    <h4>✅ 3D Calculation Results</h4>
-                    <p><b>Horizontal Dist:</b> {h_dist} m | <b>Slope Dist:</b> {s_dist} m</p>
-                    <p><b>Bearing:</b> {b_grid}° ({format_bearing(b_grid)})</p>
-                    <p><b>Height Diff:</b> {dh:.3f} m</p>
-                </div>
-                """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Error: {e}")
+                    if None in [ve1, vn1, vh1, ve2, vn2, vh2]:
+                        st.error("Invalid Grid Coordinates")
+                    else:
+                        h_dist, s_dist = distance_3d(ve1, vn1, vh1, ve2, vn2, vh2)
+                        b_grid = bearing_grid(ve1, vn1, ve2, vn2)
+                        dh = vh2 - vh1
+                    
+                        st.markdown(f"""
+                        <div class="result-box">
+                            <h4>✅ 3D Calculation Results</h4>
+                            <p><b>Horizontal Dist:</b> {h_dist} m | <b>Slope Dist:</b> {s_dist} m</p>
+                            <p><b>Bearing:</b> {b_grid}° ({format_bearing(b_grid)})</p>
+                            <p><b>Height Diff:</b> {dh:.3f} m</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
 # --- TAB 3: DD TO DMS ---
 with tabs[2]:
-    st.markdown('<div class="header-style">🔄 Decimal Degrees to DMS</div>', unsafe_allow_html=True)
-    dd_lat = st.text_input("Latitude (DD)", "30.3165")
-    dd_lon = st.text_input("Longitude (DD)", "78.0322")
-    
-    if st.button("Convert to DMS"):
-        try:
-            vlat, vlon = validate_input(dd_lat), validate_input(dd_lon)
-            if vlat is not None and vlon is not None:
-                dms_lat = decimal_to_dms(vlat, 'lat')
-                dms_lon = decimal_to_dms(vlon, 'lon')
-                st.success(f"Latitude: {dms_lat}")
-                st.success(f"Longitude: {dms_lon}")
-            else:
-                st.error("Invalid Input")
-        except Exception as e:
-            st.error(e)
+    if tabs[2].open:
+        st.markdown('<div class="header-style">🔄 Decimal Degrees to DMS</div>', unsafe_allow_html=True)
+        dd_mode = st.radio("Input", ["Single point", "CSV file"], horizontal=True, key="dd_mode", persist_state="session")
+        
+        if dd_mode == "CSV file":
+            dd_file = st.file_uploader("Upload CSV", type=['csv'], key="dd_file")
+            if dd_file:
+                dd_df = pd.read_csv(dd_file)
+                st.dataframe(dd_df.head())
+                dd_lat_col, dd_lon_col = column_pickers(dd_df.columns, "dd")
+                
+                if st.button("Convert Column to DMS"):
+                    try:
+                        with metrics.run("dd_to_dms", points=len(dd_df)):
+                            lat = pd.to_numeric(dd_df[dd_lat_col], errors='coerce').to_numpy()
+                            lon = pd.to_numeric(dd_df[dd_lon_col], errors='coerce').to_numpy()
+                            dd_df['lat_dms'] = format_dms_array(lat, 'lat')
+                            dd_df['lon_dms'] = format_dms_array(lon, 'lon')
+                        failed = int((dd_df['lat_dms'] == "").sum() + (dd_df['lon_dms'] == "").sum())
+                        st.success(f"Converted {len(dd_df):,} rows" + (f", {failed:,} invalid values left blank" if failed else ""))
+                        st.dataframe(dd_df)
+                        st.download_button("💾 Export Results", dd_df.to_csv(index=False), "dms.csv", "text/csv")
+                    except Exception as e:
+                        st.error(e)
+        else:
+            dd_lat = st.text_input("Latitude (DD)", "30.3165", key="dd_lat", persist_state="session")
+            dd_lon = st.text_input("Longitude (DD)", "78.0322", key="dd_lon", persist_state="session")
+            
+            if st.button("Convert to DMS"):
+                try:
+                    vlat, vlon = validate_input(dd_lat), validate_input(dd_lon)
+                    if vlat is not None and vlon is not None:
+                        dms_lat = decimal_to_dms(vlat, 'lat')
+                        dms_lon = decimal_to_dms(vlon, 'lon')
+                        st.success(f"Latitude: {dms_lat}")
+                        st.success(f"Longitude: {dms_lon}")
+                    else:
+                        st.error("Invalid Input")
+                except Exception as e:
+                    st.error(e)
 
 # --- TAB 4: DMS TO DD ---
 with tabs[3]:
-    st.markdown('<div class="header-style">↩️ DMS to Decimal Degrees</div>', unsafe_allow_html=True)
-    st.info("Format: D°M'S\"H (e.g., 30°18'59.4\"N)")
-    dms_in_lat = st.text_input("Latitude (DMS)", "30°18'59.4\"N")
-    dms_in_lon = st.text_input("Longitude (DMS)", "78°1'55.92\"E")
-    
-    if st.button("Convert to Decimal"):
-        try:
-            res_lat = dms_to_decimal(dms_in_lat)
-            res_lon = dms_to_decimal(dms_in_lon)
-            st.success(f"Latitude: {res_lat:.6f}°")
-            st.success(f"Longitude: {res_lon:.6f}°")
+    if tabs[3].open:
+        st.markdown('<div class="header-style">↩️ DMS to Decimal Degrees</div>', unsafe_allow_html=True)
+        st.info("Format: D°M'S\"H (e.g., 30°18'59.4\"N)")
+        dms_mode = st.radio("Input", ["Single point", "CSV file"], horizontal=True, key="dms_mode", persist_state="session")
+        
+        if dms_mode == "CSV file":
+            dms_file = st.file_uploader("Upload CSV", type=['csv'], key="dms_file")
+            if dms_file:
+                dms_df = pd.read_csv(dms_file, dtype=str)
+                st.dataframe(dms_df.head())
+                dms_lat_col, dms_lon_col = column_pickers(dms_df.columns, "dms")
+                
+                if st.button("Convert Column to Decimal"):
+                    try:
+                        with metrics.run("dms_to_dd", points=len(dms_df)):
+                            lat, lat_err = parse_dms_array(dms_df[dms_lat_col])
+                            lon, lon_err = parse_dms_array(dms_df[dms_lon_col])
+                            dms_df['lat_dd'] = lat.round(6)
+                            dms_df['lon_dd'] = lon.round(6)
+                            dms_df['zone'], dms_df['epsg'] = detect_kalianpur_zones(lat, lon)
+                        bad = lat_err | lon_err
+                        dms_df['status'] = pd.Series(bad).map({False: "Success", True: "Error: invalid DMS"}).to_numpy()
+                        st.success(f"Converted {len(dms_df):,} rows" + (f", {int(bad.sum()):,} failed" if bad.any() else ""))
+                        st.dataframe(dms_df)
+                        st.download_button("💾 Export Results", dms_df.to_csv(index=False), "decimal.csv", "text/csv")
+                    except Exception as e:
+                        st.error(e)
+        else:
+            dms_in_lat = st.text_input("Latitude (DMS)", "30°18'59.4\"N", key="dms_lat", persist_state="session")
+            dms_in_lon = st.text_input("Longitude (DMS)", "78°1'55.92\"E", key="dms_lon", persist_state="session")
             
-            # Auto zone detect
-            kz, ke, _ = detect_kalianpur_zone(res_lat, res_lon)
-            st.info(f"Detected Zone: {kz} (EPSG:{ke})")
-        except ValueError as ve:
-            st.error(f"Format Error: {ve}")
+            if st.button("Convert to Decimal"):
+                try:
+                    res_lat = dms_to_decimal(dms_in_lat)
+                    res_lon = dms_to_decimal(dms_in_lon)
+                    st.success(f"Latitude: {res_lat:.6f}°")
+                    st.success(f"Longitude: {res_lon:.6f}°")
+                    
+                    # Auto zone detect
+                    kz, ke, _ = detect_kalianpur_zone(res_lat, res_lon)
+                    st.info(f"Detected Zone: {kz} (EPSG:{ke})")
+                except ValueError as ve:
+                    st.error(f"Format Error: {ve}")
 
 # --- TAB 5: LAT/LON TO GRID ---
 with tabs[4]:
-    st.markdown('<div class="header-style">🔄 WGS84 Lat/Lon to Indian Grid</div>', unsafe_allow_html=True)
-    st.caption("EPSG:4326 → EPSG:24378 (Kalianpur 1975)")
-    
-    c_l1, c_l2, c_l3 = st.columns(3)
-    with c_l1: l_lat = st.text_input("Lat (Deg)", "30.3165")
-    with c_l2: l_lon = st.text_input("Lon (Deg)", "78.0322")
-    with c_l3: l_h = st.text_input("Alt (m)", "0")
-    
-    if st.button("Convert to Grid"):
-        try:
-            v_lat, v_lon = validate_input(l_lat), validate_input(l_lon)
-            v_h = validate_input(l_h) or 0.0
-            
-            # Detect zone
-            kz, ke, _ = detect_kalianpur_zone(v_lat, v_lon)
-            if ke is None:
-                ke = 24378
-                kz = "Default (Zone I)"
-            
-            transformer = Transformer.from_crs("epsg:4326", f"epsg:{ke}", always_xy=True)
-            easting, northing = transformer.transform(v_lon, v_lat)
-            
-            st.markdown(f"""
-            <div class="result-box">
-                <h4>🎯 Indian Grid Result ({kz})</h4>
-                <p><b>Easting:</b> {easting:,.3f} m</p>
-                <p><b>Northing:</b> {northing:,.3f} m</p>
-                <p><b>Height:</b> {v_h} m</p>
-            </div>
-            """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Conversion Error: {e}")
+    if tabs[4].open:
+        st.markdown('<div class="header-style">🔄 WGS84 Lat/Lon to Indian Grid</div>', unsafe_allow_html=True)
+        st.caption("EPSG:4326 → EPSG:24378 (Kalianpur 1975)")
+        
+        c_l1, c_l2, c_l3 = st.columns(3)
+        with c_l1: l_lat = st.text_input("Lat (Deg)", "30.3165", key="ll2grid_lat", persist_state="session")
+        with c_l2: l_lon = st.text_input("Lon (Deg)", "78.0322", key="ll2grid_lon", persist_state="session")
+        with c_l3: l_h = st.text_input("Alt (m)", "0", key="ll2grid_h", persist_state="session")
+        
+        if st.button("Convert to Grid"):
+            try:
+                v_lat, v_lon = validate_input(l_lat), validate_input(l_lon)
+                v_h = validate_input(l_h) or 0.0
+                
+                # Detect zone (Zone I outside every zone) and convert
+                kz, ke, easting, northing = get_result_cache().get_or_compute(
+                    "latlon_to_grid", None, (v_lat, v_lon), lambda: points.latlon_to_grid(v_lat, v_lon))
+                
+                st.markdown(f"""
+                <div class="result-box">
+                    <h4>🎯 Indian Grid Result ({kz})</h4>
+                    <p><b>Easting:</b> {easting:,.3f} m</p>
+                    <p><b>Northing:</b> {northing:,.3f} m</p>
+                    <p><b>Height:</b> {v_h} m</p>
+                </div>
+                """, unsafe_allow_html=True)
+            except Exception as e:
+                st.error(f"Conversion Error: {e}")
 
 # --- TAB 6: GRID TO LAT/LON ---
 with tabs[5]:
-    st.markdown('<div class="header-style">↩️ Indian Grid to WGS84 Lat/Lon</div>', unsafe_allow_html=True)
-    
-    cg1, cg2, cg3 = st.columns(3)
-    with cg1: g_e = st.text_input("Easting (m)", "3877983.50")
-    with cg2: g_n = st.text_input("Northing (m)", "756073.40")
-    with cg3: g_h = st.text_input("Height (m)", "0")
-    
-    if st.button("Convert to Lat/Lon"):
-        try:
-            ve, vn = validate_input(g_e), validate_input(g_n)
-            vh = validate_input(g_h) or 0.0
-            
-            # Assumption: Input is Zone I (EPSG:24378) as per original logic if not specified
-            transformer = Transformer.from_crs("epsg:24378", "epsg:4326", always_xy=True)
-            wgs_lon, wgs_lat = transformer.transform(ve, vn)
-            
-            st.markdown(f"""
-            <div class="result-box">
-                <h4>📍 WGS84 Result</h4>
-                <p><b>Latitude:</b> {wgs_lat:.6f}° ({decimal_to_dms(wgs_lat, 'lat')})</p>
-                <p><b>Longitude:</b> {wgs_lon:.6f}° ({decimal_to_dms(wgs_lon, 'lon')})</p>
-            </div>
-            """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Error: {e}")
-
-# --- TAB 7: ESM TO DSM ---
-with tabs[6]:
-    st.markdown('<div class="header-style">🔄 ESM Grid to DSM Grid</div>', unsafe_allow_html=True)
-    st.caption("ESM (Kalianpur) → WGS84 → DSM (LCC)")
-    
-    ce1, ce2 = st.columns(2)
-    with ce1: 
-        esm_zone = st.selectbox("Select ESM Zone", list(ENHANCED_KALIANPUR_ZONES.keys()))
-    with ce2:
-        esm_e = st.text_input("ESM Easting", "3856789.12")
-        esm_n = st.text_input("ESM Northing", "756073.40")
-        esm_h = st.text_input("Height", "600.0")
-        
-    if st.button("Convert ESM -> DSM"):
-        try:
-            ve, vn = validate_input(esm_e), validate_input(esm_n)
-            vh = validate_input(esm_h) or 0.0
-            
-            src_epsg = ENHANCED_KALIANPUR_ZONES[esm_zone]['epsg']
-            
-            # 1. ESM -> WGS84
-            t1 = Transformer.from_crs(f"epsg:{src_epsg}", "epsg:4326", always_xy=True)
-            lon, lat = t1.transform(ve, vn)
-            
-            # 2. Detect DSM
-            d_zone, d_epsg = detect_dsm_zone(lat, lon)
-            if not d_zone:
-                st.error("Coordinates outside DSM coverage.")
-            else:
-                # 3. WGS84 -> DSM
-                p = DSM_PARAMS[d_zone[0]]
-                dsm_proj = f"+proj={p['projection']} +lat_0={p['latitude_of_origin']} +lon_0={p['central_meridian']} +k={p['scale_factor']} +x_0={p['false_easting']} +y_0={p['false_northing']} +a={p['semi_major']} +b={p['semi_minor']} +units=m +no_defs"
+    if tabs[5].open:
+        st.markdown('<div class="header-style">↩️ Indian Grid to WGS84 Lat/Lon</div>', unsafe_allow_html=True)
+        
+        cg1, cg2, cg3 = st.columns(3)
+        with cg1: g_e = st.text_input("Easting (m)", "3877983.50", key="grid2ll_e", persist_state="session")
+        with cg2: g_n = st.text_input("Northing (m)", "756073.40", key="grid2ll_n", persist_state="session")
+        with cg3: g_h = st.text_input("Height (m)", "0", key="grid2ll_h", persist_state="session")
+        
+        if st.button("Convert to Lat/Lon"):
+            try:
+                ve, vn = validate_input(g_e), validate_input(g_n)
+                vh = validate_input(g_h) or 0.0
                 
-                dsm_crs = CRS.from_proj4(dsm_proj)
-                t2 = Transformer.from_crs("epsg:4326", dsm_crs, always_xy=True)
-                de, dn = t2.transform(lon, lat)
+                # Assumption: Input is Zone I (EPSG:24378) as per original logic if not specified
+                wgs_lat, wgs_lon = get_result_cache().get_or_compute(
+                    "grid_to_latlon", 24378, (ve, vn), lambda: points.grid_to_latlon(ve, vn, 24378))
                 
                 st.markdown(f"""
                 <div class="result-box">
-                    <h4>✅ DSM Output ({d_zone})</h4>
-                    <p><b>Easting:</b> {de:.3f} m</p>
-                    <p><b>Northing:</b> {dn:.3f} m</p>
-                    <p><b>Intermediate WGS84:</b> {lat:.5f}, {lon:.5f}</p>
+                    <h4>📍 WGS84 Result</h4>
+                    <p><b>Latitude:</b> {wgs_lat:.6f}° ({decimal_to_dms(wgs_lat, 'lat')})</p>
+                    <p><b>Longitude:</b> {wgs_lon:.6f}° ({decimal_to_dms(wgs_lon, 'lon')})</p>
                 </div>
                 """, unsafe_allow_html=True)
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+# --- TAB 7: ESM TO DSM ---
+with tabs[6]:
+    if tabs[6].open:
+        st.markdown('<div class="header-style">🔄 ESM Grid to DSM Grid</div>', unsafe_allow_html=True)
+        st.caption("ESM (Kalianpur) → WGS84 → DSM (LCC)")
+        esm2dsm_mode = st.radio("Input", ["Single point", "CSV file"], horizontal=True, key="esm2dsm_mode", persist_state="session")
+        
+        if esm2dsm_mode == "CSV file":
+            grid_csv_converter(esm_to_dsm_frame, GRID_ESM, "esm2dsm", "esm_to_dsm.csv")
+        else:
+            ce1, ce2 = st.columns(2)
+            with ce1: 
+                esm_zone = st.selectbox("Select ESM Zone", list(ENHANCED_KALIANPUR_ZONES.keys()), key="esm2dsm_zone", persist_state="session")
+            with ce2:
+                esm_e = st.text_input("ESM Easting", "3856789.12", key="esm2dsm_e", persist_state="session")
+                esm_n = st.text_input("ESM Northing", "756073.40", key="esm2dsm_n", persist_state="session")
+                esm_h = st.text_input("Height", "600.0", key="esm2dsm_h", persist_state="session")
                 
-        except Exception as e:
-            st.error(f"Error: {e}")
+            if st.button("Convert ESM -> DSM"):
+                try:
+                    ve, vn = validate_input(esm_e), validate_input(esm_n)
+                    vh = validate_input(esm_h) or 0.0
+                    
+                    # ESM -> WGS84, detect DSM sheet, WGS84 -> DSM
+                    d_zone, de, dn, lat, lon = get_result_cache().get_or_compute(
+                        "esm_to_dsm", esm_zone, (ve, vn), lambda: points.esm_to_dsm(esm_zone, ve, vn))
+                    if not d_zone:
+                        st.error("Coordinates outside DSM coverage.")
+                    else:
+                        st.markdown(f"""
+                        <div class="result-box">
+                            <h4>✅ DSM Output ({d_zone})</h4>
+                            <p><b>Easting:</b> {de:.3f} m</p>
+                            <p><b>Northing:</b> {dn:.3f} m</p>
+                            <p><b>Intermediate WGS84:</b> {lat:.5f}, {lon:.5f}</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+                        
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
 # --- TAB 8: DSM TO LAT/LON ---
 with tabs[7]:
-    st.markdown('<div class="header-style">↩️ DSM Grid to Lat/Lon</div>', unsafe_allow_html=True)
-    
-    cd1, cd2 = st.columns(2)
-    with cd1:
-        dsm_z_sel = st.selectbox("DSM Zone", list(DSM_LCC_ZONES.keys()))
-    with cd2:
-        d_e = st.text_input("DSM Easting", "484789.12")
-        d_n = st.text_input("DSM Northing", "966073.40")
-        d_h = st.text_input("DSM Height", "600.0")
-        
-    if st.button("Convert DSM -> Lat/Lon"):
-        try:
-            ve, vn = validate_input(d_e), validate_input(d_n)
-            
-            major_zone = dsm_z_sel[0]
-            p = DSM_PARAMS[major_zone]
-            dsm_proj = f"+proj={p['projection']} +lat_0={p['latitude_of_origin']} +lon_0={p['central_meridian']} +k={p['scale_factor']} +x_0={p['false_easting']} +y_0={p['false_northing']} +a={p['semi_major']} +b={p['semi_minor']} +units=m +no_defs"
-            
-            dsm_crs = CRS.from_proj4(dsm_proj)
-            t = Transformer.from_crs(dsm_crs, "epsg:4326", always_xy=True)
-            lon, lat = t.transform(ve, vn)
-            
-            st.markdown(f"""
-            <div class="result-box">
-                <h4>📍 Result</h4>
-                <p><b>Lat:</b> {lat:.6f}°</p>
-                <p><b>Lon:</b> {lon:.6f}°</p>
-            </div>
-            """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Error: {e}")
-
-# --- TAB 9: DSM TO ESM ---
-with tabs[8]:
-    st.markdown('<div class="header-style">↩️ DSM Grid to ESM Grid</div>', unsafe_allow_html=True)
-    st.caption("DSM (LCC) → WGS84 → ESM (Kalianpur)")
-    
-    cde1, cde2 = st.columns(2)
-    with cde1:
-        dz_in = st.selectbox("Source DSM Zone", list(DSM_LCC_ZONES.keys()), key="dsm2esm_zone")
-    with cde2:
-        de_in = st.text_input("DSM Easting", "484789.12", key="dsm2esm_e")
-        dn_in = st.text_input("DSM Northing", "966073.40", key="dsm2esm_n")
-        dh_in = st.text_input("Height", "600.0", key="dsm2esm_h")
-        
-    if st.button("Convert DSM -> ESM"):
-        try:
-            ve, vn = validate_input(de_in), validate_input(dn_in)
-            
-            # 1. DSM -> WGS84
-            major_zone = dz_in[0]
-            p = DSM_PARAMS[major_zone]
-            dsm_proj = f"+proj={p['projection']} +lat_0={p['latitude_of_origin']} +lon_0={p['central_meridian']} +k={p['scale_factor']} +x_0={p['false_easting']} +y_0={p['false_northing']} +a={p['semi_major']} +b={p['semi_minor']} +units=m +no_defs"
-            
-            dsm_crs = CRS.from_proj4(dsm_proj)
-            t1 = Transformer.from_crs(dsm_crs, "epsg:4326", always_xy=True)
-            lon, lat = t1.transform(ve, vn)
-            
-            # 2. WGS84 -> ESM (Auto detect Kalianpur zone)
-            kz, ke, _ = detect_kalianpur_zone(lat, lon)
+    if tabs[7].open:
+        st.markdown('<div class="header-style">↩️ DSM Grid to Lat/Lon</div>', unsafe_allow_html=True)
+        
+        cd1, cd2 = st.columns(2)
+        with cd1:
+            dsm_z_sel = st.selectbox("DSM Zone", list(DSM_LCC_ZONES.keys()), key="dsm2ll_zone", persist_state="session")
+        with cd2:
+            d_e = st.text_input("DSM Easting", "484789.12", key="dsm2ll_e", persist_state="session")
+            d_n = st.text_input("DSM Northing", "966073.40", key="dsm2ll_n", persist_state="session")
+            d_h = st.text_input("DSM Height", "600.0", key="dsm2ll_h", persist_state="session")
             
-            if not kz:
-                st.error("Outside ESM (Kalianpur) coverage area.")
-            else:
-                t2 = Transformer.from_crs("epsg:4326", f"epsg:{ke}", always_xy=True)
-                ee, en = t2.transform(lon, lat)
+        if st.button("Convert DSM -> Lat/Lon"):
+            try:
+                ve, vn = validate_input(d_e), validate_input(d_n)
+                
+                lat, lon = get_result_cache().get_or_compute(
+                    "dsm_to_latlon", dsm_z_sel, (ve, vn), lambda: points.dsm_to_latlon(dsm_z_sel, ve, vn))
                 
                 st.markdown(f"""
                 <div class="result-box">
-                    <h4>✅ ESM Output ({kz})</h4>
-                    <p><b>Easting:</b> {ee:,.3f} m</p>
-                    <p><b>Northing:</b> {en:,.3f} m</p>
-                    <p><b>EPSG:</b> {ke}</p>
+                    <h4>📍 Result</h4>
+                    <p><b>Lat:</b> {lat:.6f}°</p>
+                    <p><b>Lon:</b> {lon:.6f}°</p>
                 </div>
                 """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Error: {e}")
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+# --- TAB 9: DSM TO ESM ---
+with tabs[8]:
+    if tabs[8].open:
+        st.markdown('<div class="header-style">↩️ DSM Grid to ESM Grid</div>', unsafe_allow_html=True)
+        st.caption("DSM (LCC) → WGS84 → ESM (Kalianpur)")
+        dsm2esm_mode = st.radio("Input", ["Single point", "CSV file"], horizontal=True, key="dsm2esm_mode", persist_state="session")
+        
+        if dsm2esm_mode == "CSV file":
+            grid_csv_converter(dsm_to_esm_frame, GRID_DSM, "dsm2esm", "dsm_to_esm.csv")
+        else:
+            cde1, cde2 = st.columns(2)
+            with cde1:
+                dz_in = st.selectbox("Source DSM Zone", list(DSM_LCC_ZONES.keys()), key="dsm2esm_zone", persist_state="session")
+            with cde2:
+                de_in = st.text_input("DSM Easting", "484789.12", key="dsm2esm_e", persist_state="session")
+                dn_in = st.text_input("DSM Northing", "966073.40", key="dsm2esm_n", persist_state="session")
+                dh_in = st.text_input("Height", "600.0", key="dsm2esm_h", persist_state="session")
+                
+            if st.button("Convert DSM -> ESM"):
+                try:
+                    ve, vn = validate_input(de_in), validate_input(dn_in)
+                    
+                    # DSM -> WGS84 -> ESM (Auto detect Kalianpur zone)
+                    kz, ke, ee, en = get_result_cache().get_or_compute(
+                        "dsm_to_esm", dz_in, (ve, vn), lambda: points.dsm_to_esm(dz_in, ve, vn))
+                    
+                    if not kz:
+                        st.error("Outside ESM (Kalianpur) coverage area.")
+                    else:
+                        st.markdown(f"""
+                        <div class="result-box">
+                            <h4>✅ ESM Output ({kz})</h4>
+                            <p><b>Easting:</b> {ee:,.3f} m</p>
+                            <p><b>Northing:</b> {en:,.3f} m</p>
+                            <p><b>EPSG:</b> {ke}</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
 # --- TAB 10: DEG & DIST CALC (TRAVERSE) ---
 with tabs[9]:
-    st.markdown('<div class="header-style">📐 Traverse (Deg & Dist to Coordinate)</div>', unsafe_allow_html=True)
-    st.info("Calculate Target Coordinate using Start Point, Bearing & Distance")
-    
-    # Input Layout
-    col_t1, col_t2 = st.columns(2)
-    with col_t1:
-        st.subheader("Start Location")
-        start_e = st.text_input("Start Easting (m)", "3877983.50")
-        start_n = st.text_input("Start Northing (m)", "756073.40")
-    with col_t2:
-        st.subheader("Vector")
-        bearing_in = st.text_input("Bearing (Degrees)", "45.0")
-        dist_in = st.text_input("Distance (Meters)", "100.0")
-        
-    if st.button("Calculate Target Coordinate"):
-        try:
-            # Validation
-            ve, vn = validate_input(start_e), validate_input(start_n)
-            vb, vd = validate_input(bearing_in), validate_input(dist_in)
+    if tabs[9].open:
+        st.markdown('<div class="header-style">📐 Traverse (Deg & Dist to Coordinate)</div>', unsafe_allow_html=True)
+        st.info("Calculate Target Coordinate using Start Point, Bearing & Distance")
+        
+        trav_mode = st.radio("Input", ["Single leg", "Leg table"], horizontal=True, key="trav_mode", persist_state="session")
+        
+        if trav_mode == "Leg table":
+            st.info("Columns required: `bearing` (degrees or D°M'S\"), `distance` (m); optional `height_diff` (m), `point_id`. "
+                    "Stations are chained from the start point in file order.")
+            trav_file = st.file_uploader("Upload leg table", type=[e[1:] for e in EXTENSIONS], key="trav_file")
             
-            if None in [ve, vn, vb, vd]:
-                st.error("Please enter valid numeric values for all fields.")
-            else:
-                # Calculation (Plane Geometry)
-                # Convert Bearing to Radians
-                rad = radians(vb)
-                
-                # Calculate Deltas
-                delta_e = vd * sin(rad)
-                delta_n = vd * cos(rad)
-                
-                # Calculate Final Coordinates
-                final_e = ve + delta_e
-                final_n = vn + delta_n
-                
-                # Output
-                st.markdown(f"""
-                <div class="result-box">
-                    <h4>📍 Target Location Results</h4>
-                    <p><b>Target Easting:</b> {final_e:,.3f} m</p>
-                    <p><b>Target Northing:</b> {final_n:,.3f} m</p>
-                    <hr>
-                    <p><b>Shift Details:</b></p>
-                    <ul>
-                        <li>Delta Easting: {delta_e:+.3f} m</li>
-                        <li>Delta Northing: {delta_n:+.3f} m</li>
-                    </ul>
-                </div>
-                """, unsafe_allow_html=True)
-                
-        except Exception as e:
-            st.error(f"Calculation Error: {e}")
+            ct1, ct2, ct3 = st.columns(3)
+            with ct1: ts_e = st.text_input("Start Easting (m)", "3877983.50", key="trav_start_e", persist_state="session")
+            with ct2: ts_n = st.text_input("Start Northing (m)", "756073.40", key="trav_start_n", persist_state="session")
+            with ct3: ts_h = st.text_input("Start Height (m)", "0", key="trav_start_h", persist_state="session")
             
+            closure_mode = st.selectbox("Closure", ["Open (no closure)", "Closed loop (ends on start)", "Ends on known point"],
+                                        key="trav_closure", persist_state="session")
+            if closure_mode == "Ends on known point":
+                cc1, cc2, cc3 = st.columns(3)
+                with cc1: tc_e = st.text_input("Closing Easting (m)", "3877983.50", key="trav_close_e", persist_state="session")
+                with cc2: tc_n = st.text_input("Closing Northing (m)", "756073.40", key="trav_close_n", persist_state="session")
+                with cc3: tc_h = st.text_input("Closing Height (m, optional)", "", key="trav_close_h", persist_state="session")
+            adjustment_labels = {"Bowditch (compass rule)": ADJUST_BOWDITCH, "Transit rule": ADJUST_TRANSIT}
+            if closure_mode != "Open (no closure)":
+                trav_adjustment = adjustment_labels[st.selectbox("Adjustment", list(adjustment_labels), key="trav_adjustment",
+                                                                 persist_state="session")]
+            trav_format = st.selectbox("Output format", FORMATS, format_func=str.capitalize, key="trav_output_format",
+                                       persist_state="session")
+            
+            if trav_file and st.button("Compute Traverse"):
+                try:
+                    start = (validate_input(ts_e), validate_input(ts_n), validate_input(ts_h) or 0.0)
+                    closing, adjustment = None, ADJUST_BOWDITCH
+                    if closure_mode == "Closed loop (ends on start)":
+                        closing, adjustment = "start", trav_adjustment
+                    elif closure_mode == "Ends on known point":
+                        vh = validate_input(tc_h)
+                        closing = (validate_input(tc_e), validate_input(tc_n)) + (() if vh is None else (vh,))
+                        adjustment = trav_adjustment
+                    
+                    if None in start[:2] or (closing not in (None, "start") and None in closing):
+                        st.error("Please enter valid numeric start and closing coordinates.")
+                    else:
+                        progress_bar = st.progress(0)
+                        out_path = new_batch_output_path(SUFFIXES[trav_format], "traverse_output_path")
+                        trav_input_format = format_from_name(trav_file.name)
+                        with metrics.run("traverse", adjustment=adjustment, input_format=trav_input_format,
+                                         output_format=trav_format) as timed_run, \
+                                open_output(out_path, trav_format) as out:
+                            summary = stream_traverse(trav_file, out, start, closing, adjustment,
+                                                      progress=progress_bar.progress,
+                                                      input_format=trav_input_format, output_format=trav_format)
+                            timed_run.points = summary['legs']
+                        
+                        st.success(f"Computed {summary['legs']:,} stations in {summary['chunks']} chunk(s).")
+                        c = summary['closure']
+                        if c:
+                            mis_bearing = bearing_grid(0, 0, c['misclosure_e'], c['misclosure_n'])
+                            precision = "exact" if c['linear'] == 0 else f"1:{c['precision']:,.0f}"
+                            st.markdown(f"""
+                            <div class="result-box">
+                                <h4>🎯 Closure</h4>
+                                <p><b>Misclosure:</b> ΔE {c['misclosure_e']:+.4f} m | ΔN {c['misclosure_n']:+.4f} m | ΔH {c['misclosure_h']:+.4f} m</p>
+                                <p><b>Linear Misclosure:</b> {c['linear']:.4f} m at {mis_bearing}° ({format_bearing(mis_bearing)})</p>
+                                <p><b>Traverse Length:</b> {c['length']:,.3f} m | <b>Precision:</b> {precision}</p>
+                            </div>
+                            """, unsafe_allow_html=True)
+                        if summary['preview'] is not None:
+                            st.caption(f"Showing the first {len(summary['preview']):,} stations")
+                            st.dataframe(summary['preview'])
+                        st.download_button("💾 Export Stations", lambda: read_file_bytes(out_path),
+                                           "traverse" + SUFFIXES[trav_format], MIME_TYPES[trav_format], on_click="ignore")
+                except Exception as e:
+                    st.error(f"Traverse Error: {e}")
+        else:
+            # Input Layout
+            col_t1, col_t2 = st.columns(2)
+            with col_t1:
+                st.subheader("Start Location")
+                start_e = st.text_input("Start Easting (m)", "3877983.50", key="trav_e", persist_state="session")
+                start_n = st.text_input("Start Northing (m)", "756073.40", key="trav_n", persist_state="session")
+            with col_t2:
+                st.subheader("Vector")
+                bearing_in = st.text_input("Bearing (Degrees)", "45.0", key="trav_bearing", persist_state="session")
+                dist_in = st.text_input("Distance (Meters)", "100.0", key="trav_dist", persist_state="session")
+                
+            if st.button("Calculate Target Coordinate"):
+                try:
+                    # Validation
+                    ve, vn = validate_input(start_e), validate_input(start_n)
+                    vb, vd = validate_input(bearing_in), validate_input(dist_in)
+                    
+                    if None in [ve, vn, vb, vd]:
+                        st.error("Please enter valid numeric values for all fields.")
+                    else:
+                        # Calculation (Plane Geometry)
+                        # Convert Bearing to Radians
+                        rad = radians(vb)
+                        
+                        # Calculate Deltas
+                        delta_e = vd * sin(rad)
+                        delta_n = vd * cos(rad)
+                        
+                        # Calculate Final Coordinates
+                        final_e = ve + delta_e
+                        final_n = vn + delta_n
+                        
+                        # Output
+                        st.markdown(f"""
+                        <div class="result-box">
+                            <h4>📍 Target Location Results</h4>
+                            <p><b>Target Easting:</b> {final_e:,.3f} m</p>
+                            <p><b>Target Northing:</b> {final_n:,.3f} m</p>
+                            <hr>
+                            <p><b>Shift Details:</b></p>
+                            <ul>
+                                <li>Delta Easting: {delta_e:+.3f} m</li>
+                                <li>Delta Northing: {delta_n:+.3f} m</li>
+                            </ul>
+                        </div>
+                        """, unsafe_allow_html=True)
+                        
+                except Exception as e:
+                    st.error(f"Calculation Error: {e}")
+                    
 # --- TAB 11: BATCH PROCESSING ---
 with tabs[10]:
-    st.markdown('<div class="header-style">📊 Batch Processing (CSV)</div>', unsafe_allow_html=True)
-    st.info("Columns required: `easting`, `northing`, `height`, `point_id` (optional)")
-    
-    # Template Download
-    template_data = "easting,northing,height,point_id\n3877983.50,756073.40,600.0,P1\n3878500.20,756500.10,650.0,P2"
-    st.download_button("📥 Download CSV Template", template_data, "template.csv", "text/csv")
-    
-    uploaded_file = st.file_uploader("Upload CSV", type=['csv'])
-    
-    if uploaded_file:
-        df = pd.read_csv(uploaded_file)
-        st.dataframe(df.head())
+    if tabs[10].open:
+        st.markdown('<div class="header-style">📊 Batch Processing (CSV)</div>', unsafe_allow_html=True)
+        st.info("Columns required: `easting`, `northing`, `height`, `point_id` (optional), `zone` (when routing by zone column)")
+        
+        # Template Download
+        template_data = "easting,northing,height,point_id,zone\n3877983.50,756073.40,600.0,P1,Zone I\n3878500.20,756500.10,650.0,P2,Zone I"
+        st.download_button("📥 Download CSV Template", template_data, "template.csv", "text/csv")
+        
+        batch_grid_label = st.radio("Input Grid", ["ESM (Kalianpur)", "DSM"], horizontal=True, key="batch_grid", persist_state="session")
+        batch_grid = GRID_ESM if batch_grid_label == "ESM (Kalianpur)" else GRID_DSM
+        batch_options = dict(grid=batch_grid, **zone_routing_inputs(batch_grid, "batch"))
         
-        if st.button("Start Batch Processing (Grid -> Lat/Lon)"):
-            results = []
-            progress_bar = st.progress(0)
+        uploaded_file = st.file_uploader("Upload CSV, Parquet or Feather", type=[e[1:] for e in EXTENSIONS], key="batch_file")
+        output_format = st.selectbox("Output format", FORMATS, format_func=str.capitalize, key="batch_output_format",
+                                     persist_state="session",
+                                     help="Parquet and Feather keep coordinates as float64 and are much smaller and faster than CSV.")
+        output_name = "results" + SUFFIXES[output_format]
+        background = st.checkbox("Background job (resumable)", key="batch_background", persist_state="session",
+                                 help="Converts the file on the server, chunk by chunk, without holding this page. "
+                                      "The job survives a reload or reconnect and can be resumed if it is interrupted.")
+        streaming = parallel = False
+        if not background:
+            streaming = st.checkbox("Streaming mode (large files)", key="batch_streaming", persist_state="session",
+                                    help="Reads, converts and writes the file chunk by chunk so memory stays flat regardless of row count.")
+            parallel = st.checkbox("Parallel mode (multi-core)", key="batch_parallel", persist_state="session",
+                                   help="Splits the file into chunks and converts them on a pool of worker processes.")
+        use_store = False
+        if not background:
+            use_store = st.checkbox("Point store (fast re-runs)", key="batch_store", persist_state="session",
+                                    help="Imports the file once into a memory-mapped columnar store on the server. "
+                                         "Later runs on the same upload skip parsing it.")
+        approximate = False
+        if not background and not parallel:
+            approximate = st.checkbox("Approximate mode (lattice)", key="batch_approximate", persist_state="session",
+                                      help="Interpolates from a precomputed lattice per zone instead of running PROJ on "
+                                           "every point: several times faster, to within each zone's error shown after the run.")
+        if approximate:
+            max_error = st.number_input("Max error (m)", min_value=0.0, value=0.25, step=0.05, format="%.3f",
+                                        key="batch_max_error", persist_state="session",
+                                        help="Zones whose lattice error exceeds this are converted exactly.")
+            refine_col = st.text_input("Refine column (optional)", key="batch_refine_col", persist_state="session",
+                                       help="Rows with true, yes, x or a non-zero number in this column are "
+                                            "converted again exactly.").strip()
+        if parallel:
+            workers = st.number_input("Worker processes", min_value=1, max_value=64, value=DEFAULT_WORKERS,
+                                      key="batch_workers", persist_state="session")
+        if streaming or parallel or background:
+            chunk_rows = st.number_input("Rows per chunk", min_value=1000, max_value=1000000, value=DEFAULT_CHUNK_SIZE,
+                                         step=10000, key="batch_chunk_rows", persist_state="session")
+        
+        input_format = format_from_name(uploaded_file.name) if uploaded_file else None
+        batch_columns = input_columns(**batch_options)
+        batch_source = uploaded_file
+        if uploaded_file and use_store:
+            batch_source = batch_point_store(uploaded_file.file_id, uploaded_file, input_format)
+            info = batch_source.info()
+            st.caption(f"Point store: {info['rows']:,} rows, {info['bytes'] / 2**20:.1f} MiB mapped")
+        engine = {}
+        if approximate:
+            engine = dict(pool=batch_lattice_pool(max_error))
+            if refine_col:
+                batch_columns = batch_columns + (refine_col,)
+
+        def convert_batch_frame(frame, refined, **options):
+            # ``refined`` is a one-item list counting the rows converted again exactly
+            res = grid_to_latlon_frame(frame, **options, **engine, **batch_options)
+            if approximate and refine_col:
+                rows = flag_values(frame[refine_col])
+                res = refine_frame(frame, res, rows, **batch_options)
+                refined[0] += int(rows.sum())
+            return res
+        
+        if uploaded_file and background:
+            st.caption("The job ID is kept in this page's URL, so reloading or reopening the link shows its progress.")
+            if st.button("Queue Background Job (Grid -> Lat/Lon)"):
+                try:
+                    job_id = get_job_manager().submit(uploaded_file, uploaded_file.name, output_format=output_format,
+                                                      chunk_rows=int(chunk_rows), **batch_options)
+                    st.query_params["job"] = st.query_params.get_all("job") + [job_id]
+                except Exception as e:
+                    st.error(f"Batch Error: {e}")
+        
+        elif uploaded_file and streaming:
+            if use_store:
+                st.dataframe(batch_source.frame(stop=5))
+            else:
+                uploaded_file.seek(0)
+                st.dataframe(read_frame(uploaded_file, input_format, nrows=5))
             
-            try:
-                # Assuming Indian Grid Zone I (24378) for batch as per typical use case, 
-                # or we could add a selector. Using 24378 based on main.py logic.
-                t = Transformer.from_crs("epsg:24378", "epsg:4326", always_xy=True)
+            if st.button("Start Streaming Batch (Grid -> Lat/Lon)"):
+                progress_bar = st.progress(0)
                 
-                for i, row in df.iterrows():
-                    try:
-                        e = float(row['easting'])
-                        n = float(row['northing'])
-                        lon, lat = t.transform(e, n)
-                        results.append({
-                            'point_id': row.get('point_id', f'P{i}'),
-                            'lat': lat,
-                            'lon': lon,
-                            'height': row.get('height', 0),
-                            'status': 'Success'
-                        })
-                    except Exception as e:
-                        results.append({'point_id': row.get('point_id', i), 'status': f'Error: {e}'})
+                try:
+                    zone_stats, refined = {}, [0]
+                    out_path = new_batch_output_path(SUFFIXES[output_format])
+                    uploaded_file.seek(0)
+                    timing = {}
+                    formats = dict(input_format=input_format, output_format=output_format)
+                    with metrics.run("batch_stream", parallel=parallel, **formats, **batch_options) as timed_run, \
+                            open_output(out_path, output_format) as out:
+                        if parallel:
+                            summary = parallel_stream_table(batch_source, out, workers=int(workers), chunk_rows=int(chunk_rows),
+                                                            zone_stats=zone_stats, timing=timing,
+                                                            progress=progress_bar.progress, **formats, **batch_options)
+                        else:
+                            summary = stream_table(batch_source, out,
+                                                   lambda chunk: convert_batch_frame(chunk, refined, zone_stats=zone_stats),
+                                                   chunk_rows=int(chunk_rows), progress=progress_bar.progress,
+                                                   columns=batch_columns, **formats)
+                        timed_run.points = summary['rows']
                     
-                    progress_bar.progress((i + 1) / len(df))
-                
-                res_df = pd.DataFrame(results)
-                st.success("Processing Complete!")
-                st.dataframe(res_df)
-                
-                csv_buffer = io.StringIO()
-                res_df.to_csv(csv_buffer, index=False)
-                st.download_button("💾 Export Results", csv_buffer.getvalue(), "results.csv", "text/csv")
+                    st.success(f"Processing Complete! {summary['rows']:,} rows in {summary['chunks']} chunk(s), "
+                               f"{summary['failed']:,} failed.")
+                    if timing:
+                        st.caption(parallel_summary(timing))
+                    if summary['preview'] is not None:
+                        st.caption(f"Showing the first {len(summary['preview']):,} rows")
+                        st.dataframe(summary['preview'])
+                    st.caption("Per-zone summary")
+                    st.dataframe(zone_stats_frame(zone_stats, batch_grid))
+                    if approximate:
+                        lattice_summary(engine['pool'], refined[0])
+                    
+                    # Deferred: the file is only read when the user clicks download
+                    st.download_button("💾 Export Results", lambda: read_file_bytes(out_path), output_name,
+                                       MIME_TYPES[output_format], on_click="ignore")
+                    
+                except Exception as e:
+                    st.error(f"Batch Error: {e}")
+        
+        elif uploaded_file:
+            if use_store:
+                df = batch_source.frame(batch_columns)
+            else:
+                uploaded_file.seek(0)
+                df = read_frame(uploaded_file, input_format, columns=batch_columns)
+            st.dataframe(df.head())
+            
+            if st.button("Start Batch Processing (Grid -> Lat/Lon)"):
+                progress_bar = st.progress(0)
                 
-            except Exception as e:
-                st.error(f"Batch Error: {e}")
+                try:
+                    zone_stats, timing, refined = {}, {}, [0]
+                    with metrics.run("batch", parallel=parallel, input_format=input_format, **batch_options) as timed_run:
+                        if parallel:
+                            res_df = parallel_grid_to_latlon_frame(df, workers=int(workers), chunk_rows=int(chunk_rows),
+                                                                   zone_stats=zone_stats, timing=timing,
+                                                                   progress=progress_bar.progress, **batch_options)
+                        else:
+                            res_df = convert_batch_frame(df, refined, zone_stats=zone_stats, progress=progress_bar.progress)
+                        timed_run.points = len(res_df)
+                    st.success("Processing Complete!")
+                    if timing:
+                        st.caption(parallel_summary(timing))
+                    st.dataframe(res_df)
+                    st.caption("Per-zone summary")
+                    st.dataframe(zone_stats_frame(zone_stats, batch_grid))
+                    if approximate:
+                        lattice_summary(engine['pool'], refined[0])
+                    
+                    st.download_button("💾 Export Results", frame_bytes(res_df, output_format), output_name,
+                                       MIME_TYPES[output_format])
+                    
+                except Exception as e:
+                    st.error(f"Batch Error: {e}")
+        
+        # Background jobs of this page, found again after a reload through the URL
+        job_ids = st.query_params.get_all("job")
+        attach_id = st.text_input("Follow a job", key="batch_attach_job", placeholder="Job ID",
+                                  help="Shows a background job started from another page or browser.").strip()
+        if attach_id and attach_id not in job_ids and get_job_manager().status(attach_id):
+            job_ids = job_ids + [attach_id]
+            st.query_params["job"] = job_ids
+        if job_ids:
+            st.caption("Background jobs")
+            polling = any((get_job_manager().status(j) or {}).get('status') in ACTIVE_STATUSES for j in job_ids)
+            st.fragment(batch_job_panel, run_every=2.0 if polling else None)(job_ids, polling)
 
-# --- TAB 12: ZONE LIST ---
+# --- TAB 12: CONTROL POINTS ---
 with tabs[11]:
-    st.markdown('<div class="header-style">🗺️ Zone Reference</div>', unsafe_allow_html=True)
-    
-    z_type = st.radio("Select System", ["Kalianpur 1975", "DSM LCC", "WGS84"])
-    
-    if z_type == "Kalianpur 1975":
-        for k, v in ENHANCED_KALIANPUR_ZONES.items():
-            st.expander(f"{k} (EPSG:{v['epsg']})").write(f"Bounds: {v['bounds']}\n\nDesc: {v['description']}")
-    elif z_type == "DSM LCC":
-        for k, v in DSM_LCC_ZONES.items():
-            st.write(f"**Zone {k}**: EPSG {v['epsg']} | Extent: {v['extent']}")
-    else:
-        for k, v in WGS84_ZONES.items():
-            st.write(f"**{k}**: EPSG {v['epsg']}")
+    if tabs[11].open:
+        st.markdown('<div class="header-style">📌 Nearest Control Points</div>', unsafe_allow_html=True)
+        st.info("Upload the control points (trig stations, benchmarks) and the field points, each in lat/lon or grid "
+                "(`easting`, `northing`) coordinates. A `point_id` column names the points in the results.")
+        
+        st.caption("Control points")
+        control_file, control_format, control_options = point_file_inputs("Control points", "control_stations")
+        st.caption("Field points")
+        field_file, field_format, field_options = point_file_inputs("Field points", "control_field")
+        
+        control_mode = st.radio("Search", ["Nearest", "Within radius"], horizontal=True, key="control_mode", persist_state="session")
+        if control_mode == "Nearest":
+            control_k = st.number_input("Control points per field point", min_value=1, max_value=100, value=3,
+                                        key="control_k", persist_state="session")
+        else:
+            control_radius = st.number_input("Radius (km)", min_value=0.0, value=5.0, step=1.0, format="%.3f",
+                                             key="control_radius", persist_state="session")
+        control_output = st.selectbox("Output format", FORMATS, format_func=str.capitalize, key="control_output_format",
+                                      persist_state="session")
+        
+        if control_file and field_file and st.button("Find Control Points"):
+            try:
+                store = control_points_store(control_file.file_id, control_file, control_format, control_options)
+                field_file.seek(0)
+                field_df = read_frame(field_file, field_format)
+                start = time.perf_counter()
+                with metrics.run("control_points", mode=control_mode, stations=len(store), **field_options) as timed_run:
+                    if control_mode == "Nearest":
+                        res_df = store.nearest_frame(field_df, int(control_k), **field_options)
+                    else:
+                        res_df = store.within_frame(field_df, float(control_radius), **field_options)
+                    timed_run.points = len(field_df)
+                elapsed = time.perf_counter() - start
+                failed = int((res_df['status'] != "Success").sum())
+                st.success(f"Searched {len(store):,} control points for {len(field_df):,} field points in {elapsed:.2f} s"
+                           + (f", {store.skipped:,} control points skipped (invalid coordinates)" if store.skipped else "")
+                           + (f", {failed:,} rows without a match" if failed else ""))
+                if len(res_df) > PREVIEW_ROWS:
+                    st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(res_df):,} rows")
+                st.dataframe(res_df.head(PREVIEW_ROWS))
+                st.download_button("💾 Export Results", frame_bytes(res_df, control_output),
+                                   "control_points" + SUFFIXES[control_output], MIME_TYPES[control_output])
+            except Exception as e:
+                st.error(f"Control Point Error: {e}")
 
-# --- TAB 13: ABOUT ---
+# --- TAB 13: ZONE LIST ---
 with tabs[12]:
-    st.markdown('<div class="header-style">About</div>', unsafe_allow_html=True)
-    
-    # Use logo_path logic here as well
-    if os.path.exists(logo_path):
-        st.image(logo_path, width=150)
+    if tabs[12].open:
+        st.markdown('<div class="header-style">🗺️ Zone Reference</div>', unsafe_allow_html=True)
+        
+        z_type = st.radio("Select System", ["Kalianpur 1975", "DSM LCC", "WGS84"], key="zone_system", persist_state="session")
+        
+        if z_type == "Kalianpur 1975":
+            for title, body in zone_reference(z_type):
+                st.expander(title).write(body)
+        else:
+            st.write(zone_reference(z_type))
+
+# --- TAB 14: ABOUT ---
+with tabs[13]:
+    if tabs[13].open:
+        st.markdown('<div class="header-style">About</div>', unsafe_allow_html=True)
+        
+        # Use logo_path logic here as well
+        if static_asset(logo_path):
+            st.image(static_asset(logo_path), width=150)
+        
+        st.write("### Advanced Surveying Calculator")
+        st.write("Version 4.0 Enhanced Web Edition")
+        st.write("© 2025 ByteFixx Solution")
+        st.write("Developer: Moorthi M")
+        st.write("Contact: bytefixx33@gmail.com")
+        st.write("Built with ❤️ for surveyors and geodetic professionals.")
+
+# --- SIDEBAR: TRANSFORMER CACHE ---
+# Rendered last so the counters include this run's conversions
+with st.sidebar:
+    result_stats = get_result_cache().stats()
+    st.caption("Result Cache" + (" (persistent)" if result_stats['persistent'] else ""))
+    st.write(f"Hits: {result_stats['hits'] + result_stats['disk_hits']} | Misses: {result_stats['misses']} | "
+             f"Cached: {result_stats['size']}/{result_stats['maxsize']} | Hit rate: {result_stats['hit_rate']:.0%}")
     
-    st.write("### Advanced Surveying Calculator")
-    st.write("Version 4.0 Enhanced Web Edition")
-    st.write("© 2025 ByteFixx Solution")
-    st.write("Developer: Moorthi M")
-    st.write("Contact: bytefixx33@gmail.com")
-    st.write("Built with ❤️ for surveyors and geodetic professionals.")
\ No newline at end of file
+    pool_stats = get_pool().stats()
+    st.caption("Transformer Cache")
+    st.write(f"Hits: {pool_stats['hits']} | Misses: {pool_stats['misses']} | "
+             f"Cached: {pool_stats['size']}/{pool_stats['maxsize']} + {pool_stats['pinned']} DSM | "
+             f"Hit rate: {pool_stats['hit_rate']:.0%}")
+
+# --- SIDEBAR: METRICS (FSS_METRICS=1 only) ---
+if metrics.ENABLED:
+    metrics.record("render", time.perf_counter() - render_start, label=st.session_state.get("active_tab") or "Lat/Lon Calc")
+    with st.sidebar.expander("Metrics"):
+        st.caption("Per operation, all sessions of this server process")
+        st.dataframe(pd.DataFrame(metrics.snapshot()), hide_index=True)
+        runs = metrics.recent_runs()
+        if runs:
+            st.caption("Recent runs")
+            st.dataframe(pd.DataFrame(runs), hide_index=True)
+        gauges = {f"fss_result_cache_{k}": result_stats[k] for k in ("hits", "disk_hits", "misses", "size")}
+        gauges.update({f"fss_transformer_cache_{k}": pool_stats[k] for k in ("hits", "misses", "evictions", "size")})
+        st.download_button("📥 Prometheus metrics", metrics.prometheus_text(gauges), "metrics.prom", "text/plain")
+        if st.button("Reset metrics"):
+            metrics.reset()
+            st.rerun()
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""Computational core of the FSS Survey Calculator.
+
+The package never imports Streamlit. Importing it is cheap: the submodules
+that pull in pyproj, NumPy or pandas load on first attribute access.
+"""
+
+import importlib
+
+from .dms import decimal_to_dms, dms_to_decimal, format_bearing
+from .geodesy import bearing_grid, bearing_latlon, distance_3d, haversine
+from .zones import (
+    DSM_LCC_ZONES,
+    DSM_PARAMS,
+    ENHANCED_KALIANPUR_ZONES,
+    WGS84_ZONES,
+    detect_dsm_zone,
+    detect_kalianpur_zone,
+    detect_wgs84_zone,
+)
+
+_LAZY_ATTRS = {
+    "AnalyticPool": "analytic",
+    "get_analytic_pool": "analytic",
+    "ControlPoints": "control",
+    "get_control_points": "control",
+    "TransformerPool": "crs_pool",
+    "dsm_proj4": "crs_pool",
+    "get_dsm_registry": "crs_pool",
+    "get_pool": "crs_pool",
+    "normalize_crs_key": "crs_pool",
+    "start_warmup": "crs_pool",
+    "warm_up": "crs_pool",
+    "dsm_to_esm": "convert",
+    "dsm_to_latlon": "convert",
+    "esm_to_dsm": "convert",
+    "grid_to_latlon": "convert",
+    "latlon_to_grid": "convert",
+    "format_bearing_array": "dms_arrays",
+    "format_dms_array": "dms_arrays",
+    "parse_bearing_array": "dms_arrays",
+    "parse_dms_array": "dms_arrays",
+    "distance_bearing_array": "geodesic",
+    "geodesic_array": "geodesic",
+    "bearing_grid_array": "geodesy_arrays",
+    "bearing_latlon_array": "geodesy_arrays",
+    "distance_3d_array": "geodesy_arrays",
+    "grid_legs": "geodesy_arrays",
+    "haversine_array": "geodesy_arrays",
+    "latlon_legs": "geodesy_arrays",
+    "LatticePool": "lattice",
+    "get_lattice_pool": "lattice",
+    "ResultCache": "memo",
+    "get_result_cache": "memo",
+    "parcel_frames": "parcels",
+    "PointStore": "store",
+    "import_points": "store",
+    "ZoneIndex": "zone_index",
+    "detect_dsm_zones": "zone_index",
+    "detect_kalianpur_zones": "zone_index",
+    "detect_wgs84_zones": "zone_index",
+}
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,499 @@
+"""Pure-NumPy projection kernels for the DSM and Kalianpur zones.
+
+The zones are fixed projections: DSM majors are transverse Mercator on
+Everest 1830 with no datum shift, and the Kalianpur zones are Lambert
+conformal conic on Everest 1830 (1975) with a three-parameter shift to
+WGS84. ``AnalyticTransformer`` evaluates the pipeline PROJ resolved for a
+zone pair with whole-array NumPy formulas, so its parameters are exactly
+those of the pyproj transformer it replaces:
+
+* ``tmerc`` -- the Krüger series to n**6, summed with Clenshaw over the
+  complex conformal coordinate;
+* ``lcc`` -- Snyder's closed forms;
+* ``cart`` -- geodetic to geocentric, and back with Bowring's formula
+  as PROJ does;
+* ``helmert`` (translations only), ``push``/``pop`` of the height,
+  ``longlat`` and ``unitconvert`` of horizontal units.
+
+A pipeline with any other step raises ``ValueError``.
+
+``AnalyticPool`` has the ``get(src, dst)`` method of
+``fss_survey.crs_pool.TransformerPool`` and can be passed as ``pool=`` to
+any ``fss_survey.convert`` or ``fss_survey.batch`` function, per call:
+
+    res = grid_to_latlon(e, n, 24378, pool=get_analytic_pool())
+
+Pairs it cannot evaluate fall back to the pyproj transformer. ``validate``
+compares both over every zone's extent; ``python -m fss_survey.analytic``
+prints the comparison.
+"""
+
+import argparse
+import math
+import sys
+import threading
+
+import numpy as np
+from pyproj import get_ellps_map
+from pyproj.exceptions import ProjError
+
+from .convert import WGS84
+from .crs_pool import get_pool, normalize_crs_key
+from .zones import DSM_LCC_ZONES, DSM_PARAMS, ENHANCED_KALIANPUR_ZONES
+
+# Largest analytic - pyproj difference ``validate`` accepts, in metres
+TOLERANCE = 0.001
+VALIDATE_STEPS = 41
+
+_DEG = math.pi / 180
+
+
+def _ellipsoid(params):
+    """``(a, e**2)`` from a step's ``a``/``b``/``rf``/``ellps`` parameters."""
+    if "ellps" in params:
+        known = get_ellps_map().get(params["ellps"])
+        if known is None:
+            raise ValueError(f"Unknown ellipsoid: {params['ellps']}")
+        params = {**known, **params}
+    a = float(params["a"])
+    if "b" in params:
+        b = float(params["b"])
+        return a, 1 - (b / a) ** 2
+    f = 1 / float(params["rf"]) if "rf" in params else 0.0
+    return a, f * (2 - f)
+
+
+def _third_flattening(es):
+    f = 1 - math.sqrt(1 - es)
+    return f / (2 - f)
+
+
+def _clenshaw(coeffs, x):
+    """``sum(c_j * sin(2 j x))`` for real ``x``."""
+    two_cos = 2 * np.cos(2 * x)
+    y1 = y2 = 0
+    for c in reversed(coeffs):
+        y1, y2 = two_cos * y1 - y2 + c, y1
+    return y1 * np.sin(2 * x)
+
+
+def _clenshaw_complex(coeffs, xi, eta):
+    """``sum(c_j * sin(2 j (xi + i eta)))``, with the complex sine and cosine
+    built from real ones, which NumPy evaluates far faster."""
+    cos_2xi, sin_2xi = np.cos(2 * xi), np.sin(2 * xi)
+    cosh_2eta, sinh_2eta = np.cosh(2 * eta), np.sinh(2 * eta)
+    two_cos = np.empty(np.shape(xi), dtype=np.complex128)
+    two_cos.real = 2 * cos_2xi * cosh_2eta
+    two_cos.imag = -2 * sin_2xi * sinh_2eta
+    y1, y2 = np.zeros_like(two_cos), np.zeros_like(two_cos)
+    for c in reversed(coeffs):
+        y2 -= two_cos * y1
+        y2 -= c
+        y1, y2 = -y2, y1
+    sin = np.empty_like(two_cos)
+    sin.real = sin_2xi * cosh_2eta
+    sin.imag = cos_2xi * sinh_2eta
+    return y1 * sin
+
+
+def _sqrt1p2(x):
+    # hypot(1, x) for the moderate values here, at a third of the cost
+    return np.sqrt(1 + x * x)
+
+
+def _conformal_to_geodetic(n):
+    """Series coefficients taking the conformal latitude to the geodetic one
+    (Karney 2011, eq. 26), so neither projection iterates its inverse."""
+    n2, n3, n4, n5, n6 = n ** 2, n ** 3, n ** 4, n ** 5, n ** 6
+    return (
+        2 * n - 2 * n2 / 3 - 2 * n3 + 116 * n4 / 45 + 26 * n5 / 45 - 2854 * n6 / 675,
+        7 * n2 / 3 - 8 * n3 / 5 - 227 * n4 / 45 + 2704 * n5 / 315 + 2323 * n6 / 945,
+        56 * n3 / 15 - 136 * n4 / 35 - 1262 * n5 / 105 + 73814 * n6 / 2835,
+        4279 * n4 / 630 - 332 * n5 / 35 - 399572 * n6 / 14175,
+        4174 * n5 / 315 - 144838 * n6 / 6237,
+        601676 * n6 / 22275,
+    )
+
+
+def _wrap(lam):
+    # Longitudes out of a projection's inverse into [-pi, pi], as PROJ does
+    return np.where(np.abs(lam) > math.pi, np.remainder(lam + math.pi, 2 * math.pi) - math.pi, lam)
+
+
+def _outside(phi, x, y):
+    # PROJ refuses latitudes beyond the poles; NaN carries through later steps
+    bad = np.abs(phi) > math.pi / 2 + 1e-12
+    return np.where(bad, np.nan, x), np.where(bad, np.nan, y)
+
+
+class _TransverseMercator:
+    """Krüger's series for transverse Mercator (Karney 2011, eqs. 35-36)."""
+
+    def __init__(self, p):
+        a, es = _ellipsoid(p)
+        n = _third_flattening(es)
+        n2, n3, n4, n5, n6 = n ** 2, n ** 3, n ** 4, n ** 5, n ** 6
+        self.e = math.sqrt(es)
+        self.to_geodetic = _conformal_to_geodetic(n)
+        self.lon_0 = float(p.get("lon_0", 0)) * _DEG
+        self.k_a = float(p.get("k", p.get("k_0", 1))) * a / (1 + n) * (1 + n2 / 4 + n4 / 64 + n6 / 256)
+        self.x_0 = float(p.get("x_0", 0))
+        self.y_0 = float(p.get("y_0", 0))
+        self.alpha = (
+            n / 2 - 2 * n2 / 3 + 5 * n3 / 16 + 41 * n4 / 180 - 127 * n5 / 288 + 7891 * n6 / 37800,
+            13 * n2 / 48 - 3 * n3 / 5 + 557 * n4 / 1440 + 281 * n5 / 630 - 1983433 * n6 / 1935360,
+            61 * n3 / 240 - 103 * n4 / 140 + 15061 * n5 / 26880 + 167603 * n6 / 181440,
+            49561 * n4 / 161280 - 179 * n5 / 168 + 6601661 * n6 / 7257600,
+            34729 * n5 / 80640 - 3418889 * n6 / 1995840,
+            212378941 * n6 / 319334400,
+        )
+        self.beta = (
+            n / 2 - 2 * n2 / 3 + 37 * n3 / 96 - n4 / 360 - 81 * n5 / 512 + 96199 * n6 / 604800,
+            n2 / 48 + n3 / 15 - 437 * n4 / 1440 + 46 * n5 / 105 - 1118711 * n6 / 3870720,
+            17 * n3 / 480 - 37 * n4 / 840 - 209 * n5 / 4480 + 5569 * n6 / 90720,
+            4397 * n4 / 161280 - 11 * n5 / 504 - 830251 * n6 / 7257600,
+            4583 * n5 / 161280 - 108847 * n6 / 3991680,
+            20648693 * n6 / 638668800,
+        )
+        # Northing of the latitude of origin on the central meridian
+        lat_0 = float(p.get("lat_0", 0)) * _DEG
+        self.xi_0 = float(self._zeta(np.array([lat_0]), np.zeros(1))[0][0])
+
+    def _conformal_tan(self, tau):
+        root = _sqrt1p2(tau)
+        sigma = np.sinh(self.e * np.arctanh(self.e * tau / root))
+        return tau * _sqrt1p2(sigma) - sigma * root
+
+    def _zeta(self, phi, lam):
+        tau_c = self._conformal_tan(np.tan(phi))
+        cos_lam = np.cos(lam)
+        xi_c = np.arctan2(tau_c, cos_lam)
+        eta_c = np.arcsinh(np.sin(lam) / np.sqrt(tau_c * tau_c + cos_lam * cos_lam))
+        series = _clenshaw_complex(self.alpha, xi_c, eta_c)
+        return xi_c + series.real, eta_c + series.imag
+
+    def forward(self, lam, phi):
+        xi, eta = self._zeta(phi, lam - self.lon_0)
+        return _outside(phi, self.k_a * eta + self.x_0, self.k_a * (xi - self.xi_0) + self.y_0)
+
+    def inverse(self, x, y):
+        xi = (y - self.y_0) / self.k_a + self.xi_0
+        eta = (x - self.x_0) / self.k_a
+        series = _clenshaw_complex(self.beta, xi, eta)
+        xi, eta = xi - series.real, eta - series.imag
+        sinh_eta, cos_xi = np.sinh(eta), np.cos(xi)
+        chi = np.arctan2(np.sin(xi), np.hypot(sinh_eta, cos_xi))
+        lam = np.arctan2(sinh_eta, cos_xi)
+        return _wrap(lam + self.lon_0), chi + _clenshaw(self.to_geodetic, chi)
+
+
+class _LambertConic:
+    """Lambert conformal conic, one or two standard parallels (Snyder, pp. 107-109)."""
+
+    def __init__(self, p):
+        self.a, es = _ellipsoid(p)
+        self.e = math.sqrt(es)
+        self.to_geodetic = _conformal_to_geodetic(_third_flattening(es))
+        lat_1 = float(p["lat_1"]) * _DEG
+        lat_2 = float(p.get("lat_2", p["lat_1"])) * _DEG
+        lat_0 = float(p.get("lat_0", p["lat_1"])) * _DEG
+        self.lon_0 = float(p.get("lon_0", 0)) * _DEG
+        self.k_0 = float(p.get("k_0", p.get("k", 1)))
+        self.x_0 = float(p.get("x_0", 0))
+        self.y_0 = float(p.get("y_0", 0))
+        m_1, t_1 = self._m(lat_1), self._t(lat_1)
+        if math.isclose(lat_1, lat_2):
+            self.n = math.sin(lat_1)
+        else:
+            self.n = (math.log(m_1) - math.log(self._m(lat_2))) / (math.log(t_1) - math.log(self._t(lat_2)))
+        self.af = self.a * self.k_0 * m_1 / (self.n * t_1 ** self.n)
+        self.rho_0 = self.af * self._t(lat_0) ** self.n
+
+    def _m(self, phi):
+        return math.cos(phi) / math.sqrt(1 - (self.e * math.sin(phi)) ** 2)
+
+    def _t(self, phi):
+        sin_phi = np.sin(phi)
+        return np.tan(math.pi / 4 - phi / 2) / ((1 - self.e * sin_phi) / (1 + self.e * sin_phi)) ** (self.e / 2)
+
+    def forward(self, lam, phi):
+        rho = self.af * self._t(phi) ** self.n
+        theta = self.n * (lam - self.lon_0)
+        return _outside(phi, rho * np.sin(theta) + self.x_0, self.rho_0 - rho * np.cos(theta) + self.y_0)
+
+    def inverse(self, x, y):
+        dx = x - self.x_0
+        dy = self.rho_0 - (y - self.y_0)
+        sign = math.copysign(1, self.n)
+        rho = sign * np.hypot(dx, dy)
+        theta = np.arctan2(sign * dx, sign * dy)
+        # ``t`` of the conformal sphere gives the conformal latitude in closed form
+        chi = math.pi / 2 - 2 * np.arctan((rho / self.af) ** (1 / self.n))
+        return _wrap(theta / self.n + self.lon_0), chi + _clenshaw(self.to_geodetic, chi)
+
+
+class _Cartesian:
+    """Geodetic longitude, latitude and height to geocentric X, Y, Z."""
+
+    def __init__(self, p):
+        self.a, self.es = _ellipsoid(p)
+        self.b = self.a * math.sqrt(1 - self.es)
+        self.ep2 = self.es / (1 - self.es)
+
+    def forward(self, lam, phi, h):
+        sin_phi = np.sin(phi)
+        n = self.a / np.sqrt(1 - self.es * sin_phi ** 2)
+        r = (n + h) * np.cos(phi)
+        x, y = _outside(phi, r * np.cos(lam), r * np.sin(lam))
+        return x, y, (n * (1 - self.es) + h) * sin_phi
+
+    def inverse(self, x, y, z, height=True):
+        """``height=False`` returns ``z`` in place of the height, for a
+        pipeline that pops its saved height straight afterwards."""
+        # Bowring (1976), as in PROJ's cart
+        p = np.hypot(x, y)
+        theta = np.arctan2(z * self.a, p * self.b)
+        sin_t, cos_t = np.sin(theta), np.cos(theta)
+        phi = np.arctan2(z + self.ep2 * self.b * sin_t ** 3, p - self.es * self.a * cos_t ** 3)
+        if not height:
+            return np.arctan2(y, x), phi, z
+        sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+        n = self.a / np.sqrt(1 - self.es * sin_phi ** 2)
+        h = np.where(np.abs(cos_phi) > 1e-8, p / np.where(cos_phi == 0, 1, cos_phi) - n,
+                     np.abs(z) - self.b)
+        return np.arctan2(y, x), phi, h
+
+
+_PROJECTIONS = {"tmerc": _TransverseMercator, "lcc": _LambertConic}
+_ELLIPSOID_PARAMS = {"a", "b", "rf", "ellps"}
+# Parameters each step understands; any other one, e.g. ``south``, is refused
+_STEP_PARAMS = {
+    "tmerc": _ELLIPSOID_PARAMS | {"lat_0", "lon_0", "k", "k_0", "x_0", "y_0"},
+    "lcc": _ELLIPSOID_PARAMS | {"lat_0", "lat_1", "lat_2", "lon_0", "k", "k_0", "x_0", "y_0"},
+    "cart": _ELLIPSOID_PARAMS,
+    "longlat": _ELLIPSOID_PARAMS,
+}
+# Size of each unit in radians or metres; PROJ also writes a linear unit as its size in metres
+_UNITS = {"deg": _DEG, "rad": 1.0, "m": 1.0}
+
+
+def _unit(value):
+    if value in _UNITS:
+        return _UNITS[value]
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Unsupported unit: {value}")
+
+
+def parse_pipeline(definition):
+    """``[(operation, inverse, params)]`` for each step of a PROJ pipeline string."""
+    steps = []
+    tokens = definition.split()
+    if tokens[:1] != ["proj=pipeline"]:
+        tokens = ["proj=pipeline", "step"] + tokens
+    for token in tokens[1:]:
+        if token == "step":
+            steps.append({"inv": False, "params": {}})
+        elif not steps:
+            raise ValueError(f"Unsupported pipeline option: {token}")
+        elif token == "inv":
+            steps[-1]["inv"] = True
+        else:
+            key, _, value = token.partition("=")
+            steps[-1]["params"][key] = value
+    return [(s["params"].pop("proj", None), s["inv"], s["params"]) for s in steps]
+
+
+def _step(operation, inverse, p, height=True):
+    """One pipeline step as a function of ``(x, y, z, stack)`` returning ``(x, y, z)``.
+
+    ``height=False`` lets a step skip computing a height the next step drops.
+    """
+    if operation in _STEP_PARAMS and set(p) - _STEP_PARAMS[operation]:
+        raise ValueError(f"Unsupported {operation} parameters: {sorted(set(p) - _STEP_PARAMS[operation])}")
+    if operation in _PROJECTIONS:
+        projection = _PROJECTIONS[operation](p)
+        if inverse:
+            return lambda x, y, z, stack: (*projection.inverse(x, y), z)
+        return lambda x, y, z, stack: (*projection.forward(x, y), z)
+    if operation == "longlat":
+        return lambda x, y, z, stack: (x, y, z)
+    if operation == "unitconvert":
+        if set(p) != {"xy_in", "xy_out"}:
+            raise ValueError(f"Unsupported unitconvert: {p}")
+        scale = _unit(p["xy_in"]) / _unit(p["xy_out"])
+        if inverse:
+            scale = 1 / scale
+        return lambda x, y, z, stack: (x * scale, y * scale, z)
+    if operation == "cart":
+        cart = _Cartesian(p)
+        return (lambda x, y, z, stack: cart.inverse(x, y, z, height)) if inverse else \
+            (lambda x, y, z, stack: cart.forward(x, y, z))
+    if operation == "helmert":
+        if set(p) - {"x", "y", "z"}:
+            raise ValueError(f"Only translation Helmert steps are supported: {p}")
+        sign = -1 if inverse else 1
+        tx, ty, tz = (sign * float(p.get(k, 0)) for k in ("x", "y", "z"))
+        return lambda x, y, z, stack: (x + tx, y + ty, z + tz)
+    if operation in ("push", "pop") and p == {"v_3": ""}:
+        # ``inv push`` is a pop and ``inv pop`` a push
+        if (operation == "push") != inverse:
+            return lambda x, y, z, stack: (stack.append(z), (x, y, z))[1]
+        return lambda x, y, z, stack: (x, y, stack.pop())
+    raise ValueError(f"Unsupported pipeline step: {operation} {p}")
+
+
+class AnalyticTransformer:
+    """NumPy evaluation of a PROJ pipeline, with the ``transform`` method of
+    an ``always_xy`` pyproj Transformer. Raises ``ValueError`` for a
+    pipeline with a step this module does not implement."""
+
+    def __init__(self, definition):
+        self.definition = definition
+        steps = parse_pipeline(definition)
+        restores = [step == ("pop", False, {"v_3": ""}) for step in steps[1:]] + [False]
+        self._steps = [_step(*step, height=not restored) for step, restored in zip(steps, restores)]
+
+    def transform(self, xx, yy):
+        x = np.asarray(xx, dtype=np.float64)
+        y = np.asarray(yy, dtype=np.float64)
+        z = np.zeros_like(x)
+        stack = []
+        with np.errstate(all="ignore"):
+            for step in self._steps:
+                x, y, z = step(x, y, z, stack)
+        # Like pyproj, a point that cannot be transformed comes back as inf
+        failed = ~(np.isfinite(x) & np.isfinite(y))
+        if failed.any():
+            x, y = np.where(failed, np.inf, x), np.where(failed, np.inf, y)
+        return x, y
+
+
+class AnalyticPool:
+    """Analytic transformers for the pairs of a ``TransformerPool``.
+
+    ``get`` builds an ``AnalyticTransformer`` from the pipeline of
+    ``base.get(src, dst)`` and keeps it; a pipeline it cannot evaluate is
+    answered with the pyproj transformer and counted in ``fallbacks``.
+    """
+
+    def __init__(self, base=None):
+        self.base = base
+        self._kernels = {}
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def get(self, src, dst):
+        key = (normalize_crs_key(src), normalize_crs_key(dst))
+        with self._lock:
+            kernel = self._kernels.get(key)
+        if kernel is not None:
+            return kernel
+        transformer = (self.base or get_pool()).get(src, dst)
+        try:
+            kernel = AnalyticTransformer(transformer.definition)
+        except ValueError:
+            kernel = transformer
+        with self._lock:
+            # Counted once per pair, by the thread that stores it
+            if key not in self._kernels:
+                self._kernels[key] = kernel
+                if kernel is transformer:
+                    self.fallbacks += 1
+            return self._kernels[key]
+
+    def stats(self):
+        with self._lock:
+            analytic = sum(isinstance(k, AnalyticTransformer) for k in self._kernels.values())
+            return {"size": len(self._kernels), "analytic": analytic, "fallbacks": self.fallbacks}
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_analytic_pool():
+    """The process-wide analytic pool over ``get_pool()``."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = AnalyticPool()
+        return _default_pool
+
+
+def _lattice(lon_min, lat_min, lon_max, lat_max, steps):
+    lon, lat = np.meshgrid(np.linspace(lon_min, lon_max, steps), np.linspace(lat_min, lat_max, steps))
+    return lon.ravel(), lat.ravel()
+
+
+def _ground_metres(lon_a, lat_a, lon_b, lat_b):
+    # Small differences in degrees as metres on the ground
+    return np.hypot((lon_a - lon_b) * np.cos(np.radians(lat_a)) * 111_320.0, (lat_a - lat_b) * 110_574.0)
+
+
+def validate(steps=VALIDATE_STEPS, pool=None):
+    """Compare the analytic kernels with pyproj over every zone's extent.
+
+    Each zone's extent is sampled on a ``steps`` x ``steps`` lattice and
+    converted both ways by both engines. Returns one dict per zone and
+    direction with the largest difference in metres (grid metres, or
+    ground metres for lat/lon) and whether it is within ``TOLERANCE``.
+    Zones whose EPSG code PROJ does not know are skipped.
+    """
+    base = pool or get_pool()
+    analytic = AnalyticPool(base)
+    zones = [(name, info['epsg'], (b['lon_min'], b['lat_min'], b['lon_max'], b['lat_max']))
+             for name, info in ENHANCED_KALIANPUR_ZONES.items() for b in (info['bounds'],)]
+    for major in DSM_PARAMS:
+        extents = [z["extent"] for sheet, z in DSM_LCC_ZONES.items() if sheet[:1] == major]
+        zones.append((f"DSM {major}", f"dsm:{major}", (min(e[0] for e in extents), min(e[1] for e in extents),
+                                                       max(e[2] for e in extents), max(e[3] for e in extents))))
+
+    rows = []
+    for name, spec, extent in zones:
+        lon, lat = _lattice(*extent, steps)
+        try:
+            fwd_ref = base.get(WGS84, spec).transform(lon, lat)
+        except (ProjError, ValueError):
+            continue
+        fwd = analytic.get(WGS84, spec).transform(lon, lat)
+        inv_ref = base.get(spec, WGS84).transform(*fwd_ref)
+        inv = analytic.get(spec, WGS84).transform(*fwd_ref)
+        for direction, error in (
+            ("to_grid", np.hypot(fwd[0] - fwd_ref[0], fwd[1] - fwd_ref[1])),
+            ("to_latlon", _ground_metres(inv[0], inv[1], inv_ref[0], inv_ref[1])),
+        ):
+            max_error = float(np.max(error))
+            rows.append({
+                "zone": name,
+                "direction": direction,
+                "points": len(lon),
+                "analytic": isinstance(analytic.get(*((WGS84, spec) if direction == "to_grid" else (spec, WGS84))),
+                                       AnalyticTransformer),
+                "max_error_m": max_error,
+                "ok": bool(max_error <= TOLERANCE),
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.analytic",
+                                     description="Compare the analytic projection kernels with pyproj")
+    parser.add_argument("--steps", type=int, default=VALIDATE_STEPS,
+                        help="lattice points per side of each zone extent (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.steps < 2:
+        raise SystemExit("error: --steps must be at least 2")
+
+    rows = validate(args.steps)
+    print(f"{'zone':<12} {'direction':<10} {'points':>7} {'max error':>12}", file=sys.stderr)
+    for r in rows:
+        engine = "" if r["analytic"] else " (pyproj fallback)"
+        print(f"{r['zone']:<12} {r['direction']:<10} {r['points']:>7,} {r['max_error_m'] * 1000:>9.4f} mm"
+              f"{'' if r['ok'] else '  FAIL'}{engine}", file=sys.stderr)
+    return 0 if all(r["ok"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
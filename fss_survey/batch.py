@@ -0,0 +1,289 @@
+"""Columnar batch conversion engine.
+
+Works on whole NumPy columns: rows are grouped by zone and each group gets
+one ``transformer.transform`` call per chunk, bad rows are tracked with a
+validity mask instead of per-row try/except, and the result DataFrame is
+assembled from arrays rather than a list of dicts.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .convert import (
+    DEFAULT_CHUNK_SIZE,
+    ESM_ZONE_NAMES,
+    STATUS_AMBIGUOUS_ZONE,
+    STATUS_NO_ZONE,
+    STATUS_OK,
+    WGS84,
+    backproject_esm_zones,
+    dsm_to_esm,
+    esm_to_dsm,
+    map_distinct,
+    resolve_dsm_zones,
+    resolve_esm_zones,
+    status_array,
+    transform_grouped,
+)
+from .crs_pool import get_pool
+from .formats import FORMAT_CSV, ChunkReader, FrameWriter
+from .store import PointStore
+
+PREVIEW_ROWS = 1000
+# Columns the conversions read; anything else in an input file is skipped
+INPUT_COLUMNS = ("easting", "northing", "height", "point_id")
+
+GRID_ESM = "esm"
+GRID_DSM = "dsm"
+ROUTING_FIXED = "fixed"
+ROUTING_COLUMN = "column"
+ROUTING_AUTO = "auto"
+DEFAULT_ESM_ZONE = "Zone I"
+DSM_AUTO_ERROR = ("DSM zones share one grid origin, so they cannot be detected from "
+                  "coordinates; use a zone column or a fixed zone")
+
+
+def to_float_array(values):
+    """Coerce a column to float64, turning unparseable entries into NaN.
+
+    A float64 column is returned as it is, not copied (see ``fss_survey.store``).
+    """
+    if getattr(values, "dtype", None) == np.float64:
+        return np.asarray(values)
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def point_ids(df):
+    if "point_id" in df.columns:
+        return df["point_id"].to_numpy()
+    return np.array([f"P{i}" for i in df.index], dtype=object)
+
+
+def require_columns(df, columns):
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+
+def fixed_or_column_zones(df, routing, zone, zone_col):
+    if routing == ROUTING_FIXED:
+        return np.full(len(df), zone, dtype=object)
+    return df[zone_col].to_numpy(dtype=object)
+
+
+def heights(df):
+    if "height" in df.columns:
+        return df["height"].to_numpy()
+    return np.zeros(len(df))
+
+
+def esm_source_codes(df, e, n, routing, zone, zone_col, pool):
+    """``(epsg_codes, ambiguous)`` for the ESM zone of each row; ``ambiguous``
+    is None unless the zones were back-projected."""
+    if routing == ROUTING_AUTO:
+        return backproject_esm_zones(e, n, pool=pool)
+    return resolve_esm_zones(fixed_or_column_zones(df, routing, zone, zone_col)), None
+
+
+def dsm_source_zones(df, routing, zone, zone_col):
+    """``(major_zones, labels)`` for the DSM zone of each row."""
+    if routing == ROUTING_AUTO:
+        raise ValueError(DSM_AUTO_ERROR)
+    raw = fixed_or_column_zones(df, routing, zone, zone_col)
+    keys = resolve_dsm_zones(raw)
+    labels = np.where(keys == None, None, map_distinct(raw, lambda r: str(r).strip().upper()))
+    return keys, labels
+
+
+def input_columns(routing=ROUTING_FIXED, zone_col="zone", **_):
+    """The input columns a conversion with these options reads, for column-projected reads."""
+    if routing == ROUTING_COLUMN:
+        return INPUT_COLUMNS + (zone_col,)
+    return INPUT_COLUMNS
+
+
+def grid_to_latlon_frame(df, grid=GRID_ESM, routing=ROUTING_FIXED, zone=DEFAULT_ESM_ZONE, zone_col="zone",
+                         pool=None, zone_stats=None, progress=None):
+    """Convert an ``easting``/``northing`` DataFrame to lat/lon.
+
+    ``grid`` is ``"esm"`` (Kalianpur) or ``"dsm"``. ``routing`` picks each
+    row's zone: ``"fixed"`` uses ``zone`` for every row, ``"column"`` reads
+    ``zone_col`` (zone names, EPSG codes or DSM sheets) and ``"auto"``
+    back-projects (ESM only, see ``backproject_esm_zones``). Rows are then
+    grouped by zone with one vectorized transform per group; ``zone_stats``
+    collects per-zone row counts and timings.
+
+    Output columns: ``point_id``, ``zone``, ``lat``, ``lon``, ``height``,
+    ``status``, in input order. Invalid rows keep their place with NaN
+    coordinates and an error status.
+    """
+    pool = pool or get_pool()
+    require_columns(df, ["easting", "northing"] + ([zone_col] if routing == ROUTING_COLUMN else []))
+    e = to_float_array(df["easting"])
+    n = to_float_array(df["northing"])
+    input_ok = np.isfinite(e) & np.isfinite(n)
+    ambiguous = None
+
+    if grid == GRID_ESM:
+        keys, ambiguous = esm_source_codes(df, e, n, routing, zone, zone_col, pool)
+        labels = map_distinct(keys, ESM_ZONE_NAMES.get)
+        transformer_for = lambda code: pool.get(code, WGS84)
+    elif grid == GRID_DSM:
+        keys, labels = dsm_source_zones(df, routing, zone, zone_col)
+        transformer_for = lambda major: pool.get(f"dsm:{major}", WGS84)
+    else:
+        raise ValueError(f"Unknown grid system: {grid}")
+
+    lon, lat, valid = transform_grouped(keys, e, n, transformer_for, stats=zone_stats, progress=progress)
+
+    status = status_array(input_ok, valid, input_ok & (keys == None), STATUS_NO_ZONE)
+    if ambiguous is not None:
+        status[ambiguous] = STATUS_AMBIGUOUS_ZONE
+
+    return pd.DataFrame({
+        "point_id": point_ids(df),
+        "zone": labels,
+        "lat": lat,
+        "lon": lon,
+        "height": heights(df),
+        "status": status,
+    })
+
+
+def esm_to_dsm_frame(df, routing=ROUTING_FIXED, zone=DEFAULT_ESM_ZONE, zone_col="zone", pool=None):
+    """Convert an ESM ``easting``/``northing`` DataFrame to DSM grid.
+
+    The source Kalianpur zone is routed as in ``grid_to_latlon_frame``.
+    Every row goes through WGS84 in two array-wide stages, one transform
+    call per source zone and then one per DSM major zone, and the DSM
+    sheet is detected per row from the intermediate lat/lon.
+
+    Output columns: ``point_id``, ``esm_zone``, ``dsm_zone``,
+    ``dsm_easting``, ``dsm_northing``, ``lat``, ``lon``, ``height``,
+    ``status``.
+    """
+    pool = pool or get_pool()
+    require_columns(df, ["easting", "northing"] + ([zone_col] if routing == ROUTING_COLUMN else []))
+    e = to_float_array(df["easting"])
+    n = to_float_array(df["northing"])
+    codes, ambiguous = esm_source_codes(df, e, n, routing, zone, zone_col, pool)
+    esm_zones = map_distinct(codes, ESM_ZONE_NAMES.get)
+
+    res = esm_to_dsm(e, n, esm_zones, pool=pool)
+    status = res["status"]
+    status[np.isfinite(e) & np.isfinite(n) & (codes == None)] = STATUS_NO_ZONE
+    if ambiguous is not None:
+        status[ambiguous] = STATUS_AMBIGUOUS_ZONE
+
+    return pd.DataFrame({
+        "point_id": point_ids(df),
+        "esm_zone": esm_zones,
+        "dsm_zone": res["zone"],
+        "dsm_easting": res["easting"],
+        "dsm_northing": res["northing"],
+        "lat": res["lat"],
+        "lon": res["lon"],
+        "height": heights(df),
+        "status": status,
+    })
+
+
+def dsm_to_esm_frame(df, routing=ROUTING_FIXED, zone=None, zone_col="zone", pool=None):
+    """Convert a DSM ``easting``/``northing`` DataFrame to ESM grid.
+
+    The source DSM sheet comes from ``zone`` or ``zone_col`` (DSM sheets
+    cannot be back-projected). Rows go through WGS84 in two array-wide
+    stages and the Kalianpur zone is detected per row.
+
+    Output columns: ``point_id``, ``dsm_zone``, ``esm_zone``, ``esm_epsg``,
+    ``esm_easting``, ``esm_northing``, ``lat``, ``lon``, ``height``,
+    ``status``.
+    """
+    pool = pool or get_pool()
+    require_columns(df, ["easting", "northing"] + ([zone_col] if routing == ROUTING_COLUMN else []))
+    e = to_float_array(df["easting"])
+    n = to_float_array(df["northing"])
+    keys, labels = dsm_source_zones(df, routing, zone, zone_col)
+
+    res = dsm_to_esm(e, n, keys, pool=pool)
+    status = res["status"]
+    status[np.isfinite(e) & np.isfinite(n) & (keys == None)] = STATUS_NO_ZONE
+
+    return pd.DataFrame({
+        "point_id": point_ids(df),
+        "dsm_zone": labels,
+        "esm_zone": res["zone"],
+        "esm_epsg": res["epsg"],
+        "esm_easting": res["easting"],
+        "esm_northing": res["northing"],
+        "lat": res["lat"],
+        "lon": res["lon"],
+        "height": heights(df),
+        "status": status,
+    })
+
+
+def zone_stats_frame(zone_stats, grid=GRID_ESM):
+    """Tabulate ``zone_stats`` from ``grid_to_latlon_frame`` for display."""
+    rows = []
+    for key, entry in zone_stats.items():
+        label = ESM_ZONE_NAMES.get(key, key) if grid == GRID_ESM else f"DSM {key}"
+        seconds = entry["seconds"]
+        rows.append({
+            "zone": label,
+            "rows": entry["rows"],
+            "seconds": round(seconds, 4),
+            "points_per_sec": round(entry["rows"] / seconds) if seconds else None,
+        })
+    return pd.DataFrame(rows, columns=["zone", "rows", "seconds", "points_per_sec"])
+
+
+def stream_table(source, out, convert_frame, chunk_rows=DEFAULT_CHUNK_SIZE, progress=None, map_chunks=map,
+                 input_format=FORMAT_CSV, output_format=FORMAT_CSV, columns=None):
+    """Convert a file one chunk at a time, appending each result to ``out``.
+
+    ``convert_frame(chunk)`` maps an input DataFrame chunk to its result
+    frame. Only one chunk and its result are held in memory at once, so peak
+    memory depends on ``chunk_rows`` rather than the file size. ``columns``
+    limits which input columns are read (see ``input_columns``). ``progress``
+    is called after each chunk with the fraction of the input consumed.
+    ``map_chunks(convert_frame, chunks)`` must yield the results in input
+    order; it defaults to ``map`` and lets ``fss_survey.parallel`` convert
+    chunks on other processes.
+
+    ``input_format`` and ``output_format`` are ``"csv"``, ``"parquet"`` or
+    ``"feather"``; ``out`` must be opened to match (see
+    ``formats.open_output``). ``source`` may also be a ``PointStore``,
+    read in slices without parsing.
+
+    Returns a dict with ``rows``, ``failed``, ``chunks`` and a ``preview``
+    DataFrame holding the first ``PREVIEW_ROWS`` result rows.
+    """
+    if isinstance(source, PointStore):
+        reader = source.reader(chunk_rows, columns)
+    else:
+        reader = ChunkReader(source, input_format, chunk_rows, columns)
+    rows = failed = chunks = 0
+    preview = None
+
+    with FrameWriter(out, output_format) as writer:
+        for res in map_chunks(convert_frame, reader):
+            writer.write(res)
+
+            if preview is None:
+                preview = res.head(PREVIEW_ROWS)
+            rows += len(res)
+            failed += int((res["status"] != STATUS_OK).sum())
+            chunks += 1
+
+            if progress is not None:
+                progress(reader.fraction())
+
+    if progress is not None:
+        progress(1.0)
+    return {"rows": rows, "failed": failed, "chunks": chunks, "preview": preview}
+
+
+def stream_csv(source, out, convert_frame, chunk_rows=DEFAULT_CHUNK_SIZE, progress=None, map_chunks=map):
+    """``stream_table`` from CSV to CSV."""
+    return stream_table(source, out, convert_frame, chunk_rows=chunk_rows, progress=progress, map_chunks=map_chunks)
@@ -0,0 +1,340 @@
+"""Benchmarks for the calculator's conversion paths.
+
+    python -m fss_survey.bench
+    python -m fss_survey.bench --sizes 1,1000 --cases dms --json bench.json --csv bench.csv
+
+Each case runs on synthetic points spread over the India extent (fixed
+seed, so runs are comparable) at each requested size. Timing takes the best
+of ``--repeat`` runs, each looping enough times to last 0.2 s
+(``timeit`` autorange).
+Peak memory is measured in a separate run under ``tracemalloc``, which
+sees Python and NumPy allocations but not PROJ's own. Scalar cases replay
+what a tab does per point and are skipped above ``--max-scalar-points``.
+The ``io_`` cases write and read a batch result frame in each file format
+and also report the encoded size. The ``control_`` query cases search an
+index over the points, built before timing, from the midpoints between
+consecutive points. The ``parcel_`` cases count vertices, eight per
+parcel. The ``_lattice`` cases load, or on first use build,
+every zone's lattice before timing.
+"""
+
+import argparse
+import csv
+import io
+import json
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyproj
+
+from . import convert
+from .analytic import get_analytic_pool
+from .control import ControlPoints
+from .crs_pool import TransformerPool, get_pool, warm_up
+from .dms import dms_to_decimal
+from .dms_arrays import format_dms_array, parse_dms_array
+from .formats import FORMATS, frame_bytes, read_frame
+from .geodesic import geodesic, geodesic_array
+from .geodesy import bearing_latlon, haversine
+from .geodesy_arrays import bearing_latlon_array, haversine_array
+from .lattice import get_lattice_pool
+from .parcels import parcel_frames
+from .zone_index import detect_kalianpur_zones
+from .zones import DSM_PARAMS, ENHANCED_KALIANPUR_ZONES, detect_kalianpur_zone
+
+DEFAULT_SIZES = (1, 1_000, 100_000, 1_000_000)
+DEFAULT_SEED = 42
+MAX_SCALAR_POINTS = 100_000
+# Runs longer than this are not repeated
+LONG_RUN = 1.0
+INDIA_EXTENT = {"lat_min": 8.0, "lat_max": 37.0, "lon_min": 68.0, "lon_max": 97.5}
+PARCEL_VERTICES = 8
+FIELDS = ["case", "kind", "points", "seconds", "points_per_sec", "peak_mem_bytes", "loops", "bytes"]
+
+
+def india_points(n, seed=DEFAULT_SEED):
+    """Uniform WGS84 points over the India extent with their ESM and DSM
+    coordinates. Points that do not convert keep NaN grid coordinates and
+    no zone."""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(INDIA_EXTENT["lat_min"], INDIA_EXTENT["lat_max"], n)
+    lon = rng.uniform(INDIA_EXTENT["lon_min"], INDIA_EXTENT["lon_max"], n)
+    esm = convert.latlon_to_grid(lon, lat)
+    dsm = convert.esm_to_dsm(esm["easting"], esm["northing"], esm["zone"])
+    return {
+        "lat": lat,
+        "lon": lon,
+        # each point paired with the next, wrapping round, for distance/bearing
+        "lat_next": np.roll(lat, -1),
+        "lon_next": np.roll(lon, -1),
+        "esm_zone": np.where(esm["valid"], esm["zone"], None),
+        "esm_epsg": np.where(esm["valid"], esm["epsg"], None),
+        "esm_e": esm["easting"],
+        "esm_n": esm["northing"],
+        "dsm_zone": dsm["zone"],
+        "dsm_e": dsm["easting"],
+        "dsm_n": dsm["northing"],
+        "lat_dms": format_dms_array(lat, "lat"),
+        "lon_dms": format_dms_array(lon, "lon"),
+    }
+
+
+def io_inputs(p):
+    """A Batch Process result frame for the points, and its encoding in each format."""
+    n = len(p["lat"])
+    frame = pd.DataFrame({
+        "point_id": [f"P{i}" for i in range(n)],
+        "zone": np.where(p["esm_zone"] == None, "", p["esm_zone"]).astype(str),
+        "lat": p["lat"],
+        "lon": p["lon"],
+        "height": np.zeros(n),
+        "status": "Success",
+    })
+    return {"frame": frame, "encoded": {fmt: frame_bytes(frame, fmt) for fmt in FORMATS}}
+
+
+def control_inputs(p):
+    """A control point index over the points, and query points between them."""
+    return {
+        "store": ControlPoints(p["lat"], p["lon"]),
+        "lat": (p["lat"] + p["lat_next"]) / 2,
+        "lon": (p["lon"] + p["lon_next"]) / 2,
+    }
+
+
+def parcel_inputs(p):
+    """A parcel vertex table: each run of ``PARCEL_VERTICES`` points is an octagon of 50 m radius."""
+    n = len(p["lat"])
+    parcel = np.arange(n) // PARCEL_VERTICES
+    angle = 2 * np.pi * (np.arange(n) % PARCEL_VERTICES) / PARCEL_VERTICES
+    head = parcel * PARCEL_VERTICES
+    return pd.DataFrame({
+        "parcel_id": parcel,
+        "easting": p["lon"][head] * 111_000 + 50 * np.sin(angle),
+        "northing": p["lat"][head] * 111_000 + 50 * np.cos(angle),
+    })
+
+
+def build_transformers():
+    """Cold construction of every zone's transformer in a new pool; returns the count."""
+    pool = TransformerPool(dsm_params=DSM_PARAMS)
+    built = 0
+    for spec in [z['epsg'] for z in ENHANCED_KALIANPUR_ZONES.values()] + [f"dsm:{m}" for m in DSM_PARAMS]:
+        try:
+            pool.get(spec, convert.WGS84)
+            built += 1
+        except (pyproj.exceptions.ProjError, ValueError):
+            pass
+    return built
+
+
+def grid_to_latlon_single(p):
+    pool = get_pool()
+    for code, e, n in zip(p["esm_epsg"].tolist(), p["esm_e"].tolist(), p["esm_n"].tolist()):
+        if code is not None:
+            pool.get(code, convert.WGS84).transform(e, n)
+
+
+def zone_detection_single(p):
+    for lat, lon in zip(p["lat"].tolist(), p["lon"].tolist()):
+        detect_kalianpur_zone(lat, lon)
+
+
+def haversine_bearing_single(p):
+    for lat1, lon1, lat2, lon2 in zip(p["lat"].tolist(), p["lon"].tolist(),
+                                      p["lat_next"].tolist(), p["lon_next"].tolist()):
+        haversine(lat1, lon1, lat2, lon2)
+        bearing_latlon(lat1, lon1, lat2, lon2)
+
+
+def geodesic_single(p):
+    for lat1, lon1, lat2, lon2 in zip(p["lat"].tolist(), p["lon"].tolist(),
+                                      p["lat_next"].tolist(), p["lon_next"].tolist()):
+        geodesic(lat1, lon1, lat2, lon2)
+
+
+def dms_parse_single(p):
+    for s in p["lat_dms"].tolist():
+        dms_to_decimal(s)
+
+
+def haversine_bearing_bulk(p):
+    haversine_array(p["lat"], p["lon"], p["lat_next"], p["lon_next"])
+    bearing_latlon_array(p["lat"], p["lon"], p["lat_next"], p["lon_next"])
+
+
+# name -> (kind, function of the point dict)
+CASES = {
+    "grid_to_latlon_single": ("scalar", grid_to_latlon_single),
+    "grid_to_latlon_bulk": ("bulk", lambda p: convert.grid_to_latlon(p["esm_e"], p["esm_n"], epsg=p["esm_epsg"])),
+    "grid_to_latlon_analytic": ("bulk", lambda p: convert.grid_to_latlon(p["esm_e"], p["esm_n"], epsg=p["esm_epsg"],
+                                                                         pool=get_analytic_pool())),
+    "grid_to_latlon_lattice": ("bulk", lambda p: convert.grid_to_latlon(p["esm_e"], p["esm_n"], epsg=p["esm_epsg"],
+                                                                        pool=get_lattice_pool())),
+    "dsm_to_latlon_bulk": ("bulk", lambda p: convert.dsm_to_latlon(p["dsm_e"], p["dsm_n"], p["dsm_zone"])),
+    "dsm_to_latlon_analytic": ("bulk", lambda p: convert.dsm_to_latlon(p["dsm_e"], p["dsm_n"], p["dsm_zone"],
+                                                                       pool=get_analytic_pool())),
+    "dsm_to_latlon_lattice": ("bulk", lambda p: convert.dsm_to_latlon(p["dsm_e"], p["dsm_n"], p["dsm_zone"],
+                                                                      pool=get_lattice_pool())),
+    "esm_to_dsm_bulk": ("bulk", lambda p: convert.esm_to_dsm(p["esm_e"], p["esm_n"], p["esm_zone"])),
+    "esm_to_dsm_analytic": ("bulk", lambda p: convert.esm_to_dsm(p["esm_e"], p["esm_n"], p["esm_zone"],
+                                                                 pool=get_analytic_pool())),
+    "dsm_to_esm_bulk": ("bulk", lambda p: convert.dsm_to_esm(p["dsm_e"], p["dsm_n"], p["dsm_zone"])),
+    "dsm_to_esm_analytic": ("bulk", lambda p: convert.dsm_to_esm(p["dsm_e"], p["dsm_n"], p["dsm_zone"],
+                                                                 pool=get_analytic_pool())),
+    "zone_detection_single": ("scalar", zone_detection_single),
+    "zone_detection_bulk": ("bulk", lambda p: detect_kalianpur_zones(p["lat"], p["lon"])),
+    "haversine_bearing_single": ("scalar", haversine_bearing_single),
+    "haversine_bearing_bulk": ("bulk", haversine_bearing_bulk),
+    "geodesic_single": ("scalar", geodesic_single),
+    "geodesic_bulk": ("bulk", lambda p: geodesic_array(p["lat"], p["lon"], p["lat_next"], p["lon_next"])),
+    "dms_parse_single": ("scalar", dms_parse_single),
+    "dms_parse_bulk": ("bulk", lambda p: parse_dms_array(p["lat_dms"])),
+    "control_index": ("bulk", lambda p: ControlPoints(p["lat"], p["lon"])),
+    # control cases take the ``control_inputs`` dict
+    "control_nearest": ("control", lambda d: d["store"].nearest(d["lat"], d["lon"], 1)),
+    "control_nearest_k5": ("control", lambda d: d["store"].nearest(d["lat"], d["lon"], 5)),
+    "control_within_5km": ("control", lambda d: d["store"].within(d["lat"], d["lon"], 5.0)),
+    "parcel_areas": ("parcels", parcel_frames),
+    "parcel_areas_dms": ("parcels", lambda d: parcel_frames(d, dms=True)),
+}
+# Inputs prepared once per size for the cases of that kind
+INPUTS = {"io": io_inputs, "control": control_inputs, "parcels": parcel_inputs}
+# io cases take the ``io_inputs`` dict; the format is the last part of the name
+for fmt in FORMATS:
+    CASES[f"io_write_{fmt}"] = ("io", lambda d, fmt=fmt: frame_bytes(d["frame"], fmt))
+    CASES[f"io_read_{fmt}"] = ("io", lambda d, fmt=fmt: read_frame(io.BytesIO(d["encoded"][fmt]), fmt))
+
+
+def time_call(fn, repeat):
+    """Best seconds per call and the loop count used."""
+    timer = timeit.Timer(fn)
+    loops, total = timer.autorange()
+    best = total / loops
+    if best < LONG_RUN:
+        best = min([best] + [t / loops for t in timer.repeat(repeat - 1, loops)])
+    return best, loops
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def record(name, kind, points, seconds, peak, loops, size=None):
+    return {
+        "case": name,
+        "kind": kind,
+        "points": points,
+        "seconds": seconds,
+        "points_per_sec": points / seconds if seconds else None,
+        "peak_mem_bytes": peak,
+        "loops": loops,
+        "bytes": size,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, cases=None, seed=DEFAULT_SEED, repeat=3, max_scalar_points=MAX_SCALAR_POINTS, log=None):
+    """Run the selected cases (names or name prefixes) at each size and return result records."""
+    selected = [name for name in CASES if not cases or any(name.startswith(c) for c in cases)]
+    results = []
+
+    if not cases or any("transformer_construction".startswith(c) for c in cases):
+        seconds, loops = time_call(build_transformers, repeat)
+        results.append(record("transformer_construction", "setup", build_transformers(), seconds,
+                              peak_memory(build_transformers), loops))
+        if log:
+            log(results[-1])
+
+    warm_up()  # the cases below time conversions, not construction
+    if any(name.endswith("_lattice") for name in selected):
+        get_lattice_pool().preload()
+    for size in sizes:
+        points = india_points(size, seed)
+        prepared = {kind: make(points) for kind, make in INPUTS.items() if any(CASES[name][0] == kind for name in selected)}
+        for name in selected:
+            kind, fn = CASES[name]
+            if kind == "scalar" and size > max_scalar_points:
+                continue
+            data = prepared.get(kind, points)
+            call = lambda: fn(data)
+            seconds, loops = time_call(call, repeat)
+            encoded = len(data["encoded"][name.rsplit("_", 1)[1]]) if kind == "io" else None
+            results.append(record(name, kind, size, seconds, peak_memory(call), loops, encoded))
+            if log:
+                log(results[-1])
+    return results
+
+
+def environment():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pyproj": pyproj.__version__,
+        "proj": pyproj.proj_version_str,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def format_row(r):
+    rate = f"{r['points_per_sec']:,.0f}/s" if r["points_per_sec"] else "-"
+    size = f" {r['bytes'] / 2**20:>9.1f} MiB file" if r["bytes"] is not None else ""
+    return (f"{r['case']:<26} {r['points']:>9,} {r['seconds'] * 1000:>11.3f} ms {rate:>16} "
+            f"{r['peak_mem_bytes'] / 2**20:>9.1f} MiB{size}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.bench", description="FSS Survey Calculator benchmarks")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated point counts (default: %(default)s)")
+    parser.add_argument("--cases", help="comma-separated case names or prefixes (default: all)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=3, help="timing repeats, best is kept (default: %(default)s)")
+    parser.add_argument("--max-scalar-points", type=int, default=MAX_SCALAR_POINTS,
+                        help="skip per-point cases above this size (default: %(default)s)")
+    parser.add_argument("--json", help="write environment and results as JSON")
+    parser.add_argument("--csv", help="write results as CSV")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("transformer_construction")
+        print("\n".join(CASES))
+        return 0
+    try:
+        sizes = [int(s) for s in args.sizes.split(",")]
+    except ValueError:
+        raise SystemExit(f"error: --sizes must be comma-separated integers, got {args.sizes!r}")
+    if any(s < 1 for s in sizes):
+        raise SystemExit("error: sizes must be positive")
+    cases = args.cases.split(",") if args.cases else None
+
+    print(f"{'case':<26} {'points':>9} {'time/call':>14} {'throughput':>16} {'peak mem':>13}", file=sys.stderr)
+    results = run(sizes, cases, seed=args.seed, repeat=max(args.repeat, 1),
+                  max_scalar_points=args.max_scalar_points,
+                  log=lambda r: print(format_row(r), file=sys.stderr, flush=True))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Command-line bulk conversion.
+
+Reads a CSV with a header row from a file or stdin, converts it chunk by
+chunk and writes the input columns plus the result columns to a file or
+stdout::
+
+    python -m fss_survey grid2ll -i points.csv -o points_wgs84.csv
+    python -m fss_survey esm2dsm --zone "Zone IIa" < esm.csv > dsm.csv
+    python -m fss_survey dsm2esm --zone-col sheet -i dsm.csv
+
+NumPy and pyproj are imported only once a conversion actually runs, so
+``--help`` and argument errors return immediately. ``--metrics`` prints
+the run's JSON log line and its ``fss_survey.metrics`` counters, in the
+Prometheus text format, to stderr.
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+
+from . import metrics
+
+DEFAULT_CHUNK_ROWS = 100_000
+ENGINES = ("pyproj", "analytic", "lattice")
+DEG_FORMAT = "{:.9f}"
+METRE_FORMAT = "{:.4f}"
+
+# command -> (help, default x column, default y column, zone option help, output columns)
+# Output columns are (header, result key, format); format None means str().
+COMMANDS = {
+    "grid2ll": (
+        "Kalianpur grid (ESM) to WGS84 lat/lon", "easting", "northing",
+        "Kalianpur zone, e.g. 'Zone I', 'IIa' or 24378 (default: --epsg)",
+        [("lat", "lat", DEG_FORMAT), ("lon", "lon", DEG_FORMAT)],
+    ),
+    "ll2grid": (
+        "WGS84 lat/lon to Kalianpur grid (zone detected per point unless --epsg is given)", "lon", "lat",
+        None,
+        [("esm_zone", "zone", None), ("esm_epsg", "epsg", None),
+         ("easting", "easting", METRE_FORMAT), ("northing", "northing", METRE_FORMAT)],
+    ),
+    "dsm2ll": (
+        "DSM grid to WGS84 lat/lon", "easting", "northing",
+        "DSM sheet, e.g. '6E'",
+        [("lat", "lat", DEG_FORMAT), ("lon", "lon", DEG_FORMAT)],
+    ),
+    "esm2dsm": (
+        "Kalianpur grid (ESM) to DSM grid via WGS84", "easting", "northing",
+        "Kalianpur zone, e.g. 'Zone I', 'IIa' or 24378",
+        [("dsm_zone", "zone", None), ("dsm_easting", "easting", METRE_FORMAT),
+         ("dsm_northing", "northing", METRE_FORMAT)],
+    ),
+    "dsm2esm": (
+        "DSM grid to Kalianpur grid (ESM) via WGS84", "easting", "northing",
+        "DSM sheet, e.g. '6E'",
+        [("esm_zone", "zone", None), ("esm_epsg", "epsg", None),
+         ("esm_easting", "easting", METRE_FORMAT), ("esm_northing", "northing", METRE_FORMAT)],
+    ),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m fss_survey", description="FSS Survey Calculator bulk conversions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (help_text, x_col, y_col, zone_help, _) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text, description=help_text)
+        p.add_argument("-i", "--input", default="-", help="input CSV (default: stdin)")
+        p.add_argument("-o", "--output", default="-", help="output CSV (default: stdout)")
+        p.add_argument("--x-col", default=x_col, help=f"easting/longitude column (default: {x_col})")
+        p.add_argument("--y-col", default=y_col, help=f"northing/latitude column (default: {y_col})")
+        p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_ROWS, help="rows per chunk")
+        p.add_argument("--metrics", action="store_true", help="print timings and counters to stderr")
+        p.add_argument("--engine", choices=ENGINES, default="pyproj",
+                       help="projection engine: pyproj, the NumPy kernels of fss_survey.analytic, or the "
+                            "approximate interpolation of fss_survey.lattice (default: pyproj)")
+        if name in ("grid2ll", "ll2grid"):
+            p.add_argument("--epsg", type=int, help="Kalianpur EPSG code" + (" (default: 24378)" if name == "grid2ll" else ""))
+        if zone_help:
+            zone = p.add_mutually_exclusive_group(required=name != "grid2ll")
+            zone.add_argument("--zone", help=zone_help)
+            zone.add_argument("--zone-col", help="column holding the zone of each row")
+    return parser
+
+
+def parse_floats(values):
+    """Parse strings to a float64 array; unparseable entries become NaN."""
+    import numpy as np
+
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        out = np.empty(len(values))
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                out[i] = np.nan
+        return out
+
+
+def format_value(value, fmt):
+    if value is None:
+        return ""
+    if fmt is None:
+        return str(value)
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    return fmt.format(value)
+
+
+def make_converter(args):
+    """Return ``convert(x, y, zones) -> result dict`` for the parsed arguments."""
+    import numpy as np
+
+    from . import convert
+
+    esm = args.command in ("grid2ll", "esm2dsm")
+    if getattr(args, "zone", None) is not None:
+        resolve = convert.resolve_esm_zones if esm else convert.resolve_dsm_zones
+        if resolve(args.zone)[0] is None:
+            kind = "Kalianpur zone, e.g. 'Zone I', 'IIa' or 24378" if esm else "DSM sheet, e.g. '6E'"
+            raise SystemExit(f"error: unknown zone {args.zone!r} (expected a {kind})")
+
+    pool = None
+    if args.engine == "analytic":
+        from .analytic import get_analytic_pool
+        pool = get_analytic_pool()
+    elif args.engine == "lattice":
+        from .lattice import get_lattice_pool
+        pool = get_lattice_pool()
+
+    if args.command == "grid2ll":
+        if args.zone is None and args.zone_col is None:
+            epsg = args.epsg or convert.DEFAULT_ESM_EPSG
+            return lambda x, y, zones: convert.grid_to_latlon(x, y, epsg=epsg, pool=pool)
+        return lambda x, y, zones: convert.grid_to_latlon(x, y, epsg=convert.resolve_esm_zones(zones), pool=pool)
+    if args.command == "ll2grid":
+        if args.epsg is not None:
+            return lambda x, y, zones: convert.latlon_to_grid(x, y, epsg=args.epsg, pool=pool)
+
+        def latlon_to_detected_grid(x, y, zones):
+            res = convert.latlon_to_grid(x, y, pool=pool)
+            # Points outside every zone are projected in Zone I but have no zone to report
+            res["epsg"] = np.where(res["zone"] == None, None, res["epsg"])
+            return res
+        return latlon_to_detected_grid
+    if args.command == "dsm2ll":
+        return lambda x, y, zones: convert.dsm_to_latlon(x, y, zones, pool=pool)
+    if args.command == "esm2dsm":
+        return lambda x, y, zones: convert.esm_to_dsm(x, y, zones, pool=pool)
+    return lambda x, y, zones: convert.dsm_to_esm(x, y, zones, pool=pool)
+
+
+def column_index(header, name):
+    try:
+        return header.index(name)
+    except ValueError:
+        raise SystemExit(f"error: input has no column {name!r} (columns: {', '.join(header)})")
+
+
+def convert_chunk(rows, cols, args, converter, outputs, writer):
+    import numpy as np
+
+    x_idx, y_idx, zone_idx = cols
+    with metrics.timer("file_read", "csv", len(rows)):
+        x = parse_floats([r[x_idx] if x_idx < len(r) else "" for r in rows])
+        y = parse_floats([r[y_idx] if y_idx < len(r) else "" for r in rows])
+    if zone_idx is not None:
+        zones = [r[zone_idx] if zone_idx < len(r) else None for r in rows]
+    else:
+        zones = [args.zone] * len(rows) if getattr(args, "zone", None) else None
+
+    res = converter(x, y, zones)
+    invalid = ~res["valid"]
+    with metrics.timer("file_write", "csv", len(rows)):
+        # Failed rows get empty outputs rather than inf or a zone nothing was projected in
+        columns = [(np.where(invalid, None, res[key]) if invalid.any() else res[key]).tolist()
+                   for _, key, _ in outputs] + [res["status"].tolist()]
+        formats = [fmt for _, _, fmt in outputs] + [None]
+        for row, values in zip(rows, zip(*columns)):
+            writer.writerow(row + [format_value(v, fmt) for v, fmt in zip(values, formats)])
+    return int((~res["valid"]).sum())
+
+
+def run(args, src, dst):
+    outputs = COMMANDS[args.command][4]
+    reader = csv.reader(src)
+    writer = csv.writer(dst, lineterminator="\n")
+
+    converter = make_converter(args)
+    header = next(reader, None)
+    if header is None:
+        return 0
+    zone_col = getattr(args, "zone_col", None)
+    cols = (column_index(header, args.x_col), column_index(header, args.y_col),
+            column_index(header, zone_col) if zone_col else None)
+    writer.writerow(header + [name for name, _, _ in outputs] + ["status"])
+
+    rows_done = failed = 0
+    chunk = []
+    with metrics.run(f"cli_{args.command}", chunk_rows=args.chunk_size) as timed_run:
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= args.chunk_size:
+                failed += convert_chunk(chunk, cols, args, converter, outputs, writer)
+                rows_done += len(chunk)
+                timed_run.points = rows_done
+                chunk = []
+        if chunk:
+            failed += convert_chunk(chunk, cols, args, converter, outputs, writer)
+            rows_done += len(chunk)
+            timed_run.points = rows_done
+
+    print(f"{rows_done} rows converted, {failed} failed", file=sys.stderr)
+    return 1 if failed and failed == rows_done else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.chunk_size < 1:
+        raise SystemExit("error: --chunk-size must be positive")
+
+    if args.metrics:
+        metrics.enable()
+
+    src = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8-sig")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        return run(args, src, dst)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+        if args.metrics:
+            for entry in metrics.recent_runs()[:1]:
+                print(json.dumps(entry), file=sys.stderr)
+            sys.stderr.write(metrics.prometheus_text())
@@ -0,0 +1,425 @@
+"""Nearest control points (trig stations, benchmarks) to field points.
+
+``ControlPoints`` holds a table of stations with WGS84 lat/lon for every
+row, converted once through ``grid_to_latlon_frame`` when the stations are
+given in grid coordinates, and a grid-bucket index over them:
+
+* the globe is cut into square lat/lon cells of ``cell_deg`` degrees
+  (chosen from the station density unless given) and the stations are
+  sorted by cell, so each occupied cell is one slice of the sorted arrays,
+  found with ``np.searchsorted`` on the occupied cell keys;
+* a query visits rings of cells around its own, nearest first. Anything
+  outside the first ``r`` rings is at least ``min(r * cell, asin(cos(lat)
+  * sin(r * cell)))`` away on the sphere, so a k-nearest query stops once
+  its k-th candidate is nearer than that, and a radius query knows up front
+  how many rings it needs;
+* a query still open after ``MAX_RINGS`` rings (one far from every
+  station) is answered by a scan over all stations instead.
+
+Candidates are ranked by the chord between unit vectors, which orders
+points exactly as the great-circle distance does. The distances and
+bearings returned come from ``haversine_array`` and
+``bearing_latlon_array``, and, when stations and field points are both in
+the same grid zone, also from ``distance_3d_array`` and
+``bearing_grid_array`` on the grid coordinates.
+
+Queries run on whole arrays, ``QUERY_CHUNK`` field points at a time.
+``get_control_points`` keeps the stores loaded from files, so each file is
+indexed once per process.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .batch import grid_to_latlon_frame, point_ids, require_columns, to_float_array
+from .convert import STATUS_BAD_INPUT, STATUS_OK
+from .formats import FORMAT_CSV, format_from_name, read_frame
+from .geodesy import EARTH_RADIUS_KM
+from .geodesy_arrays import bearing_grid_array, bearing_latlon_array, distance_3d_array, haversine_array
+
+# Stations per cell the automatic cell size aims at, and its limits
+CELL_TARGET = 4
+MIN_CELL_DEG = 0.001
+MAX_CELL_DEG = 1.0
+MAX_RINGS = 16
+QUERY_CHUNK = 20_000
+MAX_STORES = 4
+DEFAULT_K = 1
+
+STATUS_NONE_WITHIN = "Error: no control point within radius"
+
+
+def frame_points(df, grid=None, lat_col="lat", lon_col="lon", pool=None, **routing):
+    """``(lat, lon, easting, northing, zones)`` arrays for a point table.
+
+    ``grid=None`` reads ``lat_col``/``lon_col`` and returns None for the
+    grid arrays. ``grid="esm"`` or ``"dsm"`` reads ``easting``/``northing``
+    and converts them with ``grid_to_latlon_frame`` (``routing`` passes its
+    ``routing``, ``zone`` and ``zone_col``); rows that fail to convert get
+    NaN coordinates.
+    """
+    if grid is None:
+        require_columns(df, [lat_col, lon_col])
+        return to_float_array(df[lat_col]), to_float_array(df[lon_col]), None, None, None
+    res = grid_to_latlon_frame(df, grid=grid, pool=pool, **routing)
+    ok = (res["status"] == STATUS_OK).to_numpy()
+    lat = np.where(ok, res["lat"].to_numpy(dtype=np.float64), np.nan)
+    lon = np.where(ok, res["lon"].to_numpy(dtype=np.float64), np.nan)
+    return lat, lon, to_float_array(df["easting"]), to_float_array(df["northing"]), res["zone"].to_numpy(dtype=object)
+
+
+def _valid(lat, lon):
+    return np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90)
+
+
+def _unit_vectors(lat, lon):
+    phi = np.radians(lat)
+    lam = np.radians(lon)
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def _chord2(angle):
+    """Squared chord of a great-circle angle in radians."""
+    return (2 * np.sin(np.minimum(angle, math.pi) / 2)) ** 2
+
+
+def auto_cell_deg(lat, lon):
+    """A cell size giving about ``CELL_TARGET`` stations per cell over the stations' extent."""
+    if not len(lat):
+        return MAX_CELL_DEG
+    lat_span = max(float(np.ptp(lat)), MIN_CELL_DEG)
+    lon_span = max(float(np.ptp(lon)), MIN_CELL_DEG) * max(math.cos(math.radians(float(np.mean(lat)))), 0.01)
+    cell = math.sqrt(CELL_TARGET * lat_span * lon_span / len(lat))
+    return min(max(cell, MIN_CELL_DEG), MAX_CELL_DEG)
+
+
+@lru_cache(maxsize=MAX_RINGS + 1)
+def _ring(r):
+    """``(d_row, d_col)`` offsets of the cells at Chebyshev distance ``r``."""
+    if r == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    side = np.arange(-r, r + 1)
+    inner = side[1:-1]
+    d_row = np.concatenate((np.full(len(side), -r), np.full(len(side), r), inner, inner))
+    d_col = np.concatenate((side, side, np.full(len(inner), -r), np.full(len(inner), r)))
+    return d_row, d_col
+
+
+class ControlPoints:
+    """Station table with a grid-bucket index for k-nearest and radius queries.
+
+    ``ids`` label the stations in results (row numbers when omitted).
+    ``easting``/``northing``/``zones`` keep the stations' own grid
+    coordinates when they were given in grid, for grid distances. Rows with
+    missing or out-of-range lat/lon are dropped and counted in ``skipped``.
+    """
+
+    def __init__(self, lat, lon, ids=None, easting=None, northing=None, zones=None, grid=None, cell_deg=None):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        keep = _valid(lat, lon)
+        self.skipped = int((~keep).sum())
+        if not keep.any():
+            raise ValueError("No control points with valid coordinates")
+        self.lat = lat[keep]
+        self.lon = lon[keep]
+        self.ids = (np.asarray(ids, dtype=object) if ids is not None else np.arange(len(lat)).astype(object))[keep]
+        self.grid = grid
+        self.easting = None if easting is None else np.asarray(easting, dtype=np.float64)[keep]
+        self.northing = None if northing is None else np.asarray(northing, dtype=np.float64)[keep]
+        self.zones = None if zones is None else np.asarray(zones, dtype=object)[keep]
+
+        with metrics.timer("control_index", points=len(self.lat)):
+            cell = float(cell_deg) if cell_deg else auto_cell_deg(self.lat, self.lon)
+            # Whole cells around the globe, an even count so rows tile pole to pole
+            self.ncols = 2 * max(180, math.ceil(180 / cell))
+            self.nrows = self.ncols // 2
+            self.cell_deg = 360 / self.ncols
+            keys = self._cell_keys(*self._cells(self.lat, self.lon))
+            self._order = np.argsort(keys, kind="stable")
+            self._keys, self._starts, self._counts = np.unique(keys[self._order], return_index=True,
+                                                                return_counts=True)
+            self._xyz = _unit_vectors(self.lat[self._order], self.lon[self._order])
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_frame(cls, df, grid=None, lat_col="lat", lon_col="lon", id_col="point_id", cell_deg=None, pool=None,
+                   **routing):
+        """Stations from a DataFrame, in lat/lon or grid (see ``frame_points``)."""
+        lat, lon, e, n, zones = frame_points(df, grid, lat_col, lon_col, pool, **routing)
+        ids = df[id_col].to_numpy(dtype=object) if id_col in df.columns else point_ids(df)
+        return cls(lat, lon, ids, e, n, zones, grid, cell_deg)
+
+    @classmethod
+    def load(cls, source, input_format=None, **options):
+        """Stations from a CSV, Parquet or Feather file (format from the name unless given)."""
+        fmt = input_format or format_from_name(getattr(source, "name", source), FORMAT_CSV)
+        return cls.from_frame(read_frame(source, fmt), **options)
+
+    def _cells(self, lat, lon):
+        h = self.cell_deg
+        rows = np.clip(np.floor((lat + 90) / h), 0, self.nrows - 1).astype(np.int64)
+        cols = np.floor((lon + 180) / h).astype(np.int64) % self.ncols
+        return rows, cols
+
+    def _cell_keys(self, rows, cols):
+        return rows * self.ncols + cols
+
+    def _covered(self, lat, r):
+        """Least angle (radians) from a point at ``lat`` to anything outside ``r`` rings of its cell."""
+        a = math.radians(r * self.cell_deg)
+        return np.minimum(a, np.arcsin(np.cos(np.radians(lat)) * math.sin(min(a, math.pi / 2))))
+
+    def _rings_needed(self, lat, angle):
+        """Rings a radius of ``angle`` radians needs at each ``lat``; ``MAX_RINGS + 1`` means scan."""
+        h = math.radians(self.cell_deg)
+        s = np.sin(np.minimum(angle, math.pi / 2)) / np.maximum(np.cos(np.radians(lat)), 1e-300)
+        with np.errstate(invalid="ignore"):
+            lon_rings = np.where(s < 1, np.ceil(np.arcsin(np.minimum(s, 1)) / h), np.inf)
+        need = np.maximum(np.ceil(angle / h), lon_rings)
+        need[angle >= math.pi / 2] = np.inf
+        return np.minimum(need, MAX_RINGS + 1).astype(np.int64)
+
+    def _candidates(self, queries, rows, cols, r):
+        """``(query, station)`` pairs for the stations in ring ``r`` around each query's cell."""
+        d_row, d_col = _ring(r)
+        cell_rows = rows[queries, None] + d_row
+        keys = self._cell_keys(cell_rows, (cols[queries, None] + d_col) % self.ncols)
+        pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        hit = (cell_rows >= 0) & (cell_rows < self.nrows) & (self._keys[pos] == keys)
+        cells = pos[hit]
+        counts = self._counts[cells]
+        pair_q = np.repeat(np.broadcast_to(queries[:, None], keys.shape)[hit], counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return pair_q, np.repeat(self._starts[cells], counts) + offsets
+
+    def _scan(self, xyz):
+        return ((self._xyz - xyz) ** 2).sum(axis=1)
+
+    def _nearest_chunk(self, lat, lon, k):
+        m = len(lat)
+        best_d = np.full((m, k), np.inf)
+        best_s = np.full((m, k), -1, dtype=np.int64)
+        ok = _valid(lat, lon)
+        xyz = _unit_vectors(np.where(ok, lat, 0), np.where(ok, lon, 0))
+        rows, cols = self._cells(np.where(ok, lat, 0), np.where(ok, lon, 0))
+        active = np.flatnonzero(ok)
+        for r in range(MAX_RINGS + 1):
+            if not len(active):
+                break
+            pair_q, pair_s = self._candidates(active, rows, cols, r)
+            if len(pair_q):
+                _merge(best_d, best_s, pair_q, pair_s, ((xyz[pair_q] - self._xyz[pair_s]) ** 2).sum(axis=1), k)
+            active = active[best_d[active, k - 1] > _chord2(self._covered(lat[active], r))]
+        for q in active.tolist():
+            d = self._scan(xyz[q])
+            top = np.argpartition(d, k - 1)[:k] if len(d) > k else np.arange(len(d))
+            top = top[np.argsort(d[top], kind="stable")]
+            best_d[q, :len(top)] = d[top]
+            best_s[q, :len(top)] = top
+        return best_s
+
+    def nearest(self, lat, lon, k=DEFAULT_K):
+        """Positions of the ``k`` nearest stations to each point, nearest first.
+
+        Returns an ``(n, k)`` int array of positions into ``self.lat`` etc.,
+        -1 where there is no station (invalid point, or fewer than ``k``
+        stations).
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        out = np.empty((len(lat), k), dtype=np.int64)
+        with metrics.timer("control_nearest", points=len(lat)):
+            for i in range(0, len(lat), QUERY_CHUNK):
+                s = self._nearest_chunk(lat[i:i + QUERY_CHUNK], lon[i:i + QUERY_CHUNK], k)
+                out[i:i + QUERY_CHUNK] = np.where(s >= 0, self._order[np.maximum(s, 0)], -1)
+        return out
+
+    def _within_chunk(self, lat, lon, radius):
+        ok = _valid(lat, lon)
+        xyz = _unit_vectors(np.where(ok, lat, 0), np.where(ok, lon, 0))
+        rows, cols = self._cells(np.where(ok, lat, 0), np.where(ok, lon, 0))
+        angle = radius / EARTH_RADIUS_KM
+        limit = _chord2(angle)
+        need = self._rings_needed(np.where(ok, lat, 0), np.full(len(lat), angle))
+        found_q, found_s, found_d = [], [], []
+        indexed = ok & (need <= MAX_RINGS)
+        for r in range(int(need[indexed].max()) + 1 if indexed.any() else 0):
+            pair_q, pair_s = self._candidates(np.flatnonzero(indexed & (need >= r)), rows, cols, r)
+            d = ((xyz[pair_q] - self._xyz[pair_s]) ** 2).sum(axis=1)
+            near = d <= limit
+            found_q.append(pair_q[near])
+            found_s.append(pair_s[near])
+            found_d.append(d[near])
+        for q in np.flatnonzero(ok & ~indexed).tolist():
+            d = self._scan(xyz[q])
+            near = np.flatnonzero(d <= limit)
+            found_q.append(np.full(len(near), q, dtype=np.int64))
+            found_s.append(near)
+            found_d.append(d[near])
+        if not found_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        q, s, d = np.concatenate(found_q), np.concatenate(found_s), np.concatenate(found_d)
+        order = np.lexsort((s, d, q))
+        return q[order], self._order[s[order]]
+
+    def within(self, lat, lon, radius_km):
+        """Every station within ``radius_km`` of each point, as ``(point, station)`` position pairs.
+
+        Pairs are sorted by point, then distance.
+        """
+        if not radius_km >= 0:
+            raise ValueError("radius_km must be zero or more")
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        found_q, found_s = [], []
+        with metrics.timer("control_within", points=len(lat)):
+            for i in range(0, len(lat), QUERY_CHUNK):
+                q, s = self._within_chunk(lat[i:i + QUERY_CHUNK], lon[i:i + QUERY_CHUNK], radius_km)
+                found_q.append(q + i)
+                found_s.append(s)
+        if not found_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(found_q), np.concatenate(found_s)
+
+    def nearest_frame(self, df, k=DEFAULT_K, grid=None, lat_col="lat", lon_col="lon", pool=None, **routing):
+        """The ``k`` nearest stations to each row of ``df``, one row per pair.
+
+        ``df`` is read like the stations (see ``frame_points``). Rows are in
+        input order, then rank; a row with invalid coordinates gives one row
+        with an error status.
+        """
+        lat, lon, e, n, zones = frame_points(df, grid, lat_col, lon_col, pool, **routing)
+        stations = self.nearest(lat, lon, k)
+        m = len(lat)
+        rank = np.broadcast_to(np.arange(1, k + 1), stations.shape)
+        found = stations >= 0
+        # Invalid rows keep one row (rank 1) to carry their status
+        keep = found | ((rank == 1) & ~found.any(axis=1)[:, None])
+        q = np.broadcast_to(np.arange(m)[:, None], stations.shape)[keep]
+        status = np.where(found[keep], STATUS_OK, STATUS_BAD_INPUT).astype(object)
+        return self._pairs_frame(df, q, stations[keep], rank[keep], status, lat, lon, grid, e, n, zones)
+
+    def within_frame(self, df, radius_km, grid=None, lat_col="lat", lon_col="lon", pool=None, **routing):
+        """Every station within ``radius_km`` of each row of ``df``, one row per pair.
+
+        Rows are in input order, then distance; a row with no station in
+        range, or with invalid coordinates, gives one row with an error
+        status.
+        """
+        lat, lon, e, n, zones = frame_points(df, grid, lat_col, lon_col, pool, **routing)
+        q, s = self.within(lat, lon, radius_km)
+        m = len(lat)
+        first = np.searchsorted(q, q)
+        rank = np.arange(len(q)) - first + 1
+        alone = np.setdiff1d(np.arange(m), q)
+        q = np.concatenate((q, alone))
+        s = np.concatenate((s, np.full(len(alone), -1, dtype=np.int64)))
+        rank = np.concatenate((rank, np.ones(len(alone), dtype=np.int64)))
+        status = np.full(len(q), STATUS_OK, dtype=object)
+        status[s < 0] = np.where(_valid(lat[alone], lon[alone]), STATUS_NONE_WITHIN, STATUS_BAD_INPUT)
+        order = np.argsort(q, kind="stable")
+        return self._pairs_frame(df, q[order], s[order], rank[order], status[order], lat, lon, grid, e, n, zones)
+
+    def _pairs_frame(self, df, q, s, rank, status, lat, lon, grid, e, n, zones):
+        found = s >= 0
+        s = np.maximum(s, 0)
+        nan = np.full(len(q), np.nan)
+        c_lat = np.where(found, self.lat[s], np.nan)
+        c_lon = np.where(found, self.lon[s], np.nan)
+        with np.errstate(invalid="ignore"):
+            out = {
+                "point_id": point_ids(df)[q],
+                "lat": lat[q],
+                "lon": lon[q],
+                "rank": rank,
+                "control_id": np.where(found, self.ids[s], None),
+                "control_lat": c_lat,
+                "control_lon": c_lon,
+                "distance_km": haversine_array(lat[q], lon[q], c_lat, c_lon) if len(q) else nan,
+                "bearing": bearing_latlon_array(lat[q], lon[q], c_lat, c_lon) if len(q) else nan,
+            }
+            # Grid figures only between points of the same grid zone
+            if grid is not None and grid == self.grid and len(q):
+                same = found & (zones[q] == self.zones[s]) & (zones[q] != None)
+                c_e = np.where(same, self.easting[s], np.nan)
+                c_n = np.where(same, self.northing[s], np.nan)
+                zero = np.zeros(len(q))
+                out["grid_distance_m"] = distance_3d_array(e[q], n[q], zero, c_e, c_n, zero)[0]
+                out["grid_bearing"] = bearing_grid_array(e[q], n[q], c_e, c_n)
+        out["status"] = status
+        return pd.DataFrame(out)
+
+
+def _merge(best_d, best_s, pair_q, pair_s, d, k):
+    """Fold candidate ``(query, station, chord2)`` triples into the per-query top ``k``.
+
+    ``pair_q`` is sorted. Each query's current best and candidates go into
+    one row of a padded matrix sorted along its rows, unless a crowded cell
+    makes the rows so uneven that one flat sort is cheaper.
+    """
+    starts = np.flatnonzero(np.r_[True, pair_q[1:] != pair_q[:-1]])
+    counts = np.diff(np.r_[starts, len(pair_q)])
+    qs = pair_q[starts]
+    width = k + int(counts.max())
+    if len(qs) * width <= 4 * (len(pair_q) + k * len(qs)):
+        rows = np.repeat(np.arange(len(qs)), counts)
+        cols = k + np.arange(len(pair_q)) - np.repeat(starts, counts)
+        all_d = np.full((len(qs), width), np.inf)
+        all_s = np.full((len(qs), width), -1, dtype=np.int64)
+        all_d[:, :k] = best_d[qs]
+        all_s[:, :k] = best_s[qs]
+        all_d[rows, cols] = d
+        all_s[rows, cols] = pair_s
+        top = np.argsort(all_d, axis=1, kind="stable")[:, :k]
+        best_d[qs] = np.take_along_axis(all_d, top, axis=1)
+        best_s[qs] = np.take_along_axis(all_s, top, axis=1)
+        return
+    all_q = np.concatenate((np.repeat(qs, k), pair_q))
+    all_d = np.concatenate((best_d[qs].ravel(), d))
+    all_s = np.concatenate((best_s[qs].ravel(), pair_s))
+    order = np.argsort(all_d, kind="stable")
+    order = order[np.argsort(all_q[order], kind="stable")]
+    all_q, all_d, all_s = all_q[order], all_d[order], all_s[order]
+    rank = np.arange(len(all_q)) - np.searchsorted(all_q, all_q)
+    top = rank < k
+    best_d[all_q[top], rank[top]] = all_d[top]
+    best_s[all_q[top], rank[top]] = all_s[top]
+
+
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def get_control_points(path, input_format=None, **options):
+    """The ``ControlPoints`` for a station file, loaded and indexed once per process.
+
+    Stores are kept per path, options and the file's size and modification
+    time, so an edited file is reloaded; the ``MAX_STORES`` most recently
+    used are kept.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size, input_format, tuple(sorted(options.items())))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is not None:
+            _stores.move_to_end(key)
+            return store
+    store = ControlPoints.load(path, input_format, **options)
+    with _stores_lock:
+        _stores[key] = store
+        while len(_stores) > MAX_STORES:
+            _stores.popitem(last=False)
+    return store
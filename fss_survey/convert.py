@@ -0,0 +1,295 @@
+"""Array coordinate conversions between WGS84, Kalianpur (ESM) and DSM grids.
+
+Every function takes scalars or array-likes, works on float64 NumPy arrays
+and returns a dict of arrays. Longitude/easting come before
+latitude/northing, matching the ``always_xy`` transformers in the pool.
+Rows that cannot be converted come back as NaN with ``valid`` set to False.
+
+Only NumPy and pyproj are imported here, so headless callers such as the CLI
+do not pay for pandas or Streamlit.
+"""
+
+import time
+
+import numpy as np
+from pyproj.exceptions import ProjError
+
+from . import metrics
+from .crs_pool import get_pool
+from .zone_index import KALIANPUR_INDEX, detect_dsm_zones, detect_kalianpur_zones
+from .zones import DSM_PARAMS, ENHANCED_KALIANPUR_ZONES
+
+WGS84 = "epsg:4326"
+DEFAULT_ESM_EPSG = 24378
+DEFAULT_CHUNK_SIZE = 100_000
+
+STATUS_OK = "Success"
+STATUS_BAD_INPUT = "Error: invalid coordinates"
+STATUS_TRANSFORM_FAILED = "Error: transform failed"
+STATUS_OUTSIDE_DSM = "Error: outside DSM coverage"
+STATUS_OUTSIDE_ESM = "Error: outside ESM (Kalianpur) coverage"
+STATUS_NO_ZONE = "Error: zone not found"
+STATUS_AMBIGUOUS_ZONE = "Error: zone ambiguous, add a zone column"
+
+# Lower-cased spellings accepted for a Kalianpur zone in a zone column
+ESM_ZONE_ALIASES = {}
+for _name, _info in ENHANCED_KALIANPUR_ZONES.items():
+    for _alias in (_name, _name.split()[-1], str(_info['epsg']), f"epsg:{_info['epsg']}"):
+        ESM_ZONE_ALIASES[_alias.lower()] = _info['epsg']
+ESM_ZONE_NAMES = {info['epsg']: name for name, info in ENHANCED_KALIANPUR_ZONES.items()}
+
+
+def transform_arrays(transformer, x, y, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, label=""):
+    """Transform coordinate arrays chunk by chunk.
+
+    Returns ``(out_x, out_y, valid)``. Rows whose input is not finite are
+    never passed to pyproj; rows pyproj cannot project come back as inf and
+    are also marked invalid. ``progress`` is called with the completed
+    fraction after each chunk. ``label`` names the transform in
+    ``fss_survey.metrics``.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    out_x = np.full(n, np.nan)
+    out_y = np.full(n, np.nan)
+    valid = np.isfinite(x) & np.isfinite(y)
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        mask = valid[start:stop]
+        with metrics.timer("transform", label, stop - start):
+            if mask.all():
+                out_x[start:stop], out_y[start:stop] = transformer.transform(x[start:stop], y[start:stop])
+            elif mask.any():
+                idx = np.flatnonzero(mask) + start
+                out_x[idx], out_y[idx] = transformer.transform(x[idx], y[idx])
+        if progress is not None:
+            progress(stop / n)
+
+    valid &= np.isfinite(out_x) & np.isfinite(out_y)
+    return out_x, out_y, valid
+
+
+def transform_grouped(keys, x, y, transformer_for, stats=None, progress=None):
+    """Transform rows grouped by ``keys``, one pyproj call per distinct key.
+
+    ``transformer_for(key)`` returns the transformer for a group. Rows whose
+    key is None, or whose transformer cannot be built, are left invalid.
+    Output stays in input order. If ``stats`` is a dict, ``stats[key]``
+    accumulates ``rows`` and ``seconds`` per group; ``progress`` is called
+    with the completed fraction after each group.
+    """
+    keys = np.asarray(keys, dtype=object)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(keys)
+    out_x = np.full(n, np.nan)
+    out_y = np.full(n, np.nan)
+    valid = np.zeros(n, dtype=bool)
+
+    key_list = keys.tolist()
+    distinct = [k for k in dict.fromkeys(key_list) if k is not None]
+    if len(distinct) == 1 and key_list.count(None) == 0:
+        groups = [(distinct[0], slice(None))]
+    else:
+        # Stable sort by group code so each group is one contiguous slice of ``order``
+        code_of = {k: i for i, k in enumerate(distinct)}
+        codes = np.fromiter((code_of.get(k, -1) for k in key_list), dtype=np.int64, count=n)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(distinct) + 1))
+        groups = [(k, order[bounds[i]:bounds[i + 1]]) for i, k in enumerate(distinct)]
+
+    done = 0
+    for key, idx in groups:
+        start = time.perf_counter()
+        try:
+            transformer = transformer_for(key)
+        except (ProjError, ValueError):
+            # A zone PROJ cannot build (e.g. an EPSG code missing from its
+            # database) fails its own rows, not the whole batch
+            transformer = None
+        if transformer is not None:
+            out_x[idx], out_y[idx], valid[idx] = transform_arrays(transformer, x[idx], y[idx], label=str(key))
+        rows = n if isinstance(idx, slice) else len(idx)
+        if stats is not None:
+            entry = stats.setdefault(key, {"rows": 0, "seconds": 0.0})
+            entry["rows"] += rows
+            entry["seconds"] += time.perf_counter() - start
+        done += rows
+        if progress is not None:
+            progress(done / n)
+    return out_x, out_y, valid
+
+
+def as_float_arrays(*values):
+    arrays = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in values]
+    return np.broadcast_arrays(*arrays)
+
+
+def finite(x, y):
+    return np.isfinite(x) & np.isfinite(y)
+
+
+def status_array(input_ok, valid, outside=None, outside_status=None):
+    """Per-row status strings; bad input takes precedence over other errors."""
+    status = np.full(len(valid), STATUS_OK, dtype=object)
+    status[~valid] = STATUS_TRANSFORM_FAILED
+    if outside is not None:
+        status[outside] = outside_status
+    status[~input_ok] = STATUS_BAD_INPUT
+    return status
+
+
+def as_key_array(value, n):
+    if isinstance(value, str) or np.ndim(value) == 0:
+        return np.full(n, value, dtype=object)
+    return np.asarray(value, dtype=object)
+
+
+def dsm_zone_key(zone):
+    """Pool key for a DSM sheet or major zone name (``"6E"`` -> ``"dsm:6"``)."""
+    return f"dsm:{str(zone)[:1]}"
+
+
+def grid_to_latlon(easting, northing, epsg=DEFAULT_ESM_EPSG, pool=None):
+    """Kalianpur grid to WGS84; ``epsg`` is one code or one code per point
+    (None where the point has no zone)."""
+    pool = pool or get_pool()
+    e, n = as_float_arrays(easting, northing)
+    if np.ndim(epsg) == 0:
+        lon, lat, valid = transform_arrays(pool.get(epsg, WGS84), e, n, label=str(epsg))
+        return {"lon": lon, "lat": lat, "valid": valid, "status": status_array(finite(e, n), valid)}
+    codes = np.asarray(epsg, dtype=object)
+    lon, lat, valid = transform_grouped(codes, e, n, lambda code: pool.get(code, WGS84))
+    return {"lon": lon, "lat": lat, "valid": valid,
+            "status": status_array(finite(e, n), valid, codes == None, STATUS_NO_ZONE)}
+
+
+def latlon_to_grid(lon, lat, epsg=None, pool=None):
+    """WGS84 to Kalianpur grid.
+
+    With ``epsg=None`` each point is projected into its detected Kalianpur
+    zone, falling back to Zone I outside coverage like the Lat/Lon to Grid
+    tab.
+    """
+    pool = pool or get_pool()
+    lon, lat = as_float_arrays(lon, lat)
+    if epsg is None:
+        zone, codes = detect_kalianpur_zones(lat, lon)
+        codes[codes == None] = DEFAULT_ESM_EPSG
+    else:
+        zone = np.full(len(lon), None, dtype=object)
+        codes = np.full(len(lon), epsg, dtype=object)
+    e, n, valid = transform_grouped(codes, lon, lat, lambda code: pool.get(WGS84, code))
+    return {"easting": e, "northing": n, "epsg": codes, "zone": zone, "valid": valid,
+            "status": status_array(finite(lon, lat), valid)}
+
+
+def dsm_to_latlon(easting, northing, dsm_zone, pool=None):
+    pool = pool or get_pool()
+    e, n = as_float_arrays(easting, northing)
+    zones = np.array([z if z is not None and str(z)[:1] in DSM_PARAMS else None
+                      for z in as_key_array(dsm_zone, len(e)).tolist()], dtype=object)
+    lon, lat, valid = transform_grouped(zones, e, n, lambda z: pool.get(dsm_zone_key(z), WGS84))
+    return {"lon": lon, "lat": lat, "valid": valid, "status": status_array(finite(e, n), valid)}
+
+
+def esm_to_dsm(easting, northing, esm_zone, pool=None):
+    """Kalianpur grid to DSM grid via WGS84, detecting the DSM sheet per point.
+
+    ``esm_zone`` is one zone or one per point, in any spelling
+    ``resolve_esm_zones`` accepts.
+    """
+    pool = pool or get_pool()
+    e, n = as_float_arrays(easting, northing)
+    src_codes = resolve_esm_zones(as_key_array(esm_zone, len(e)))
+    lon, lat, ok = transform_grouped(src_codes, e, n, lambda code: pool.get(code, WGS84))
+
+    dsm_zones, _ = detect_dsm_zones(lat, lon)
+    dsm_zones[~ok] = None
+    de, dn, valid = transform_grouped(dsm_zones, lon, lat, lambda z: pool.get(WGS84, dsm_zone_key(z)))
+    status = status_array(finite(e, n), valid, ok & (dsm_zones == None), STATUS_OUTSIDE_DSM)
+    status[finite(e, n) & (src_codes == None)] = STATUS_NO_ZONE
+    return {"easting": de, "northing": dn, "zone": dsm_zones, "lon": lon, "lat": lat, "valid": valid,
+            "status": status}
+
+
+def dsm_to_esm(easting, northing, dsm_zone, pool=None):
+    """DSM grid to Kalianpur grid via WGS84, detecting the ESM zone per point."""
+    pool = pool or get_pool()
+    e, n = as_float_arrays(easting, northing)
+    res = dsm_to_latlon(e, n, dsm_zone, pool=pool)
+    lon, lat, ok = res["lon"], res["lat"], res["valid"]
+
+    esm_zones, codes = detect_kalianpur_zones(lat, lon)
+    esm_zones[~ok] = None
+    codes[~ok] = None
+    ee, en, valid = transform_grouped(codes, lon, lat, lambda code: pool.get(WGS84, code))
+    return {"easting": ee, "northing": en, "zone": esm_zones, "epsg": codes, "lon": lon, "lat": lat,
+            "valid": valid, "status": status_array(finite(e, n), valid, ok & (esm_zones == None), STATUS_OUTSIDE_ESM)}
+
+
+def map_distinct(values, fn):
+    """``fn`` of each value as an object array, calling ``fn`` once per distinct value.
+
+    A zone column holds a handful of distinct values over millions of rows.
+    """
+    memo = {}
+    return np.array([memo[v] if v in memo else memo.setdefault(v, fn(v))
+                     for v in np.atleast_1d(np.asarray(values, dtype=object)).tolist()], dtype=object)
+
+
+def _esm_zone_code(v):
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return ESM_ZONE_ALIASES.get(str(v).strip().lower())
+
+
+def _dsm_major_zone(v):
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    s = str(v).strip().upper()
+    if s.startswith("DSM:"):
+        s = s[4:]
+    return s[:1] if s[:1] in DSM_PARAMS else None
+
+
+def resolve_esm_zones(values):
+    """EPSG codes for zone-column values such as ``Zone IIa``, ``IIa`` or
+    ``24379``; None where the value is not a Kalianpur zone."""
+    return map_distinct(values, _esm_zone_code)
+
+
+def resolve_dsm_zones(values):
+    """DSM major zones (``"5"`` .. ``"8"``) for zone-column values such as
+    ``6E``, ``6`` or ``dsm:6``; None where the value is not a DSM zone."""
+    return map_distinct(values, _dsm_major_zone)
+
+
+def backproject_esm_zones(easting, northing, pool=None):
+    """Infer the Kalianpur zone of grid points that carry no zone.
+
+    Every zone inverse-projects the points; a zone is consistent with a
+    point when the resulting lat/lon falls inside that zone. The zones share
+    almost the same false origin, so many points are consistent with
+    several zones; those are reported as ambiguous rather than guessed.
+    Returns ``(epsg_codes, ambiguous)`` with None where no single zone fits.
+    """
+    pool = pool or get_pool()
+    e, n = as_float_arrays(easting, northing)
+    codes = np.full(len(e), None, dtype=object)
+    matches = np.zeros(len(e), dtype=np.int64)
+    todo = np.flatnonzero(finite(e, n))
+    for pos, info in enumerate(ENHANCED_KALIANPUR_ZONES.values()):
+        try:
+            transformer = pool.get(info['epsg'], WGS84)
+        except (ProjError, ValueError):
+            continue
+        lon, lat, ok = transform_arrays(transformer, e[todo], n[todo], label=f"backproject:{info['epsg']}")
+        hit = todo[ok & (KALIANPUR_INDEX.lookup(lat, lon) == pos)]
+        codes[hit] = info['epsg']
+        matches[hit] += 1
+    ambiguous = matches > 1
+    codes[ambiguous] = None
+    return codes, ambiguous
@@ -0,0 +1,243 @@
+"""Process-wide cache of pyproj CRS and Transformer objects.
+
+Building a Transformer (and parsing a proj4 string into a CRS) costs far more
+than transforming a single point, so every conversion path shares one pool
+instead of calling ``Transformer.from_crs`` on each click.
+
+CRS specs accepted by the pool:
+
+* ``24378`` / ``"epsg:24378"`` -- any EPSG code
+* ``"dsm:6"`` / ``"dsm:6E"`` -- a DSM major zone from ``DSM_PARAMS``
+  (a sheet name is reduced to its major zone)
+
+pyproj keeps the PROJ object behind each CRS and Transformer per thread
+and rebuilds it on first use in a new thread, which for ``from_crs`` means
+repeating the whole operation search (~10 ms). Streamlit runs each rerun in
+a fresh script thread, so the pool stores transformers rebuilt from their
+resolved pipeline definition instead; those take well under a millisecond
+to recreate and give identical results.
+
+The four DSM major zones are built once into a read-only registry
+(``get_dsm_registry``) that the default pool pins, and ``start_warmup``
+builds everything else in a background thread at app start.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+from pyproj import CRS, Transformer
+from pyproj.exceptions import ProjError
+
+from . import metrics
+from .zones import DSM_PARAMS, ENHANCED_KALIANPUR_ZONES
+
+WGS84_KEY = "epsg:4326"
+
+# One DSM major zone: its CRS and both directions to and from WGS84
+DsmZone = namedtuple("DsmZone", ["proj4", "crs", "to_wgs84", "from_wgs84"])
+
+
+def dsm_proj4(p):
+    """Build the proj4 definition for one ``DSM_PARAMS`` entry."""
+    return (
+        f"+proj={p['projection']} +lat_0={p['latitude_of_origin']} +lon_0={p['central_meridian']} "
+        f"+k={p['scale_factor']} +x_0={p['false_easting']} +y_0={p['false_northing']} "
+        f"+a={p['semi_major']} +b={p['semi_minor']} +units=m +no_defs"
+    )
+
+
+def portable(transformer):
+    """``transformer`` rebuilt from its pipeline so other threads can recreate
+    it cheaply. Left as is when PROJ has not settled on a single operation
+    (its definition is then a placeholder)."""
+    definition = transformer.definition
+    if not definition.startswith("proj="):
+        return transformer
+    return Transformer.from_pipeline(definition)
+
+
+def build_dsm_registry(dsm_params=DSM_PARAMS):
+    """Read-only ``{major: DsmZone}`` for every entry of ``dsm_params``."""
+    registry = {}
+    for major, params in dsm_params.items():
+        with metrics.timer("transformer_build", f"dsm:{major}"):
+            proj4 = dsm_proj4(params)
+            crs = CRS.from_proj4(proj4)
+            registry[major] = DsmZone(
+                proj4=proj4,
+                crs=crs,
+                to_wgs84=portable(Transformer.from_crs(crs, WGS84_KEY, always_xy=True)),
+                from_wgs84=portable(Transformer.from_crs(WGS84_KEY, crs, always_xy=True)),
+            )
+    return MappingProxyType(registry)
+
+
+def normalize_crs_key(spec):
+    """Return the canonical pool key for a CRS spec (see module docstring)."""
+    if isinstance(spec, int):
+        return f"epsg:{spec}"
+    s = str(spec).strip().lower()
+    if s.isdigit():
+        return f"epsg:{s}"
+    if s.startswith("dsm:"):
+        major = s[4:].strip()[:1]
+        if not major:
+            raise ValueError(f"Invalid DSM zone spec: {spec}")
+        return f"dsm:{major}"
+    if s.startswith("epsg:"):
+        return s
+    raise ValueError(f"Unsupported CRS spec: {spec}")
+
+
+class TransformerPool:
+    """Thread-safe LRU cache of ``always_xy`` Transformers keyed by (source, target).
+
+    CRS objects are cached separately (unbounded, there are only a handful of
+    them) so that a DSM proj4 string is parsed once per process. A
+    ``dsm_registry`` from ``build_dsm_registry`` supplies the DSM CRSs and
+    pins their WGS84 transformers outside the LRU, so they are never
+    evicted.
+    """
+
+    def __init__(self, dsm_params=None, maxsize=32, dsm_registry=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.dsm_params = dict(dsm_params or {})
+        self.maxsize = maxsize
+        self._transformers = OrderedDict()
+        self._crs = {}
+        self._pinned = {}
+        self._pinned_crs = {}
+        for major, zone in (dsm_registry or {}).items():
+            self._pinned_crs[f"dsm:{major}"] = zone.crs
+            self._pinned[(f"dsm:{major}", WGS84_KEY)] = zone.to_wgs84
+            self._pinned[(WGS84_KEY, f"dsm:{major}")] = zone.from_wgs84
+        self._crs.update(self._pinned_crs)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def crs(self, spec):
+        key = normalize_crs_key(spec)
+        with self._lock:
+            cached = self._crs.get(key)
+        if cached is not None:
+            return cached
+
+        with metrics.timer("crs_build", key):
+            if key.startswith("dsm:"):
+                major = key[4:]
+                if major not in self.dsm_params:
+                    raise ValueError(f"Unknown DSM major zone: {major}")
+                crs = CRS.from_proj4(dsm_proj4(self.dsm_params[major]))
+            else:
+                crs = CRS.from_user_input(key.upper())
+
+        with self._lock:
+            return self._crs.setdefault(key, crs)
+
+    def get(self, src, dst):
+        """Return a cached ``always_xy`` Transformer from ``src`` to ``dst``."""
+        key = (normalize_crs_key(src), normalize_crs_key(dst))
+        with self._lock:
+            transformer = self._pinned.get(key)
+            if transformer is not None:
+                self.hits += 1
+                return transformer
+            transformer = self._transformers.get(key)
+            if transformer is not None:
+                self._transformers.move_to_end(key)
+                self.hits += 1
+                return transformer
+            self.misses += 1
+
+        # Build outside the lock so a slow build does not stall warm lookups.
+        src_crs, dst_crs = self.crs(key[0]), self.crs(key[1])
+        with metrics.timer("transformer_build", f"{key[0]}>{key[1]}"):
+            transformer = portable(Transformer.from_crs(src_crs, dst_crs, always_xy=True))
+
+        with self._lock:
+            existing = self._transformers.get(key)
+            if existing is not None:
+                self._transformers.move_to_end(key)
+                return existing
+            self._transformers[key] = transformer
+            while len(self._transformers) > self.maxsize:
+                self._transformers.popitem(last=False)
+                self.evictions += 1
+        return transformer
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._transformers),
+                "maxsize": self.maxsize,
+                "pinned": len(self._pinned),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop the LRU transformers and counters; pinned DSM entries stay."""
+        with self._lock:
+            self._transformers.clear()
+            self._crs = dict(self._pinned_crs)
+            self.hits = self.misses = self.evictions = 0
+
+
+_default_pool = None
+_dsm_registry = None
+_default_pool_lock = threading.Lock()
+_warmup_thread = None
+
+
+def get_dsm_registry():
+    """The process-wide DSM registry, built from ``DSM_PARAMS`` on first use."""
+    global _dsm_registry
+    with _default_pool_lock:
+        if _dsm_registry is None:
+            _dsm_registry = build_dsm_registry(DSM_PARAMS)
+        return _dsm_registry
+
+
+def get_pool():
+    """The process-wide pool for the zone tables in ``fss_survey.zones``."""
+    global _default_pool
+    registry = get_dsm_registry()
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = TransformerPool(dsm_params=DSM_PARAMS, maxsize=32, dsm_registry=registry)
+        return _default_pool
+
+
+def warm_up(pool=None):
+    """Build every Kalianpur zone's transformers to and from WGS84 in ``pool``.
+
+    Zones whose EPSG code PROJ does not know are skipped. Returns the number
+    of transformers available afterwards.
+    """
+    pool = pool or get_pool()
+    built = 0
+    for zone in ENHANCED_KALIANPUR_ZONES.values():
+        for src, dst in ((zone['epsg'], WGS84_KEY), (WGS84_KEY, zone['epsg'])):
+            try:
+                pool.get(src, dst)
+                built += 1
+            except (ProjError, ValueError):
+                pass
+    return built + pool.stats()["pinned"]
+
+
+def start_warmup():
+    """Run ``warm_up`` on the default pool in a daemon thread, once per process."""
+    global _warmup_thread
+    with _default_pool_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name="fss-crs-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
@@ -0,0 +1,40 @@
+"""Degrees-minutes-seconds parsing and formatting."""
+
+import re
+
+# D°M'S"H, e.g. 30°18'59.4"N; the closing quote is optional
+DMS_PATTERN = re.compile(r"(\d+)°(\d+)'(\d+(?:\.\d+)?)\"?([NSEW])")
+# D°M'S" as written by format_bearing, e.g. 45°30'12.5"
+BEARING_PATTERN = re.compile(r"(\d+)°(\d+)'(\d+(?:\.\d+)?)\"?$")
+
+
+def format_bearing(bearing_deg):
+    degrees_part = int(bearing_deg)
+    minutes_float = (bearing_deg - degrees_part) * 60
+    minutes_part = int(minutes_float)
+    seconds_part = round((minutes_float - minutes_part) * 60, 1)
+    return f"{degrees_part}°{minutes_part}'{seconds_part}\""
+
+
+def decimal_to_dms(decimal_degrees, coord_type):
+    abs_degrees = abs(decimal_degrees)
+    degrees = int(abs_degrees)
+    minutes_float = (abs_degrees - degrees) * 60
+    minutes = int(minutes_float)
+    seconds = (minutes_float - minutes) * 60
+    if coord_type == 'lat':
+        direction = 'N' if decimal_degrees >= 0 else 'S'
+    else:
+        direction = 'E' if decimal_degrees >= 0 else 'W'
+    return f"{degrees}°{minutes}'{seconds:.2f}\"{direction}"
+
+
+def dms_to_decimal(dms_str):
+    match = DMS_PATTERN.match(dms_str.strip())
+    if not match:
+        raise ValueError(f"Invalid DMS format: {dms_str}")
+    degrees, minutes, seconds, hemisphere = match.groups()
+    decimal = float(degrees) + float(minutes) / 60 + float(seconds) / 3600
+    if hemisphere in ['S', 'W']:
+        decimal = -decimal
+    return decimal
@@ -0,0 +1,101 @@
+"""Bulk DD <-> DMS conversion for whole coordinate columns.
+
+Parsing is bound by the regex, so it runs the precompiled ``DMS_PATTERN``
+in a single pass straight into a float array; formatting splits
+degrees/minutes/seconds with array arithmetic and only assembles the
+strings per value. Results are
+identical to ``dms_to_decimal``, ``decimal_to_dms`` and ``format_bearing``,
+except that bad values become NaN / an empty string instead of raising.
+``parse_bearing_array`` reads bearings back from ``format_bearing``
+strings or plain decimal degrees.
+"""
+
+import numpy as np
+
+from .dms import BEARING_PATTERN, DMS_PATTERN
+
+
+def _parse_one(value, match=DMS_PATTERN.match, nan=float("nan")):
+    m = match(value.strip()) if isinstance(value, str) else None
+    if m is None:
+        return nan
+    d, minutes, seconds, direction = m.groups()
+    decimal = float(d) + float(minutes) / 60 + float(seconds) / 3600
+    return -decimal if direction in ('S', 'W') else decimal
+
+
+def _parse_bearing(value, match=BEARING_PATTERN.match, nan=float("nan")):
+    if isinstance(value, str):
+        value = value.strip()
+        m = match(value)
+        if m is not None:
+            d, minutes, seconds = m.groups()
+            return float(d) + float(minutes) / 60 + float(seconds) / 3600
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return nan
+
+
+def _strings(values):
+    return np.atleast_1d(np.asarray(values, dtype=object)).tolist()
+
+
+def parse_dms_array(values):
+    """Parse a column of DMS strings.
+
+    Returns ``(decimal_degrees, error)``: a float64 array with NaN where the
+    value did not parse, and the matching boolean error mask.
+    """
+    values = _strings(values)
+    decimal = np.fromiter(map(_parse_one, values), dtype=np.float64, count=len(values))
+    return decimal, np.isnan(decimal)
+
+
+def parse_bearing_array(values):
+    """Parse a bearing column of decimal degrees or ``format_bearing`` strings.
+
+    Returns ``(bearings, error)`` like ``parse_dms_array``.
+    """
+    values = _strings(values)
+    bearings = np.fromiter(map(_parse_bearing, values), dtype=np.float64, count=len(values))
+    return bearings, np.isnan(bearings)
+
+
+def format_dms_array(decimal_degrees, coord_type):
+    """Format a decimal-degree column as ``decimal_to_dms`` strings; '' for NaN."""
+    dd = np.atleast_1d(np.asarray(decimal_degrees, dtype=np.float64))
+    ok = np.isfinite(dd)
+    abs_degrees = np.abs(np.where(ok, dd, 0.0))
+    degrees = np.trunc(abs_degrees)
+    minutes_float = (abs_degrees - degrees) * 60
+    minutes = np.trunc(minutes_float)
+    seconds = (minutes_float - minutes) * 60
+    positive, negative = ('N', 'S') if coord_type == 'lat' else ('E', 'W')
+    direction = np.where(dd >= 0, positive, negative)
+
+    out = np.full(len(dd), "", dtype=object)
+    idx = np.flatnonzero(ok)
+    out[idx] = [f"{d}°{m}'{s:.2f}\"{h}" for d, m, s, h in zip(
+        degrees[idx].astype(np.int64).tolist(), minutes[idx].astype(np.int64).tolist(),
+        seconds[idx].tolist(), direction[idx].tolist())]
+    return out
+
+
+def format_bearing_array(bearings):
+    """Format a bearing column as ``format_bearing`` strings; '' for NaN."""
+    b = np.atleast_1d(np.asarray(bearings, dtype=np.float64))
+    ok = np.isfinite(b)
+    b = np.where(ok, b, 0.0)
+    degrees_part = np.trunc(b)
+    minutes_float = (b - degrees_part) * 60
+    minutes_part = np.trunc(minutes_float)
+    seconds = (minutes_float - minutes_part) * 60
+
+    out = np.full(len(b), "", dtype=object)
+    idx = np.flatnonzero(ok)
+    # round() per value keeps Python's rounding, which np.round does not match
+    out[idx] = [f"{d}°{m}'{round(s, 1)}\"" for d, m, s in zip(
+        degrees_part[idx].astype(np.int64).tolist(), minutes_part[idx].astype(np.int64).tolist(),
+        seconds[idx].tolist())]
+    return out
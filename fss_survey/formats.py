@@ -0,0 +1,290 @@
+"""Batch file formats: CSV, Parquet and Arrow IPC (Feather v2).
+
+Parquet and Feather keep coordinates as typed float64 columns, so reading
+them skips text parsing and writing them skips float formatting. Reads
+are column-projected: only the columns a conversion uses are decoded
+(``usecols`` for CSV). Result frames are handed to Arrow with
+``Table.from_pandas``, which wraps the float64 NumPy buffers without
+copying them.
+
+pyarrow is imported only when a Parquet or Feather file is used, so
+CSV-only callers do not need it.
+"""
+
+import io
+import os
+import time
+
+import pandas as pd
+
+from . import metrics
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+FORMAT_FEATHER = "feather"
+FORMATS = (FORMAT_CSV, FORMAT_PARQUET, FORMAT_FEATHER)
+
+EXTENSIONS = {
+    ".csv": FORMAT_CSV,
+    ".parquet": FORMAT_PARQUET,
+    ".pq": FORMAT_PARQUET,
+    ".feather": FORMAT_FEATHER,
+    ".arrow": FORMAT_FEATHER,
+    ".ipc": FORMAT_FEATHER,
+}
+SUFFIXES = {FORMAT_CSV: ".csv", FORMAT_PARQUET: ".parquet", FORMAT_FEATHER: ".feather"}
+MIME_TYPES = {
+    FORMAT_CSV: "text/csv",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+    FORMAT_FEATHER: "application/vnd.apache.arrow.file",
+}
+# Result columns stored as float64 even when a chunk's values happen to be integers
+FLOAT_COLUMNS = {"lat", "lon", "height", "easting", "northing", "dsm_easting", "dsm_northing",
+                 "esm_easting", "esm_northing"}
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Feather files need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def format_from_name(name, default=FORMAT_CSV):
+    """The format implied by a file name's extension, or ``default``."""
+    return EXTENSIONS.get(os.path.splitext(str(name or ""))[1].lower(), default)
+
+
+def _rewind(source):
+    # Arrow files are opened more than once (schema, then data)
+    if hasattr(source, "seekable") and source.seekable():
+        source.seek(0)
+    return source
+
+
+def source_size(source):
+    """Size in bytes of a path or seekable file object, or None if unknown."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    size = getattr(source, "size", None)
+    if size is not None:
+        return size
+    try:
+        pos = source.tell()
+        end = source.seek(0, os.SEEK_END)
+        source.seek(pos)
+        return end
+    except (AttributeError, OSError):
+        return None
+
+
+def _usecols(columns):
+    return None if columns is None else set(columns).__contains__
+
+
+def _open_ipc(source, columns):
+    """An IPC file reader that only decodes the wanted ``columns``."""
+    pa = _arrow()
+    if columns is None:
+        return pa.ipc.open_file(_rewind(source))
+    schema = pa.ipc.open_file(_rewind(source)).schema
+    wanted = set(columns)
+    fields = [i for i, name in enumerate(schema.names) if name in wanted]
+    return pa.ipc.open_file(_rewind(source), options=pa.ipc.IpcReadOptions(included_fields=fields))
+
+
+def _parquet_projection(source, columns):
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return [c for c in _arrow().parquet.read_schema(_rewind(source)).names if c in wanted]
+
+
+def read_frame(source, fmt=FORMAT_CSV, columns=None, nrows=None):
+    """Read a whole file, or its first ``nrows`` rows, as a DataFrame.
+
+    ``columns`` lists the columns to read; names missing from the file are
+    ignored rather than raising, so optional columns can be asked for.
+    """
+    if nrows is not None and fmt != FORMAT_CSV:
+        return next(iter_frames(source, fmt, nrows, columns))
+    with metrics.timer("file_read", fmt) as timer:
+        if fmt == FORMAT_CSV:
+            df = pd.read_csv(source, usecols=_usecols(columns), nrows=nrows)
+        elif fmt == FORMAT_PARQUET:
+            df = _arrow().parquet.read_table(_rewind(source), columns=_parquet_projection(source, columns)).to_pandas()
+        elif fmt == FORMAT_FEATHER:
+            df = _open_ipc(source, columns).read_all().to_pandas()
+        else:
+            raise ValueError(f"Unknown file format: {fmt}")
+        timer.points = len(df)
+    return df
+
+
+def _indexed(chunk, start):
+    """``chunk`` numbered on from row ``start`` of the file, as ``read_csv`` chunks are."""
+    chunk.index = pd.RangeIndex(start, start + len(chunk))
+    return chunk
+
+
+class ChunkReader:
+    """Iterates a file as DataFrames of at most ``chunk_rows`` rows.
+
+    ``fraction()`` is the share of the input consumed so far: by bytes for
+    CSV, rows for Parquet and record batches for Feather.
+    """
+
+    def __init__(self, source, fmt=FORMAT_CSV, chunk_rows=100_000, columns=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown file format: {fmt}")
+        self.source = source
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.columns = columns
+        self._done = 0.0
+
+    def __iter__(self):
+        if self.fmt == FORMAT_PARQUET:
+            chunks = self._parquet_chunks()
+        elif self.fmt == FORMAT_FEATHER:
+            chunks = self._feather_chunks()
+        else:
+            chunks = self._csv_chunks()
+        return self._timed(chunks) if metrics.ENABLED else chunks
+
+    def _timed(self, chunks):
+        # Only the time spent producing each chunk, not the caller's work on it
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            metrics.record("file_read", time.perf_counter() - start, len(chunk), self.fmt)
+            yield chunk
+
+    def _csv_chunks(self):
+        total_bytes = source_size(self.source)
+        for chunk in pd.read_csv(self.source, chunksize=self.chunk_rows, usecols=_usecols(self.columns)):
+            if total_bytes and hasattr(self.source, "tell"):
+                self._done = self.source.tell() / total_bytes
+            yield chunk
+
+    def _parquet_chunks(self):
+        parquet = _arrow().parquet.ParquetFile(_rewind(self.source))
+        total_rows, rows = parquet.metadata.num_rows, 0
+        for batch in parquet.iter_batches(batch_size=self.chunk_rows,
+                                          columns=_parquet_projection(self.source, self.columns)):
+            chunk = _indexed(batch.to_pandas(), rows)
+            rows += batch.num_rows
+            self._done = rows / total_rows
+            yield chunk
+
+    def _feather_chunks(self):
+        reader = _open_ipc(self.source, self.columns)
+        batches, rows = reader.num_record_batches, 0
+        for i in range(batches):
+            batch = reader.get_batch(i)
+            # Record batches can be larger than a chunk; slices are zero-copy
+            for start in range(0, batch.num_rows, self.chunk_rows):
+                self._done = (i + min(start + self.chunk_rows, batch.num_rows) / batch.num_rows) / batches
+                chunk = _indexed(batch.slice(start, self.chunk_rows).to_pandas(), rows)
+                rows += len(chunk)
+                yield chunk
+
+    def fraction(self):
+        return min(self._done, 1.0)
+
+
+def iter_frames(source, fmt=FORMAT_CSV, chunk_rows=100_000, columns=None):
+    return iter(ChunkReader(source, fmt, chunk_rows, columns))
+
+
+def arrow_table(df, schema=None):
+    """``df`` as an Arrow table, float64 buffers wrapped rather than copied.
+
+    Without a ``schema``, all-null columns become strings and
+    ``FLOAT_COLUMNS`` become float64, so the first chunk of a stream fixes a
+    schema that later chunks can be cast to.
+    """
+    pa = _arrow()
+    if schema is not None:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif field.name in FLOAT_COLUMNS and pa.types.is_integer(field.type):
+            field = field.with_type(pa.float64())
+        fields.append(field)
+    schema = pa.schema(fields)
+    return table if schema.equals(table.schema) else table.cast(schema)
+
+
+class FrameWriter:
+    """Appends DataFrame chunks to ``out`` in one format.
+
+    ``out`` is a text file for CSV and a binary file for Parquet and
+    Feather (see ``open_output``). The Arrow writers take their schema
+    from the first chunk. ``close`` writes the footer and must be called;
+    the writer is also a context manager.
+    """
+
+    def __init__(self, out, fmt=FORMAT_CSV):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown file format: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.chunks = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        with metrics.timer("file_write", self.fmt, len(df)):
+            if self.fmt == FORMAT_CSV:
+                df.to_csv(self.out, header=self.chunks == 0, index=False)
+            else:
+                table = arrow_table(df, self._schema)
+                if self._writer is None:
+                    pa = _arrow()
+                    self._schema = table.schema
+                    if self.fmt == FORMAT_PARQUET:
+                        self._writer = pa.parquet.ParquetWriter(self.out, self._schema)
+                    else:
+                        # LZ4, as pyarrow.feather.write_feather does by default
+                        self._writer = pa.ipc.new_file(self.out, self._schema,
+                                                       options=pa.ipc.IpcWriteOptions(compression="lz4"))
+                self._writer.write_table(table)
+        self.chunks += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(path, fmt=FORMAT_CSV):
+    """Open ``path`` for a ``FrameWriter``: text for CSV, binary otherwise."""
+    if fmt == FORMAT_CSV:
+        return open(path, "w", newline="", encoding="utf-8")
+    return open(path, "wb")
+
+
+def frame_bytes(df, fmt=FORMAT_CSV):
+    """Serialize a whole DataFrame for download."""
+    if fmt == FORMAT_CSV:
+        with metrics.timer("file_write", fmt, len(df)):
+            return df.to_csv(index=False).encode("utf-8")
+    buffer = io.BytesIO()
+    with FrameWriter(buffer, fmt) as writer:
+        writer.write(df)
+    return buffer.getvalue()
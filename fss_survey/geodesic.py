@@ -0,0 +1,182 @@
+"""Ellipsoidal distance and bearing: the inverse geodesic problem on whole arrays.
+
+``haversine`` measures on a 6371 km sphere. Against the WGS84 geodesic
+that is off by up to about 0.56 % of the distance over India (5.5 km on
+a 1000 km baseline), and the bearing by up to about 0.19 degrees.
+``geodesic_array`` solves the inverse problem on an ellipsoid for whole
+arrays in one ``pyproj.Geod.inv`` call: Karney's algorithm from
+GeographicLib, run in C over the arrays and accurate to nanometres for
+any pair of points, nearly antipodal ones included.
+
+``distance_bearing_array`` picks the method: ``METHOD_SPHERICAL`` is the
+haversine fast path (``haversine_array``/``bearing_latlon_array``) and
+``METHOD_ELLIPSOIDAL`` the geodesic. The ellipsoids are WGS84 and Everest
+1830, the ``semi_major``/``semi_minor`` of ``DSM_PARAMS``. Pick the one of
+the coordinates' datum: the calculator's lat/lon are WGS84.
+
+``python -m fss_survey.geodesic`` prints the spherical error against the
+geodesic by baseline length; ``python -m fss_survey.bench --cases
+geodesic,haversine`` times both.
+"""
+
+import argparse
+import math
+import sys
+from functools import lru_cache
+
+import numpy as np
+from pyproj import Geod
+
+from . import metrics
+from .geodesy_arrays import bearing_latlon_array, haversine_array
+from .zones import DSM_PARAMS, ENHANCED_KALIANPUR_ZONES
+
+METHOD_SPHERICAL = "spherical"
+METHOD_ELLIPSOIDAL = "ellipsoidal"
+METHODS = (METHOD_SPHERICAL, METHOD_ELLIPSOIDAL)
+
+ELLIPSOID_WGS84 = "WGS84"
+ELLIPSOID_EVEREST = "Everest 1830"
+_EVEREST = next(iter(DSM_PARAMS.values()))
+# name -> (semi-major, semi-minor) axis in metres
+ELLIPSOIDS = {
+    ELLIPSOID_WGS84: (6378137.0, 6378137.0 * (1 - 1 / 298.257223563)),
+    ELLIPSOID_EVEREST: (_EVEREST["semi_major"], _EVEREST["semi_minor"]),
+}
+
+COMPARE_PAIRS = 200_000
+DEFAULT_SEED = 42
+# Upper edges of the baseline bands in ``compare``, km
+COMPARE_BANDS = (1, 10, 100, 1000, 4000)
+
+
+def check_options(method, ellipsoid):
+    """Raise ``ValueError`` for an unknown method or ellipsoid name."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown distance method: {method} (expected one of {', '.join(METHODS)})")
+    if ellipsoid not in ELLIPSOIDS:
+        raise ValueError(f"Unknown ellipsoid: {ellipsoid} (expected one of {', '.join(ELLIPSOIDS)})")
+
+
+@lru_cache(maxsize=None)
+def get_geod(ellipsoid=ELLIPSOID_WGS84):
+    """The ``pyproj.Geod`` for an ellipsoid name, built once per process."""
+    check_options(METHOD_ELLIPSOIDAL, ellipsoid)
+    a, b = ELLIPSOIDS[ellipsoid]
+    return Geod(a=a, b=b)
+
+
+def _bearing(azimuth, metres):
+    # Geod gives -180..180 and 180 for coincident points; the spherical bearing gives 0 there
+    return np.where(metres == 0, 0.0, (azimuth + 360) % 360)
+
+
+def geodesic(lat1, lon1, lat2, lon2, ellipsoid=ELLIPSOID_WGS84):
+    """``(distance_km, bearing)`` of one pair along the geodesic on ``ellipsoid``, unrounded."""
+    azimuth, _, metres = get_geod(ellipsoid).inv(lon1, lat1, lon2, lat2)
+    return metres / 1000, float(_bearing(azimuth, metres))
+
+
+def geodesic_array(lat1, lon1, lat2, lon2, ellipsoid=ELLIPSOID_WGS84, decimals=None):
+    """``(distance_km, bearing)`` arrays along the geodesic on ``ellipsoid``.
+
+    The bearing is the forward azimuth at the first point, 0-360 clockwise
+    from north. Pairs with a non-finite coordinate or a latitude beyond 90
+    degrees give NaN.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2)))
+    geod = get_geod(ellipsoid)
+    with metrics.timer("geodesic", ellipsoid, lat1.size):
+        azimuth, _, metres = geod.inv(lon1, lat1, lon2, lat2)
+    km, bearing = metres / 1000, _bearing(azimuth, metres)
+    if decimals is not None:
+        km, bearing = np.round(km, decimals), np.round(bearing, decimals)
+    return km, bearing
+
+
+def distance_bearing_array(lat1, lon1, lat2, lon2, method=METHOD_SPHERICAL, ellipsoid=ELLIPSOID_WGS84):
+    """``(distance_km, bearing)`` arrays by ``method``, unrounded.
+
+    ``method`` and ``ellipsoid`` are names, or arrays of names per pair;
+    each distinct combination is then solved in one call. The spherical
+    method does not use the ellipsoid.
+    """
+    if np.ndim(method) == 0 and np.ndim(ellipsoid) == 0:
+        check_options(method, ellipsoid)
+        if method == METHOD_SPHERICAL:
+            return haversine_array(lat1, lon1, lat2, lon2), bearing_latlon_array(lat1, lon1, lat2, lon2)
+        return geodesic_array(lat1, lon1, lat2, lon2, ellipsoid)
+
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2)))
+    method = np.broadcast_to(np.asarray(method, dtype=object), lat1.shape)
+    ellipsoid = np.broadcast_to(np.asarray(ellipsoid, dtype=object), lat1.shape)
+    km = np.full(lat1.shape, np.nan)
+    bearing = np.full(lat1.shape, np.nan)
+    for m, e in set(zip(method.ravel().tolist(), ellipsoid.ravel().tolist())):
+        sel = (method == m) & (ellipsoid == e)
+        km[sel], bearing[sel] = distance_bearing_array(lat1[sel], lon1[sel], lat2[sel], lon2[sel], m, e)
+    return km, bearing
+
+
+def _india_extent():
+    bounds = [z['bounds'] for z in ENHANCED_KALIANPUR_ZONES.values()]
+    return (min(b['lat_min'] for b in bounds), max(b['lat_max'] for b in bounds),
+            min(b['lon_min'] for b in bounds), max(b['lon_max'] for b in bounds))
+
+
+def compare(pairs=COMPARE_PAIRS, seed=DEFAULT_SEED, ellipsoid=ELLIPSOID_WGS84):
+    """Error of the spherical method against the geodesic, by baseline length.
+
+    First points are uniform over the Kalianpur zones' extent; second points
+    lie in a random direction at a log-uniform geodesic distance from 10 m
+    to ``COMPARE_BANDS[-1]`` km. Returns one dict per band with the largest
+    distance error in metres and parts per million, and the largest
+    bearing error in degrees.
+    """
+    rng = np.random.default_rng(seed)
+    lat_min, lat_max, lon_min, lon_max = _india_extent()
+    lat1 = rng.uniform(lat_min, lat_max, pairs)
+    lon1 = rng.uniform(lon_min, lon_max, pairs)
+    metres = 10 ** rng.uniform(1, math.log10(COMPARE_BANDS[-1] * 1000), pairs)
+    lon2, lat2, _ = get_geod(ellipsoid).fwd(lon1, lat1, rng.uniform(0, 360, pairs), metres)
+
+    km, bearing = geodesic_array(lat1, lon1, lat2, lon2, ellipsoid)
+    km_s, bearing_s = distance_bearing_array(lat1, lon1, lat2, lon2, METHOD_SPHERICAL)
+    error_m = np.abs(km_s - km) * 1000
+    error_deg = np.abs((bearing_s - bearing + 180) % 360 - 180)
+    rows = []
+    low = 0
+    for high in COMPARE_BANDS:
+        band = (km >= low) & (km < high)
+        rows.append({
+            "from_km": low,
+            "to_km": high,
+            "pairs": int(band.sum()),
+            "max_error_m": float(error_m[band].max()) if band.any() else 0.0,
+            "max_error_ppm": float((error_m[band] / (km[band] * 1000)).max() * 1e6) if band.any() else 0.0,
+            "max_bearing_error_deg": float(error_deg[band].max()) if band.any() else 0.0,
+        })
+        low = high
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.geodesic",
+                                     description="Compare the spherical distance and bearing with the geodesic")
+    parser.add_argument("--pairs", type=int, default=COMPARE_PAIRS, help="point pairs (default: %(default)s)")
+    parser.add_argument("--ellipsoid", default=ELLIPSOID_WGS84, choices=list(ELLIPSOIDS))
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+    if args.pairs < 1:
+        raise SystemExit("error: --pairs must be positive")
+
+    print(f"haversine (6371 km sphere) against the {args.ellipsoid} geodesic", file=sys.stderr)
+    print(f"{'baseline':<16} {'pairs':>8} {'max error':>12} {'relative':>10} {'bearing':>10}", file=sys.stderr)
+    for r in compare(args.pairs, args.seed, args.ellipsoid):
+        print(f"{r['from_km']:>5}-{r['to_km']:<5} km {r['pairs']:>8,} {r['max_error_m']:>10.3f} m "
+              f"{r['max_error_ppm']:>6,.0f} ppm {r['max_bearing_error_deg']:>8.4f}°", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Plane and spherical distance/bearing calculations.
+
+``decimals`` only affects presentation: pass None to get the unrounded
+value (which ``fss_survey.geodesy_arrays`` reproduces bit for bit).
+"""
+
+from math import radians, sin, cos, sqrt, atan2, degrees
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def rounded(value, decimals):
+    return value if decimals is None else round(value, decimals)
+
+
+def haversine(lat1, lon1, lat2, lon2, decimals=3):
+    R = EARTH_RADIUS_KM
+    lat1_rad, lon1_rad = radians(lat1), radians(lon1)
+    lat2_rad, lon2_rad = radians(lat2), radians(lon2)
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    a = sin(dlat / 2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return rounded(R * c, decimals)
+
+
+def bearing_latlon(lat1, lon1, lat2, lon2, decimals=2):
+    lat1_rad, lon1_rad = radians(lat1), radians(lon1)
+    lat2_rad, lon2_rad = radians(lat2), radians(lon2)
+    dlon = lon2_rad - lon1_rad
+    x = sin(dlon) * cos(lat2_rad)
+    y = cos(lat1_rad) * sin(lat2_rad) - sin(lat1_rad) * cos(lat2_rad) * cos(dlon)
+    bearing_rad = atan2(x, y)
+    bearing_deg = degrees(bearing_rad)
+    bearing_deg = (bearing_deg + 360) % 360
+    return rounded(bearing_deg, decimals)
+
+
+def distance_3d(x1, y1, z1, x2, y2, z2, decimals=3):
+    dx = x2 - x1
+    dy = y2 - y1
+    dz = z2 - z1
+    horizontal_distance = sqrt(dx**2 + dy**2)
+    slope_distance = sqrt(dx**2 + dy**2 + dz**2)
+    return rounded(horizontal_distance, decimals), rounded(slope_distance, decimals)
+
+
+def bearing_grid(x1, y1, x2, y2, decimals=2):
+    dx = x2 - x1
+    dy = y2 - y1
+    if dx == 0 and dy == 0:
+        return 0.0
+    bearing_rad = atan2(dx, dy)
+    bearing_deg = degrees(bearing_rad)
+    bearing_deg = (bearing_deg + 360) % 360
+    return rounded(bearing_deg, decimals)
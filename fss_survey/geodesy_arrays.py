@@ -0,0 +1,132 @@
+"""NumPy versions of the distance/bearing helpers for whole point-pair tables.
+
+Each kernel follows its scalar counterpart in ``fss_survey.geodesy``
+operation for operation. With ``exact=True`` (the default) the ``atan2``
+and ``**2`` steps go through libm (``math.atan2``/``math.pow``) like the
+scalar code does, because NumPy's SIMD ``arctan2`` and its ``x*x`` squaring
+can differ from libm in the last bit; the results then match the scalar
+functions (called with ``decimals=None``) bit for bit. ``exact=False``
+stays in NumPy and is several times faster at the cost of occasional
+1-ulp differences.
+
+Rounding is a presentation option: ``decimals=None`` returns full
+precision, an integer rounds with ``np.round``.
+"""
+
+import math
+
+import numpy as np
+
+from .geodesy import EARTH_RADIUS_KM
+
+PAIR_MODES = ("consecutive", "all")
+
+_libm_atan2 = np.frompyfunc(math.atan2, 2, 1)
+_libm_pow = np.frompyfunc(math.pow, 2, 1)
+
+
+def _atan2(y, x, exact):
+    if exact:
+        return np.asarray(_libm_atan2(y, x), dtype=np.float64)
+    return np.arctan2(y, x)
+
+
+def _sq(x, exact):
+    if exact:
+        return np.asarray(_libm_pow(x, 2.0), dtype=np.float64)
+    return x * x
+
+
+def _rounded(values, decimals):
+    return values if decimals is None else np.round(values, decimals)
+
+
+def _floats(*values):
+    return np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in values))
+
+
+def haversine_array(lat1, lon1, lat2, lon2, decimals=None, exact=True):
+    """Great-circle distance in km on the 6371 km sphere."""
+    lat1, lon1, lat2, lon2 = _floats(lat1, lon1, lat2, lon2)
+    lat1_rad, lon1_rad = np.radians(lat1), np.radians(lon1)
+    lat2_rad, lon2_rad = np.radians(lat2), np.radians(lon2)
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    a = _sq(np.sin(dlat / 2), exact) + np.cos(lat1_rad) * np.cos(lat2_rad) * _sq(np.sin(dlon / 2), exact)
+    c = 2 * _atan2(np.sqrt(a), np.sqrt(1 - a), exact)
+    return _rounded(EARTH_RADIUS_KM * c, decimals)
+
+
+def bearing_latlon_array(lat1, lon1, lat2, lon2, decimals=None, exact=True):
+    """Initial great-circle bearing in degrees, 0-360 clockwise from north."""
+    lat1, lon1, lat2, lon2 = _floats(lat1, lon1, lat2, lon2)
+    lat1_rad, lon1_rad = np.radians(lat1), np.radians(lon1)
+    lat2_rad, lon2_rad = np.radians(lat2), np.radians(lon2)
+    dlon = lon2_rad - lon1_rad
+    x = np.sin(dlon) * np.cos(lat2_rad)
+    y = np.cos(lat1_rad) * np.sin(lat2_rad) - np.sin(lat1_rad) * np.cos(lat2_rad) * np.cos(dlon)
+    bearing_deg = np.degrees(_atan2(x, y, exact))
+    return _rounded((bearing_deg + 360) % 360, decimals)
+
+
+def distance_3d_array(x1, y1, z1, x2, y2, z2, decimals=None, exact=True):
+    """``(horizontal, slope)`` grid distances in metres."""
+    x1, y1, z1, x2, y2, z2 = _floats(x1, y1, z1, x2, y2, z2)
+    dx2 = _sq(x2 - x1, exact)
+    dy2 = _sq(y2 - y1, exact)
+    dz2 = _sq(z2 - z1, exact)
+    horizontal = np.sqrt(dx2 + dy2)
+    slope = np.sqrt(dx2 + dy2 + dz2)
+    return _rounded(horizontal, decimals), _rounded(slope, decimals)
+
+
+def bearing_grid_array(x1, y1, x2, y2, decimals=None, exact=True):
+    """Grid bearing in degrees, 0-360 clockwise from grid north; 0 for coincident points."""
+    x1, y1, x2, y2 = _floats(x1, y1, x2, y2)
+    dx = x2 - x1
+    dy = y2 - y1
+    bearing_deg = (np.degrees(_atan2(dx, dy, exact)) + 360) % 360
+    bearing_deg = np.where((dx == 0) & (dy == 0), 0.0, bearing_deg)
+    return _rounded(bearing_deg, decimals)
+
+
+def pair_indices(n, mode="consecutive"):
+    """``(from, to)`` row indices for ``n`` points.
+
+    ``"consecutive"`` pairs each point with the next (traverse legs);
+    ``"all"`` gives every unordered pair ``i < j``, which is ``n*(n-1)/2``
+    rows, so keep ``n`` to a few thousand.
+    """
+    if mode == "consecutive":
+        idx = np.arange(max(n - 1, 0))
+        return idx, idx + 1
+    if mode == "all":
+        return np.triu_indices(n, k=1)
+    raise ValueError(f"Unknown pair mode: {mode} (expected one of {', '.join(PAIR_MODES)})")
+
+
+def latlon_legs(lat, lon, mode="consecutive", decimals=None, exact=True):
+    """Distance (km) and bearing for point pairs from one lat/lon table."""
+    lat, lon = _floats(lat, lon)
+    i, j = pair_indices(len(lat), mode)
+    return {
+        "from": i,
+        "to": j,
+        "distance_km": haversine_array(lat[i], lon[i], lat[j], lon[j], decimals=decimals, exact=exact),
+        "bearing": bearing_latlon_array(lat[i], lon[i], lat[j], lon[j], decimals=decimals, exact=exact),
+    }
+
+
+def grid_legs(easting, northing, height=None, mode="consecutive", decimals=None, exact=True):
+    """Horizontal/slope distance (m) and grid bearing for point pairs from one grid table."""
+    e, n = _floats(easting, northing)
+    h = np.zeros_like(e) if height is None else np.asarray(height, dtype=np.float64)
+    i, j = pair_indices(len(e), mode)
+    horizontal, slope = distance_3d_array(e[i], n[i], h[i], e[j], n[j], h[j], decimals=decimals, exact=exact)
+    return {
+        "from": i,
+        "to": j,
+        "horizontal": horizontal,
+        "slope": slope,
+        "bearing": bearing_grid_array(e[i], n[i], e[j], n[j], decimals=decimals, exact=exact),
+    }
@@ -0,0 +1,294 @@
+"""Background batch jobs that survive reconnects and restarts.
+
+A job converts one grid file to lat/lon like ``stream_table``, but on an
+executor thread rather than in the caller's thread, under a job ID that
+any session can poll with ``JobManager.status``. Each job owns a
+directory under the manager's work directory::
+
+    <workdir>/<job_id>/job.json        state, rewritten after every chunk
+    <workdir>/<job_id>/input.<ext>     the uploaded file, copied on submit
+    <workdir>/<job_id>/parts/NNNNN.*   one converted file per chunk
+    <workdir>/<job_id>/result.<ext>    the parts joined, once done
+
+A chunk counts as done only once its part file has been renamed into
+place and ``job.json`` records it, so a job that is cancelled, fails or is
+cut off by a restart resumes from its first unfinished chunk. On start
+the manager marks jobs left queued or running by a previous process as
+``"interrupted"``; ``resume`` picks them up again.
+
+Jobs run one chunk at a time on a ``ThreadPoolExecutor`` of
+``max_workers`` threads (``FSS_JOB_WORKERS``, default 1). Further jobs
+wait in its queue.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .batch import PREVIEW_ROWS, grid_to_latlon_frame, input_columns
+from .convert import DEFAULT_CHUNK_SIZE, STATUS_OK
+from .formats import FORMAT_CSV, SUFFIXES, ChunkReader, FrameWriter, format_from_name, open_output, read_frame
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_INTERRUPTED = "interrupted"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+RESUMABLE_STATUSES = (STATUS_FAILED, STATUS_CANCELLED, STATUS_INTERRUPTED)
+
+JOB_FILE = "job.json"
+
+
+def _write_json(path, data):
+    # Written beside the target and renamed over it, so a reader never sees half a file
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _copy_source(source, path):
+    if isinstance(source, (str, os.PathLike)):
+        shutil.copyfile(source, path)
+        return
+    if hasattr(source, "seekable") and source.seekable():
+        source.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f)
+
+
+def _join_parts(parts, path, fmt):
+    """Join the per-chunk files into one file of the same format."""
+    if fmt == FORMAT_CSV:
+        # Every part starts with the header row; keep only the first
+        with open(path, "wb") as out:
+            for i, part in enumerate(parts):
+                with open(part, "rb") as f:
+                    if i:
+                        f.readline()
+                    shutil.copyfileobj(f, out)
+        return
+    with open_output(path, fmt) as out, FrameWriter(out, fmt) as writer:
+        for part in parts:
+            writer.write(read_frame(part, fmt))
+
+
+class JobManager:
+    """Runs batch jobs on an executor and keeps their state in ``workdir``."""
+
+    def __init__(self, workdir, max_workers=1):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.workdir = workdir
+        os.makedirs(workdir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._cancel = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fss-job")
+        self._recover()
+
+    def _dir(self, job_id):
+        return os.path.join(self.workdir, job_id)
+
+    def _recover(self):
+        for job_id in os.listdir(self.workdir):
+            try:
+                with open(os.path.join(self._dir(job_id), JOB_FILE), encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if state["status"] in ACTIVE_STATUSES:
+                state["status"] = STATUS_INTERRUPTED
+                _write_json(os.path.join(self._dir(job_id), JOB_FILE), state)
+            self._jobs[job_id] = state
+
+    def _save(self, state, **changes):
+        with self._lock:
+            state.update(changes, updated=time.time())
+            snapshot = dict(state)
+        _write_json(os.path.join(self._dir(state["id"]), JOB_FILE), snapshot)
+
+    def submit(self, source, name, output_format=FORMAT_CSV, chunk_rows=DEFAULT_CHUNK_SIZE, **options):
+        """Queue a ``grid_to_latlon_frame`` conversion of ``source`` and return its job ID.
+
+        ``source`` is a path or a file object; it is copied into the job
+        directory before this returns, so the caller can drop it. ``name``
+        is the original file name, which sets the input format.
+        ``options`` are the ``grid_to_latlon_frame`` keyword arguments.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        input_format = format_from_name(name)
+        os.makedirs(os.path.join(self._dir(job_id), "parts"))
+        input_path = os.path.join(self._dir(job_id), "input" + SUFFIXES[input_format])
+        _copy_source(source, input_path)
+        now = time.time()
+        state = {
+            "id": job_id,
+            "name": name,
+            "input": input_path,
+            "input_format": input_format,
+            "output_format": output_format,
+            "chunk_rows": int(chunk_rows),
+            "options": options,
+            "status": STATUS_QUEUED,
+            "created": now,
+            "updated": now,
+            "seconds": 0.0,
+            "rows": 0,
+            "failed": 0,
+            "chunks": 0,
+            "fraction": 0.0,
+            "zone_stats": [],
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = state
+        self._start(state)
+        return job_id
+
+    def _start(self, state):
+        event = threading.Event()
+        with self._lock:
+            self._cancel[state["id"]] = event
+        self._save(state, status=STATUS_QUEUED, error=None)
+        self._executor.submit(self._run, state, event)
+
+    def resume(self, job_id):
+        """Requeue a failed, cancelled or interrupted job; False if it cannot be resumed."""
+        state = self._jobs.get(job_id)
+        if state is None or state["status"] not in RESUMABLE_STATUSES:
+            return False
+        self._start(state)
+        return True
+
+    def cancel(self, job_id):
+        """Stop a queued or running job after its current chunk; it stays resumable."""
+        event = self._cancel.get(job_id)
+        if event is None or self._jobs[job_id]["status"] not in ACTIVE_STATUSES:
+            return False
+        event.set()
+        return True
+
+    def status(self, job_id):
+        """A copy of the job's state, or None for an unknown ID."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            return None if state is None else dict(state)
+
+    def jobs(self):
+        """Every known job's state, newest first."""
+        with self._lock:
+            states = [dict(s) for s in self._jobs.values()]
+        return sorted(states, key=lambda s: s["created"], reverse=True)
+
+    def result_path(self, job_id):
+        """Path of a finished job's output file, else None."""
+        state = self.status(job_id)
+        return state["result"] if state and state["status"] == STATUS_DONE else None
+
+    def preview(self, job_id, rows=PREVIEW_ROWS):
+        """The first ``rows`` result rows of a finished job, else None."""
+        path = self.result_path(job_id)
+        return None if path is None else read_frame(path, self._jobs[job_id]["output_format"], nrows=rows)
+
+    def remove(self, job_id):
+        """Delete a job that is not queued or running, with all its files."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None or state["status"] in ACTIVE_STATUSES:
+                return False
+            del self._jobs[job_id]
+            self._cancel.pop(job_id, None)
+        shutil.rmtree(self._dir(job_id), ignore_errors=True)
+        return True
+
+    def _run(self, state, event):
+        if event.is_set():
+            self._save(state, status=STATUS_CANCELLED)
+            return
+        self._save(state, status=STATUS_RUNNING)
+        start = time.perf_counter()
+        seconds = state["seconds"]
+        try:
+            with metrics.run("batch_job", job=state["id"], input_format=state["input_format"],
+                             output_format=state["output_format"], **state["options"]) as timed_run:
+                finished = self._convert(state, event, lambda: seconds + time.perf_counter() - start)
+                timed_run.points = state["rows"]
+        except Exception as e:
+            self._save(state, status=STATUS_FAILED, error=str(e), seconds=seconds + time.perf_counter() - start)
+            return
+        if finished:
+            self._save(state, status=STATUS_DONE, fraction=1.0, seconds=seconds + time.perf_counter() - start)
+        else:
+            self._save(state, status=STATUS_CANCELLED, seconds=seconds + time.perf_counter() - start)
+
+    def _convert(self, state, event, elapsed):
+        """Convert the chunks not yet done; False if cancelled part way."""
+        job_dir = self._dir(state["id"])
+        fmt, options = state["output_format"], state["options"]
+        suffix = SUFFIXES[fmt]
+        if state.get("result") and os.path.exists(state["result"]):
+            # Interrupted after the result was saved: only the clean-up is left
+            self._remove_inputs(state)
+            return True
+        zone_stats = {key: {"rows": rows, "seconds": seconds} for key, rows, seconds in state["zone_stats"]}
+        reader = ChunkReader(state["input"], state["input_format"], state["chunk_rows"], input_columns(**options))
+
+        for i, chunk in enumerate(reader):
+            # Chunks finished before an interruption are read past, not redone
+            if i < state["chunks"]:
+                continue
+            if event.is_set():
+                return False
+            res = grid_to_latlon_frame(chunk, zone_stats=zone_stats, **options)
+            part = os.path.join(job_dir, "parts", f"{i:05d}{suffix}")
+            with open_output(part + ".tmp", fmt) as out, FrameWriter(out, fmt) as writer:
+                writer.write(res)
+            os.replace(part + ".tmp", part)
+            self._save(state,
+                       rows=state["rows"] + len(res),
+                       failed=state["failed"] + int((res["status"] != STATUS_OK).sum()),
+                       chunks=i + 1,
+                       fraction=reader.fraction(),
+                       seconds=elapsed(),
+                       zone_stats=[[key, e["rows"], e["seconds"]] for key, e in zone_stats.items()])
+
+        parts = [os.path.join(job_dir, "parts", f"{i:05d}{suffix}") for i in range(state["chunks"])]
+        result = os.path.join(job_dir, "result" + suffix)
+        # Parts and input are deleted only once the result is in place and recorded
+        _join_parts(parts, result + ".tmp", fmt)
+        os.replace(result + ".tmp", result)
+        self._save(state, result=result)
+        self._remove_inputs(state)
+        return True
+
+    def _remove_inputs(self, state):
+        shutil.rmtree(os.path.join(self._dir(state["id"]), "parts"), ignore_errors=True)
+        if os.path.exists(state["input"]):
+            os.remove(state["input"])
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """The process-wide manager, working in ``$FSS_JOB_DIR`` (default: a
+    ``fss_jobs`` directory under the system temp directory) with
+    ``$FSS_JOB_WORKERS`` job threads."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            workdir = os.environ.get("FSS_JOB_DIR") or os.path.join(tempfile.gettempdir(), "fss_jobs")
+            workers = int(os.environ.get("FSS_JOB_WORKERS") or 1)
+            _default_manager = JobManager(workdir, max_workers=workers)
+        return _default_manager
@@ -0,0 +1,460 @@
+"""Approximate transforms interpolated from precomputed lattices.
+
+For previews and QA passes over huge files, where speed matters more than
+the last centimetre. For a zone pair (a Kalianpur zone or DSM major zone
+to WGS84, or back) ``build_lattice`` transforms a regular ``size`` x
+``size`` lattice of nodes over the zone's coverage, its ``bounds`` or the
+union of its sheets' ``extent``, widened by ``MARGIN_DEG``, with the exact
+pyproj transformer. ``LatticeTransformer`` then answers ``transform`` by
+interpolating between the four (bilinear) or sixteen (bicubic,
+Catmull-Rom) nodes around each point, on whole arrays. Points outside the
+lattice, or next to a node PROJ could not transform, go to the exact
+transformer.
+
+Building a lattice also measures its error: points of every cell, at its
+centre, edge midpoints and quarter points, are transformed exactly and
+compared with both interpolations. The largest difference, in ground
+metres for lat/lon output or grid metres otherwise, is the pair's
+``error_m``. Lattices are kept on disk under
+``FSS_LATTICE_DIR`` (default: ``fss_lattices`` in the temp directory),
+keyed by the pair, the PROJ pipeline and the size, so each is built once
+per machine.
+
+``LatticePool`` has the ``get(src, dst)`` method of a
+``TransformerPool`` and goes wherever ``pool=`` is accepted:
+
+    res = grid_to_latlon_frame(df, zone="Zone I", pool=get_lattice_pool())
+
+A pair without a known coverage, or whose error exceeds the pool's
+``tolerance_m``, is answered by the exact transformer. ``refine_frame``
+converts chosen rows of a result again exactly. ``python -m
+fss_survey.lattice`` prints each zone's error, checked against random
+points.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pyproj.exceptions import ProjError
+
+from . import metrics
+from .batch import grid_to_latlon_frame
+from .convert import WGS84
+from .crs_pool import get_pool, normalize_crs_key
+from .zones import DSM_LCC_ZONES, DSM_PARAMS, ENHANCED_KALIANPUR_ZONES
+
+LATTICE_SIZE = 513
+MARGIN_DEG = 0.5
+BILINEAR = "bilinear"
+BICUBIC = "bicubic"
+INTERPOLATIONS = (BILINEAR, BICUBIC)
+# Bump when the lattice layout or build changes, so stale files are not reused
+FORMAT_VERSION = 1
+BOUNDARY_STEPS = 200
+# Offsets within each cell, in steps, where the build compares with the exact transform
+ERROR_SAMPLES = ((0.5, 0.5), (0.5, 0.0), (0.0, 0.5), (0.25, 0.25), (0.75, 0.25),
+                 (0.25, 0.75), (0.75, 0.75), (0.25, 0.0), (0.0, 0.25))
+VALIDATE_POINTS = 200_000
+
+_WGS84_KEY = normalize_crs_key(WGS84)
+
+
+def lattice_dir():
+    return os.environ.get("FSS_LATTICE_DIR") or os.path.join(tempfile.gettempdir(), "fss_lattices")
+
+
+def coverage(spec):
+    """``(lon_min, lat_min, lon_max, lat_max)`` of a Kalianpur or DSM zone spec, or None."""
+    key = normalize_crs_key(spec)
+    if key.startswith("dsm:"):
+        extents = [z["extent"] for sheet, z in DSM_LCC_ZONES.items() if sheet[:1] == key[4:]]
+        if not extents:
+            return None
+        return (min(e[0] for e in extents), min(e[1] for e in extents),
+                max(e[2] for e in extents), max(e[3] for e in extents))
+    for info in ENHANCED_KALIANPUR_ZONES.values():
+        if f"epsg:{info['epsg']}" == key:
+            b = info['bounds']
+            return b['lon_min'], b['lat_min'], b['lon_max'], b['lat_max']
+    return None
+
+
+def _box_outline(lon_min, lat_min, lon_max, lat_max, steps=BOUNDARY_STEPS):
+    t = np.linspace(0, 1, steps)
+    lon = np.concatenate((lon_min + t * (lon_max - lon_min), np.full(steps, lon_max),
+                          lon_max - t * (lon_max - lon_min), np.full(steps, lon_min)))
+    lat = np.concatenate((np.full(steps, lat_min), lat_min + t * (lat_max - lat_min),
+                          np.full(steps, lat_max), lat_max - t * (lat_max - lat_min)))
+    return lon, lat
+
+
+def _domain(base, src, dst):
+    """``(x_min, y_min, x_max, y_max)`` in source coordinates for a pair, or None."""
+    box = coverage(dst) if src == _WGS84_KEY else coverage(src)
+    if box is None:
+        return None
+    lon_min, lat_min, lon_max, lat_max = box
+    lon_min, lat_min = lon_min - MARGIN_DEG, max(lat_min - MARGIN_DEG, -90.0)
+    lon_max, lat_max = lon_max + MARGIN_DEG, min(lat_max + MARGIN_DEG, 90.0)
+    if src == _WGS84_KEY:
+        return lon_min, lat_min, lon_max, lat_max
+    # The zone's outline in grid coordinates; its bounding box holds the whole zone
+    x, y = base.get(WGS84, src).transform(*_box_outline(lon_min, lat_min, lon_max, lat_max))
+    ok = np.isfinite(x) & np.isfinite(y)
+    if not ok.any():
+        return None
+    return float(x[ok].min()), float(y[ok].min()), float(x[ok].max()), float(y[ok].max())
+
+
+def _ground_metres(a, b):
+    # Small differences of lon + i*lat in degrees as metres on the ground
+    d = a - b
+    return np.hypot(d.real * np.cos(np.radians(b.imag)) * 111_320.0, d.imag * 110_574.0)
+
+
+def _cubic_weights(t):
+    t2 = t * t
+    t3 = t2 * t
+    return (-t3 + 2 * t2 - t) / 2, (3 * t3 - 5 * t2 + 2) / 2, (-3 * t3 + 4 * t2 + t) / 2, (t3 - t2) / 2
+
+
+def _cell_ok(finite, interpolation):
+    """Cells whose interpolation only reads finite nodes."""
+    if interpolation == BILINEAR:
+        return finite[:-1, :-1] & finite[1:, :-1] & finite[:-1, 1:] & finite[1:, 1:]
+    ok = np.zeros((finite.shape[0] - 1, finite.shape[1] - 1), dtype=bool)
+    # Bicubic reads one more node on each side, so the outermost cells are left out
+    ok[1:-1, 1:-1] = np.lib.stride_tricks.sliding_window_view(finite, (4, 4)).all(axis=(2, 3))
+    return ok
+
+
+class LatticeTransformer:
+    """Interpolated transform over a lattice, with the ``transform`` method of
+    an ``always_xy`` pyproj Transformer.
+
+    ``lattice`` is a ``build_lattice`` dict: ``nodes`` (complex ``x + iy``
+    outputs, one row per lattice row), ``origin`` and ``step`` in source
+    coordinates, and ``error_m`` per interpolation. Points the lattice does
+    not cover go to ``exact`` and are counted in ``exact_points``.
+    """
+
+    def __init__(self, lattice, exact, interpolation=BILINEAR):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation: {interpolation} (expected one of {', '.join(INTERPOLATIONS)})")
+        self.exact = exact
+        self.interpolation = interpolation
+        self.nodes = lattice["nodes"]
+        self.x0, self.y0 = (float(v) for v in lattice["origin"])
+        self.dx, self.dy = (float(v) for v in lattice["step"])
+        self.error_m = float(lattice["error_m"][INTERPOLATIONS.index(interpolation)])
+        self._flat = self.nodes.ravel()
+        self._ok = _cell_ok(np.isfinite(self.nodes), interpolation).ravel()
+        self.exact_points = 0
+
+    @property
+    def size(self):
+        return self.nodes.shape[1]
+
+    def _interpolate(self, fx, fy, i, j):
+        nx = self.nodes.shape[1]
+        tx, ty = fx - i, fy - j
+        flat = self._flat
+        k = j * nx + i
+        if self.interpolation == BILINEAR:
+            v00, v10, v01, v11 = flat[k], flat[k + 1], flat[k + nx], flat[k + nx + 1]
+            return v00 + tx * (v10 - v00) + ty * (v01 - v00) + (tx * ty) * (v11 - v10 - v01 + v00)
+        wx, wy = _cubic_weights(tx), _cubic_weights(ty)
+        out = 0
+        for b in range(4):
+            row = k + (b - 1) * nx - 1
+            out = out + wy[b] * (wx[0] * flat[row] + wx[1] * flat[row + 1] + wx[2] * flat[row + 2] + wx[3] * flat[row + 3])
+        return out
+
+    def transform(self, xx, yy):
+        x = np.asarray(xx, dtype=np.float64)
+        y = np.asarray(yy, dtype=np.float64)
+        ny, nx = self.nodes.shape
+        fx = (x - self.x0) / self.dx
+        fy = (y - self.y0) / self.dy
+        # NaN fails every comparison, so non-finite input goes to the exact transformer
+        inside = (fx >= 0) & (fx < nx - 1) & (fy >= 0) & (fy < ny - 1)
+        i = np.where(inside, fx, 0).astype(np.int64)
+        j = np.where(inside, fy, 0).astype(np.int64)
+        ok = inside & self._ok[j * (nx - 1) + i]
+        if ok.all():
+            out = self._interpolate(fx, fy, i, j)
+            return out.real, out.imag
+        out = np.empty(x.shape, dtype=np.complex128)
+        out[ok] = self._interpolate(fx[ok], fy[ok], i[ok], j[ok])
+        rest = ~ok
+        self.exact_points += int(rest.sum())
+        ex, ey = self.exact.transform(x[rest], y[rest])
+        out[rest] = np.asarray(ex) + 1j * np.asarray(ey)
+        return out.real, out.imag
+
+
+def build_lattice(base, src, dst, size=LATTICE_SIZE):
+    """Exact results on a ``size`` x ``size`` lattice over the pair's coverage, and their error.
+
+    Returns None for a pair without a known coverage. See ``LatticeTransformer``
+    for the dict layout.
+    """
+    domain = _domain(base, src, dst)
+    if domain is None:
+        return None
+    x_min, y_min, x_max, y_max = domain
+    exact = base.get(src, dst)
+    xs = np.linspace(x_min, x_max, size)
+    ys = np.linspace(y_min, y_max, size)
+    gx, gy = np.meshgrid(xs, ys)
+    with metrics.timer("lattice_build", f"{src}>{dst}", size * size):
+        ox, oy = exact.transform(gx.ravel(), gy.ravel())
+    nodes = (np.asarray(ox) + 1j * np.asarray(oy)).reshape(size, size)
+    nodes[~np.isfinite(nodes)] = np.nan
+    lattice = {"nodes": nodes, "origin": np.array([x_min, y_min]), "step": np.array([xs[1] - xs[0], ys[1] - ys[0]])}
+
+    # Bilinear strays furthest from the exact surface at a cell's centre and
+    # edge midpoints, bicubic about a quarter of the way across
+    errors = np.zeros(len(INTERPOLATIONS))
+    lattice["error_m"] = errors
+    kernels = [LatticeTransformer(lattice, exact, interpolation) for interpolation in INTERPOLATIONS]
+    for sx, sy in ERROR_SAMPLES:
+        fx, fy = np.meshgrid(np.arange(size - 1) + sx, np.arange(size - 1) + sy)
+        fx, fy = fx.ravel(), fy.ravel()
+        ex, ey = exact.transform(x_min + fx * lattice["step"][0], y_min + fy * lattice["step"][1])
+        truth = np.asarray(ex) + 1j * np.asarray(ey)
+        for n, kernel in enumerate(kernels):
+            ok = kernel._ok & np.isfinite(truth)
+            approx = kernel._interpolate(fx[ok], fy[ok], fx[ok].astype(np.int64), fy[ok].astype(np.int64))
+            diff = _ground_metres(approx, truth[ok]) if dst == _WGS84_KEY else np.abs(approx - truth[ok])
+            if len(diff):
+                errors[n] = max(errors[n], float(diff.max()))
+    return lattice
+
+
+def _lattice_path(src, dst, definition, size):
+    key = json.dumps([FORMAT_VERSION, src, dst, definition, size, MARGIN_DEG])
+    name = f"{src}_{dst}_{size}".replace(":", "") + "_" + hashlib.sha256(key.encode()).hexdigest()[:16] + ".npz"
+    return os.path.join(lattice_dir(), name)
+
+
+def load_or_build(base, src, dst, size=LATTICE_SIZE):
+    """The lattice of a pair from the disk cache, building and saving it on a miss."""
+    definition = getattr(base.get(src, dst), "definition", "")
+    path = _lattice_path(src, dst, definition, size)
+    try:
+        with np.load(path) as data:
+            return {k: data[k] for k in data.files}
+    except (OSError, ValueError, KeyError):
+        pass
+    lattice = build_lattice(base, src, dst, size)
+    if lattice is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name, so another process never loads half a file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **lattice)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return lattice
+
+
+class LatticePool:
+    """Lattice transformers for the pairs of a ``TransformerPool``.
+
+    ``get`` loads or builds the pair's lattice and keeps its transformer.
+    A pair without a lattice, or whose ``error_m`` exceeds ``tolerance_m``,
+    is answered by the exact transformer and counted in ``fallbacks``.
+    """
+
+    def __init__(self, base=None, size=LATTICE_SIZE, interpolation=BILINEAR, tolerance_m=None):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation: {interpolation} (expected one of {', '.join(INTERPOLATIONS)})")
+        self.base = base
+        self.size = size
+        self.interpolation = interpolation
+        self.tolerance_m = tolerance_m
+        self._kernels = {}
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def get(self, src, dst):
+        key = (normalize_crs_key(src), normalize_crs_key(dst))
+        with self._lock:
+            kernel = self._kernels.get(key)
+        if kernel is not None:
+            return kernel
+        base = self.base or get_pool()
+        exact = base.get(src, dst)
+        try:
+            lattice = load_or_build(base, *key, self.size)
+        except (ProjError, ValueError):
+            lattice = None
+        kernel = exact
+        if lattice is not None:
+            kernel = LatticeTransformer(lattice, exact, self.interpolation)
+            if self.tolerance_m is not None and kernel.error_m > self.tolerance_m:
+                kernel = exact
+        with self._lock:
+            # Counted once per pair, by the thread that stores it
+            if key not in self._kernels:
+                self._kernels[key] = kernel
+                if kernel is exact:
+                    self.fallbacks += 1
+            return self._kernels[key]
+
+    def preload(self):
+        """Load or build the lattices of every zone, both directions; returns the count.
+
+        Zones this PROJ install cannot transform are skipped.
+        """
+        specs = [f"epsg:{info['epsg']}" for info in ENHANCED_KALIANPUR_ZONES.values()]
+        specs += [f"dsm:{major}" for major in DSM_PARAMS]
+        loaded = 0
+        for spec in specs:
+            try:
+                self.get(spec, WGS84)
+                self.get(WGS84, spec)
+            except ProjError:
+                continue
+            loaded += 2
+        return loaded
+
+    def errors(self):
+        """One dict per pair in use: its lattice error, or None for exact pairs."""
+        with self._lock:
+            items = sorted(self._kernels.items())
+        return [{
+            "source": src,
+            "target": dst,
+            "interpolation": kernel.interpolation if isinstance(kernel, LatticeTransformer) else "exact",
+            "nodes": kernel.size ** 2 if isinstance(kernel, LatticeTransformer) else 0,
+            "error_m": kernel.error_m if isinstance(kernel, LatticeTransformer) else None,
+            "exact_points": kernel.exact_points if isinstance(kernel, LatticeTransformer) else None,
+        } for (src, dst), kernel in items]
+
+    def stats(self):
+        with self._lock:
+            lattices = sum(isinstance(k, LatticeTransformer) for k in self._kernels.values())
+            return {"size": len(self._kernels), "lattices": lattices, "fallbacks": self.fallbacks}
+
+
+_default_pools = {}
+_default_pools_lock = threading.Lock()
+
+
+def get_lattice_pool(interpolation=BILINEAR):
+    """The process-wide lattice pool over ``get_pool()`` for an interpolation."""
+    with _default_pools_lock:
+        pool = _default_pools.get(interpolation)
+        if pool is None:
+            pool = _default_pools[interpolation] = LatticePool(interpolation=interpolation)
+        return pool
+
+
+def flag_values(values):
+    """Rows marked in a flag column: true, yes, y, x or a non-zero number."""
+    s = pd.Series(values)
+    text = s.astype(str).str.strip().str.lower()
+    number = pd.to_numeric(s, errors="coerce")
+    return (text.isin(("true", "yes", "y", "x")) | (number.notna() & (number != 0))).to_numpy()
+
+
+def refine_frame(df, res, rows, convert_frame=grid_to_latlon_frame, **options):
+    """``res`` with the ``rows`` (a boolean mask over ``df``) converted again exactly.
+
+    ``convert_frame`` and ``options`` are the conversion that made ``res``,
+    without its ``pool``; the rows go through the default pyproj pool.
+    """
+    idx = np.flatnonzero(np.asarray(rows, dtype=bool))
+    if not len(idx):
+        return res
+    exact = convert_frame(df.iloc[idx], **options)
+    res = res.copy()
+    for column in exact.columns:
+        values = res[column].to_numpy(copy=True)
+        values[idx] = exact[column].to_numpy()
+        res[column] = values
+    return res
+
+
+def validate(pool=None, points=VALIDATE_POINTS, seed=0):
+    """Each zone's lattice error against the exact transform at random points.
+
+    Returns one dict per zone and direction with the error measured at
+    build time (``error_m``), the largest error over ``points`` random
+    points of the zone (``max_error_m``) and the throughput of both.
+    """
+    pool = pool or get_lattice_pool()
+    base = pool.base or get_pool()
+    rng = np.random.default_rng(seed)
+    specs = [(name, f"epsg:{info['epsg']}") for name, info in ENHANCED_KALIANPUR_ZONES.items()]
+    specs += [(f"DSM {major}", f"dsm:{major}") for major in DSM_PARAMS]
+    rows = []
+    for name, spec in specs:
+        lon_min, lat_min, lon_max, lat_max = coverage(spec)
+        lon = rng.uniform(lon_min, lon_max, points)
+        lat = rng.uniform(lat_min, lat_max, points)
+        try:
+            x, y = base.get(WGS84, spec).transform(lon, lat)
+        except (ProjError, ValueError):
+            continue
+        for direction, src, dst, xs, ys in (("to_latlon", spec, WGS84, x, y), ("to_grid", WGS84, spec, lon, lat)):
+            start = time.perf_counter()
+            kernel = pool.get(src, dst)
+            build_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            ax, ay = kernel.transform(xs, ys)
+            lattice_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            ex, ey = base.get(src, dst).transform(xs, ys)
+            exact_seconds = time.perf_counter() - start
+            approx, truth = np.asarray(ax) + 1j * np.asarray(ay), np.asarray(ex) + 1j * np.asarray(ey)
+            error = _ground_metres(approx, truth) if direction == "to_latlon" else np.abs(approx - truth)
+            rows.append({
+                "zone": name,
+                "direction": direction,
+                "lattice": isinstance(kernel, LatticeTransformer),
+                "error_m": getattr(kernel, "error_m", 0.0),
+                "max_error_m": float(np.nanmax(error)),
+                "load_seconds": build_seconds,
+                "lattice_points_per_sec": points / lattice_seconds,
+                "exact_points_per_sec": points / exact_seconds,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.lattice",
+                                     description="Check the lattice error of every zone against pyproj")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default=BILINEAR)
+    parser.add_argument("--size", type=int, default=LATTICE_SIZE, help="nodes per lattice side (default: %(default)s)")
+    parser.add_argument("--points", type=int, default=VALIDATE_POINTS,
+                        help="random points per zone (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.size < 4 or args.points < 1:
+        raise SystemExit("error: --size must be at least 4 and --points positive")
+
+    rows = validate(LatticePool(size=args.size, interpolation=args.interpolation), args.points)
+    print(f"{'zone':<10} {'direction':<10} {'lattice error':>14} {'max at points':>14} {'load':>8} "
+          f"{'lattice pts/s':>14} {'exact pts/s':>12}", file=sys.stderr)
+    for r in rows:
+        print(f"{r['zone']:<10} {r['direction']:<10} {r['error_m'] * 1000:>11.2f} mm {r['max_error_m'] * 1000:>11.2f} mm "
+              f"{r['load_seconds']:>6.2f} s {r['lattice_points_per_sec']:>14,.0f} {r['exact_points_per_sec']:>12,.0f}"
+              f"{'' if r['lattice'] else '  (exact fallback)'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
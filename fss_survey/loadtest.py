@@ -0,0 +1,189 @@
+"""Load test for the HTTP API in ``fss_survey.service``.
+
+    python -m fss_survey.loadtest --clients 8 --requests 2000
+    python -m fss_survey.loadtest --url http://127.0.0.1:8765 --points 1000 --operation latlon-to-grid
+
+Each client is a thread holding one keep-alive connection and sending
+requests back to back. Payloads are ``fss_survey.bench.india_points``:
+``--points 1`` posts single JSON objects, more posts JSON arrays (or NDJSON
+with ``--ndjson``) of that many records. Distinct points are sent, so the
+single-point result cache does not answer for the service.
+
+Without ``--url`` a service is started on a free local port for the run
+(``--stdlib`` picks the standard-library server) and stopped afterwards.
+Prints the throughput in requests and points per second and the latency
+percentiles; ``--json FILE`` keeps them.
+"""
+
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from .bench import DEFAULT_SEED, india_points
+
+DEFAULT_CLIENTS = 8
+DEFAULT_REQUESTS = 2000
+START_TIMEOUT = 30.0
+
+
+def payloads(operation, n_requests, n_points, seed=DEFAULT_SEED):
+    """One list of ``n_points`` record dicts per request."""
+    p = india_points(n_requests * n_points, seed)
+    ok = p["esm_zone"] != None
+    fields = {
+        "grid-to-latlon": lambda i: {"easting": p["esm_e"][i], "northing": p["esm_n"][i], "zone": p["esm_zone"][i]},
+        "latlon-to-grid": lambda i: {"lat": p["lat"][i], "lon": p["lon"][i]},
+        "esm-to-dsm": lambda i: {"easting": p["esm_e"][i], "northing": p["esm_n"][i], "zone": p["esm_zone"][i]},
+        "dsm-to-latlon": lambda i: {"easting": p["dsm_e"][i], "northing": p["dsm_n"][i], "zone": p["dsm_zone"][i]},
+        "distance": lambda i: {"lat1": p["lat"][i], "lon1": p["lon"][i], "lat2": p["lat_next"][i], "lon2": p["lon_next"][i]},
+        "dd-to-dms": lambda i: {"lat": p["lat"][i], "lon": p["lon"][i]},
+        "dms-to-dd": lambda i: {"lat": p["lat_dms"][i], "lon": p["lon_dms"][i]},
+    }
+    if operation not in fields:
+        raise ValueError(f"Unknown operation: {operation} (expected one of {', '.join(fields)})")
+    # Grid operations need points that project into a zone; the others take every point
+    grid_ops = ("grid-to-latlon", "latlon-to-grid", "esm-to-dsm", "dsm-to-latlon")
+    index = np.flatnonzero(ok) if operation in grid_ops else np.arange(len(ok))
+    index = np.resize(index, n_requests * n_points)
+    make = fields[operation]
+    records = [{k: v.item() if isinstance(v, np.generic) else v for k, v in make(i).items()} for i in index.tolist()]
+    return [records[i:i + n_points] for i in range(0, len(records), n_points)]
+
+
+def encode(records, ndjson=False):
+    """``(content_type, body)`` for one request."""
+    if ndjson:
+        return "application/x-ndjson", "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+    return "application/json", json.dumps(records[0] if len(records) == 1 else records).encode("utf-8")
+
+
+def _client(host, port, path, bodies, latencies, errors):
+    conn = http.client.HTTPConnection(host, port)
+    try:
+        for content_type, body in bodies:
+            start = time.perf_counter()
+            conn.request("POST", path, body, {"Content-Type": content_type})
+            resp = conn.getresponse()
+            resp.read()
+            latencies.append(time.perf_counter() - start)
+            if resp.status != 200:
+                errors.append(resp.status)
+    finally:
+        conn.close()
+
+
+def run(url, operation="grid-to-latlon", clients=DEFAULT_CLIENTS, requests=DEFAULT_REQUESTS, n_points=1,
+        ndjson=False, seed=DEFAULT_SEED):
+    """Send ``requests`` requests over ``clients`` connections; returns the summary dict."""
+    parsed = urllib.parse.urlsplit(url)
+    path = f"/v1/{operation}"
+    bodies = [encode(r, ndjson) for r in payloads(operation, requests, n_points, seed)]
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_client, args=(parsed.hostname, parsed.port, path, bodies[i::clients],
+                                                      latencies, errors))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]).tolist() if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "operation": operation,
+        "clients": clients,
+        "requests": len(latencies),
+        "points_per_request": n_points,
+        "ndjson": ndjson,
+        "errors": len(errors),
+        "seconds": seconds,
+        "requests_per_sec": len(latencies) / seconds,
+        "points_per_sec": len(latencies) * n_points / seconds,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "max_ms": float(ms.max()) if len(ms) else 0.0,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(stdlib=False):
+    """Start ``python -m fss_survey.service`` on a free port; ``(process, url)`` once it answers."""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "fss_survey.service", "--port", str(port)] + (["--stdlib"] if stdlib else [])
+    proc = subprocess.Popen(cmd, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("The service did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.loadtest", description="FSS Survey Calculator API load test")
+    parser.add_argument("--url", help="service to test (default: start one on a free port)")
+    parser.add_argument("--stdlib", action="store_true", help="start the standard-library server instead of uvicorn")
+    parser.add_argument("--operation", default="grid-to-latlon", help="operation to call (default: %(default)s)")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS,
+                        help="concurrent connections (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS,
+                        help="requests in total (default: %(default)s)")
+    parser.add_argument("--points", type=int, default=1, help="points per request (default: %(default)s)")
+    parser.add_argument("--ndjson", action="store_true", help="send the records as NDJSON")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", help="write the summary as JSON")
+    args = parser.parse_args(argv)
+    if args.clients < 1 or args.requests < 1 or args.points < 1:
+        raise SystemExit("error: --clients, --requests and --points must be positive")
+
+    proc, url = (None, args.url) if args.url else start_service(args.stdlib)
+    try:
+        summary = run(url, args.operation, args.clients, args.requests, args.points, args.ndjson, args.seed)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{summary['operation']}: {summary['requests']:,} requests x {summary['points_per_request']:,} points "
+          f"over {summary['clients']} clients in {summary['seconds']:.2f} s, {summary['errors']} errors", file=sys.stderr)
+    print(f"  {summary['requests_per_sec']:,.0f} requests/s, {summary['points_per_sec']:,.0f} points/s", file=sys.stderr)
+    print(f"  latency p50 {summary['p50_ms']:.2f} ms, p95 {summary['p95_ms']:.2f} ms, "
+          f"p99 {summary['p99_ms']:.2f} ms, max {summary['max_ms']:.2f} ms", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if summary["errors"]:
+        # Error responses are timed too, so the figures above are not a clean benchmark
+        print(f"error: {summary['errors']} request(s) did not return 200", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Shared memoization of single-point results.
+
+Field work revisits the same control points, so the tabs look results up
+by ``(operation, zone, coordinates)`` before converting. Coordinates are
+rounded to ``KEY_DECIMALS`` places (0.1 mm in degrees, far below display
+precision) so that inputs differing only by float noise share an entry.
+
+``ResultCache`` is a thread-safe LRU with a TTL, in the style of
+``TransformerPool``. With a ``path`` it also writes through to an SQLite
+file, so results survive restarts. The disk layer is only read on memory
+misses and holds the same TTL. ``get_result_cache`` returns the
+process-wide instance, which every Streamlit session shares; set
+``FSS_RESULT_CACHE`` to a file path to persist it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+KEY_DECIMALS = 9
+DEFAULT_MAXSIZE = 10_000
+DEFAULT_TTL = 24 * 3600
+# Bump when a conversion's output changes so persisted results are not reused
+SCHEMA = "results_v1"
+
+
+def make_key(operation, zone, coords):
+    return operation, zone, tuple([round(float(c), KEY_DECIMALS) for c in coords])
+
+
+class DiskStore:
+    """SQLite table of JSON results keyed by the JSON form of ``make_key``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # One connection shared by every thread, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {SCHEMA} "
+                               "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+
+    def get(self, key, min_created):
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created FROM {SCHEMA} WHERE key = ?",
+                                     (json.dumps(key),)).fetchone()
+        if row is None or row[1] < min_created:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, created):
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO {SCHEMA} VALUES (?, ?, ?)",
+                               (json.dumps(key), json.dumps(value), created))
+
+    def purge(self, min_created):
+        """Delete expired rows; returns how many were removed."""
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM {SCHEMA} WHERE created < ?", (min_created,)).rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {SCHEMA}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {SCHEMA}").fetchone()[0]
+
+
+class ResultCache:
+    """Thread-safe LRU of conversion results with a TTL and optional disk layer."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, path=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk = DiskStore(path) if path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _store(self, key, value, created):
+        with self._lock:
+            self._entries[key] = (value, created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, operation, zone, coords, compute):
+        """Cached result of ``compute()`` for this operation, zone and coordinates.
+
+        Results are stored as tuples; exceptions from ``compute`` are not cached.
+        """
+        key = make_key(operation, zone, coords)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.disk is not None:
+            value, created = self.disk.get(key, now - self.ttl)
+            if value is not None:
+                value = tuple(value)
+                self._store(key, value, created)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        value = tuple(compute())
+        self._store(key, value, now)
+        if self.disk is not None:
+            self.disk.set(key, value, now)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "persistent": self.disk is not None,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = self.expirations = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """The process-wide cache, persisted to ``$FSS_RESULT_CACHE`` when that is set."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            path = os.environ.get("FSS_RESULT_CACHE") or None
+            _default_cache = ResultCache(path=path)
+            if path:
+                _default_cache.disk.purge(time.time() - _default_cache.ttl)
+        return _default_cache
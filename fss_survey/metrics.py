@@ -0,0 +1,225 @@
+"""Timers and counters around the conversion hot paths.
+
+Instrumentation is off unless ``FSS_METRICS`` is set (to anything but
+``0``/``false``/``no``/``off``) or ``enable()`` is called. Off, ``timer``
+returns one shared no-op context manager, so the instrumented code runs
+at its uninstrumented speed.
+
+Each operation (``transformer_build``, ``transform``, ``zone_detection``,
+``file_read``, ``file_write``, ...) is counted per label, e.g. the zone
+table or file format, as calls, seconds, slowest call and points handled.
+``snapshot`` returns the counters as dicts and ``prometheus_text`` in the
+Prometheus text exposition format.
+
+``run`` records one whole user-level run (a batch file, a traverse) as a
+structured JSON log line on the ``fss_survey.metrics`` logger, with its
+points per second, and keeps the last ``RECENT_RUNS`` of them for
+``recent_runs``.
+
+Counters live in the process that did the work: conversions done in
+``fss_survey.parallel`` worker processes are not added to the parent's
+counters, though the parent's ``run`` covers their wall time.
+
+Only the standard library is imported here, so every module can use it.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+RECENT_RUNS = 100
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("FSS_METRICS", "").strip().lower() not in ("", "0", "false", "no", "off")
+
+_lock = threading.Lock()
+_stats = {}
+_runs = deque(maxlen=RECENT_RUNS)
+
+
+def enable(on=True):
+    """Switch instrumentation on or off for this process."""
+    global ENABLED
+    ENABLED = bool(on)
+
+
+def reset():
+    """Drop every counter and recorded run."""
+    with _lock:
+        _stats.clear()
+        _runs.clear()
+
+
+class _Stat:
+    __slots__ = ("calls", "seconds", "max_seconds", "points")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = self.max_seconds = 0.0
+        self.points = 0
+
+
+def record(name, seconds, points=0, label=""):
+    """Add one call of ``name`` taking ``seconds`` over ``points`` points."""
+    with _lock:
+        stat = _stats.get((name, label))
+        if stat is None:
+            stat = _stats[(name, label)] = _Stat()
+        stat.calls += 1
+        stat.seconds += seconds
+        stat.points += points
+        if seconds > stat.max_seconds:
+            stat.max_seconds = seconds
+
+
+class _Timer:
+    __slots__ = ("name", "label", "points", "start")
+
+    def __init__(self, name, label, points):
+        self.name = name
+        self.label = label
+        self.points = points
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, self.points, self.label)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __setattr__(self, name, value):
+        # Shared by every caller, so ``timer.points = n`` is dropped
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name, label="", points=0):
+    """Context manager timing one call of ``name``.
+
+    ``points`` may also be set on the returned object inside the block,
+    for operations that only learn their size as they go.
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, label, points)
+
+
+def _rate(points, seconds):
+    return points / seconds if seconds else 0.0
+
+
+def snapshot():
+    """Every counter as a dict, sorted by operation and label."""
+    with _lock:
+        items = sorted((key, (s.calls, s.seconds, s.max_seconds, s.points)) for key, s in _stats.items())
+    return [{
+        "operation": name,
+        "label": label,
+        "calls": calls,
+        "seconds": seconds,
+        "mean_ms": 1000 * seconds / calls if calls else 0.0,
+        "max_ms": 1000 * max_seconds,
+        "points": points,
+        "points_per_sec": _rate(points, seconds),
+    } for (name, label), (calls, seconds, max_seconds, points) in items]
+
+
+class _Run:
+    __slots__ = ("operation", "points", "fields", "start")
+
+    def __init__(self, operation, points=0, **fields):
+        self.operation = operation
+        self.points = points
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not ENABLED:
+            return
+        seconds = time.perf_counter() - self.start
+        entry = {
+            "time": time.time(),
+            "operation": self.operation,
+            "points": self.points,
+            "seconds": round(seconds, 6),
+            "points_per_sec": round(_rate(self.points, seconds), 1),
+            **self.fields,
+        }
+        if exc_type is not None:
+            entry["error"] = f"{exc_type.__name__}: {exc}"
+        with _lock:
+            _runs.append(entry)
+        record("run", seconds, self.points, self.operation)
+        logger.info(json.dumps(entry, default=str))
+
+
+def run(operation, points=0, **fields):
+    """Context manager recording one user-level run as a structured log line.
+
+    ``fields`` (zone, format, workers, ...) are logged as given. Set
+    ``points`` on the returned object inside the block once the size is
+    known::
+
+        with metrics.run("batch_grid_to_latlon", output_format="parquet") as r:
+            res = grid_to_latlon_frame(df)
+            r.points = len(res)
+
+    A run that raises is logged with its error. Nothing is recorded while
+    instrumentation is off.
+    """
+    return _Run(operation, points, **fields)
+
+
+def recent_runs():
+    """The last ``RECENT_RUNS`` runs, newest first."""
+    with _lock:
+        return list(reversed(_runs))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(gauges=None):
+    """The counters in the Prometheus text exposition format.
+
+    ``gauges`` maps extra metric names to values, e.g. cache sizes owned by
+    the caller.
+    """
+    families = (
+        ("fss_operation_calls_total", "counter", "Calls per operation.", "calls"),
+        ("fss_operation_seconds_total", "counter", "Seconds spent per operation.", "seconds"),
+        ("fss_operation_points_total", "counter", "Points handled per operation.", "points"),
+        ("fss_operation_max_seconds", "gauge", "Slowest single call per operation.", "max_ms"),
+    )
+    rows = snapshot()
+    lines = []
+    for metric, kind, help_text, field in families:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for row in rows:
+            value = row[field] / 1000 if field == "max_ms" else row[field]
+            lines.append(f'{metric}{{operation="{_escape(row["operation"])}",label="{_escape(row["label"])}"}} {value}')
+    for metric, value in (gauges or {}).items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
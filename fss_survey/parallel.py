@@ -0,0 +1,182 @@
+"""Multi-core batch conversion on a process pool.
+
+A Streamlit worker converts on a single core. Here a batch is split into
+shards and converted with ``grid_to_latlon_frame`` in worker processes,
+and the results are merged back in input order. The executor is kept
+between runs, so worker processes start once and not once per job. Each
+worker keeps its own ``get_pool()`` transformer cache for its lifetime,
+warmed for every zone by ``crs_pool.warm_up`` as the pool initializer.
+
+Workers are started with ``spawn``. It is safe in a multi-threaded
+server process and behaves the same on every platform.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from .batch import GRID_ESM, grid_to_latlon_frame, input_columns, stream_table
+from .convert import DEFAULT_CHUNK_SIZE
+from .crs_pool import warm_up
+from .formats import FORMAT_CSV
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    """The shared process pool, rebuilt only when the worker count changes."""
+    global _executor, _executor_workers
+    workers = workers or DEFAULT_WORKERS
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=warm_up)
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown_executor():
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = _executor_workers = None
+
+
+def convert_shard(shard, options):
+    """Worker entry point: ``(result_frame, zone_stats, cpu_seconds)`` for one shard.
+
+    CPU time rather than wall time, so workers that share a core do not
+    inflate the single-process estimate.
+    """
+    zone_stats = {}
+    start = time.process_time()
+    res = grid_to_latlon_frame(shard, zone_stats=zone_stats, **options)
+    return res, zone_stats, time.process_time() - start
+
+
+def ordered_map(executor, fn, items, window):
+    """Like ``executor.map`` but with at most ``window`` items in flight, so
+    a lazily read input is never pulled into memory all at once."""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def shard_columns(df, options):
+    """Only the columns the conversion reads are sent to the workers."""
+    wanted = set(input_columns(**options))
+    return df[[c for c in df.columns if c in wanted]]
+
+
+def merge_zone_stats(into, stats):
+    for key, entry in stats.items():
+        total = into.setdefault(key, {"rows": 0, "seconds": 0.0})
+        total["rows"] += entry["rows"]
+        total["seconds"] += entry["seconds"]
+
+
+class _Run:
+    """Collects results from ``convert_shard`` and times the whole run."""
+
+    def __init__(self, workers, zone_stats, timing):
+        self.workers = workers
+        self.zone_stats = zone_stats
+        self.timing = timing
+        self.shards = 0
+        self.busy = 0.0
+        self.start = time.perf_counter()
+
+    def results(self, executor, chunks, options):
+        fn = partial(convert_shard, options=options)
+        for res, stats, seconds in ordered_map(executor, fn, chunks, window=2 * self.workers):
+            self.shards += 1
+            self.busy += seconds
+            if self.zone_stats is not None:
+                merge_zone_stats(self.zone_stats, stats)
+            yield res
+
+    def finish(self):
+        if self.timing is not None:
+            wall = time.perf_counter() - self.start
+            self.timing.update({
+                "workers": self.workers,
+                "shards": self.shards,
+                "wall_seconds": wall,
+                "busy_seconds": self.busy,
+                # Workers busy on average; an upper estimate of the speedup, not a timed serial run
+                "parallelism": self.busy / wall if wall else None,
+            })
+
+
+def parallel_grid_to_latlon_frame(df, workers=None, chunk_rows=DEFAULT_CHUNK_SIZE, zone_stats=None, timing=None,
+                                  progress=None, grid=GRID_ESM, **options):
+    """``grid_to_latlon_frame`` over ``chunk_rows``-row shards on ``workers`` processes.
+
+    The result is identical to the single-process call. ``timing`` receives
+    the worker count, shard count, wall time, summed worker CPU time and
+    ``parallelism``, their ratio: how many workers were busy on average.
+    That estimates the speedup over one process but is not measured against
+    one (shard scheduling and pickling are not counted in it).
+    """
+    workers = workers or DEFAULT_WORKERS
+    options = dict(options, grid=grid)
+    data = shard_columns(df, options)
+    bounds = range(0, len(data), chunk_rows)
+    run = _Run(workers, zone_stats, timing)
+
+    frames = []
+    for res in run.results(get_executor(workers), (data.iloc[i:i + chunk_rows] for i in bounds), options):
+        frames.append(res)
+        if progress is not None:
+            progress(len(frames) / len(bounds))
+    run.finish()
+
+    if not frames:
+        return grid_to_latlon_frame(data, zone_stats=zone_stats, **options)
+    return pd.concat(frames, ignore_index=True)
+
+
+def parallel_stream_table(source, out, workers=None, chunk_rows=DEFAULT_CHUNK_SIZE, zone_stats=None, timing=None,
+                          progress=None, grid=GRID_ESM, input_format=FORMAT_CSV, output_format=FORMAT_CSV, **options):
+    """``stream_table`` with the chunks converted on ``workers`` processes.
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    by the chunk size just as in single-process streaming.
+    """
+    workers = workers or DEFAULT_WORKERS
+    options = dict(options, grid=grid)
+    run = _Run(workers, zone_stats, timing)
+    executor = get_executor(workers)
+    summary = stream_table(
+        source, out, None, chunk_rows=chunk_rows, progress=progress,
+        map_chunks=lambda _, chunks: run.results(executor, (shard_columns(c, options) for c in chunks), options),
+        input_format=input_format, output_format=output_format, columns=input_columns(**options),
+    )
+    run.finish()
+    return summary
+
+
+def parallel_stream_csv(source, out, **kwargs):
+    """``parallel_stream_table`` from CSV to CSV."""
+    return parallel_stream_table(source, out, **kwargs)
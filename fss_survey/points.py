@@ -0,0 +1,93 @@
+"""Single-point conversions behind the calculator tabs.
+
+Each function takes plain floats and returns a tuple of plain values, so
+results can be memoized and persisted (see ``fss_survey.memo``). A zone of
+None in a result means the point fell outside that grid's coverage.
+"""
+
+from . import metrics
+from .crs_pool import get_pool
+from .geodesic import ELLIPSOID_WGS84, METHOD_SPHERICAL, check_options, geodesic
+from .geodesy import bearing_latlon, haversine
+from .zones import DSM_PARAMS, ENHANCED_KALIANPUR_ZONES, detect_dsm_zone, detect_kalianpur_zone
+
+WGS84 = "epsg:4326"
+DEFAULT_ESM_EPSG = 24378
+DEFAULT_ESM_LABEL = "Default (Zone I)"
+
+
+def _transform(src, dst, x, y):
+    transformer = get_pool().get(src, dst)
+    with metrics.timer("transform", "point", 1):
+        return transformer.transform(x, y)
+
+
+def _kalianpur_zone(lat, lon):
+    with metrics.timer("zone_detection", "kalianpur", 1):
+        return detect_kalianpur_zone(lat, lon)
+
+
+def distance_bearing(lat1, lon1, lat2, lon2, method=METHOD_SPHERICAL, ellipsoid=ELLIPSOID_WGS84):
+    """``(distance_km, bearing, zone_a, epsg_a, zone_b, epsg_b)``
+
+    ``method`` is ``"spherical"`` (haversine) or ``"ellipsoidal"`` (the
+    geodesic on ``ellipsoid``, see ``fss_survey.geodesic``).
+    """
+    check_options(method, ellipsoid)
+    k1, e1, _ = _kalianpur_zone(lat1, lon1)
+    k2, e2, _ = _kalianpur_zone(lat2, lon2)
+    if method == METHOD_SPHERICAL:
+        return haversine(lat1, lon1, lat2, lon2), bearing_latlon(lat1, lon1, lat2, lon2), k1, e1, k2, e2
+    km, bearing = geodesic(lat1, lon1, lat2, lon2, ellipsoid)
+    return round(km, 3), round(bearing, 2), k1, e1, k2, e2
+
+
+def distance_cache_key(method=METHOD_SPHERICAL, ellipsoid=ELLIPSOID_WGS84):
+    """``(operation, zone)`` under which the result cache keeps ``distance_bearing`` results."""
+    if method == METHOD_SPHERICAL:
+        return "distance_bearing", None
+    return f"distance_bearing_{method}", ellipsoid
+
+
+def latlon_to_grid(lat, lon):
+    """``(zone_label, epsg, easting, northing)``, falling back to Zone I outside every zone."""
+    kz, ke, _ = _kalianpur_zone(lat, lon)
+    if ke is None:
+        kz, ke = DEFAULT_ESM_LABEL, DEFAULT_ESM_EPSG
+    easting, northing = _transform(WGS84, ke, lon, lat)
+    return kz, ke, easting, northing
+
+
+def grid_to_latlon(easting, northing, epsg=DEFAULT_ESM_EPSG):
+    """``(lat, lon)``"""
+    lon, lat = _transform(epsg, WGS84, easting, northing)
+    return lat, lon
+
+
+def esm_to_dsm(esm_zone, easting, northing):
+    """``(dsm_zone, dsm_easting, dsm_northing, lat, lon)``; the DSM values are None outside DSM coverage."""
+    lon, lat = _transform(ENHANCED_KALIANPUR_ZONES[esm_zone]['epsg'], WGS84, easting, northing)
+    with metrics.timer("zone_detection", "dsm", 1):
+        d_zone, _ = detect_dsm_zone(lat, lon)
+    if not d_zone:
+        return None, None, None, lat, lon
+    de, dn = _transform(WGS84, f"dsm:{d_zone[0]}", lon, lat)
+    return d_zone, de, dn, lat, lon
+
+
+def dsm_to_latlon(dsm_zone, easting, northing):
+    """``(lat, lon)``"""
+    if dsm_zone[:1] not in DSM_PARAMS:
+        raise ValueError(f"Unknown DSM zone: {dsm_zone}")
+    lon, lat = _transform(f"dsm:{dsm_zone[0]}", WGS84, easting, northing)
+    return lat, lon
+
+
+def dsm_to_esm(dsm_zone, easting, northing):
+    """``(esm_zone, epsg, esm_easting, esm_northing)``; all None outside Kalianpur coverage."""
+    lat, lon = dsm_to_latlon(dsm_zone, easting, northing)
+    kz, ke, _ = _kalianpur_zone(lat, lon)
+    if not kz:
+        return None, None, None, None
+    ee, en = _transform(WGS84, ke, lon, lat)
+    return kz, ke, ee, en
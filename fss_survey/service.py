@@ -0,0 +1,485 @@
+"""Local HTTP/JSON API for the calculator's conversions.
+
+    python -m fss_survey.service --port 8765
+
+Every operation is a ``POST /v1/<operation>``:
+
+* a JSON object converts one point and answers with one object, or 422
+  with ``{"error": ...}`` when the input cannot be converted;
+* a JSON array of objects converts them together and answers with an
+  array in the same order, each object with a ``status`` field;
+* ``Content-Type: application/x-ndjson`` (one object per line) is
+  converted ``NDJSON_BATCH`` lines at a time as the body arrives and
+  answered as NDJSON, so a client can stream files of any length.
+
+An ``id`` field in a bulk record is copied to its result. ``GET /health``
+lists the operations and the cache counters.
+
+Single points go through the ``fss_survey.points`` functions and the
+shared result cache, like the calculator tabs; bulk requests go through
+the columnar ``fss_survey.batch`` frames. The transformer pool is warmed
+at start-up and shared by every request.
+
+``app`` is a plain ASGI application run by uvicorn, which Streamlit
+already installs. Conversions run on a pool of ``FSS_SERVICE_THREADS``
+threads (pyproj releases the GIL while transforming) so the event loop
+keeps accepting clients. Without uvicorn, or with ``--stdlib``, the same
+operations are served by ``http.server.ThreadingHTTPServer``, which reads
+each body whole instead of streaming it.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from pyproj.exceptions import ProjError
+
+from . import metrics, points
+from .batch import (
+    DEFAULT_ESM_ZONE,
+    GRID_DSM,
+    ROUTING_COLUMN,
+    dsm_to_esm_frame,
+    esm_to_dsm_frame,
+    grid_to_latlon_frame,
+    to_float_array,
+)
+from .convert import ESM_ZONE_ALIASES, ESM_ZONE_NAMES, STATUS_BAD_INPUT, STATUS_OK, latlon_to_grid
+from .crs_pool import get_pool, start_warmup
+from .dms import decimal_to_dms, dms_to_decimal
+from .dms_arrays import format_dms_array, parse_dms_array
+from .geodesic import ELLIPSOID_WGS84, METHOD_SPHERICAL, distance_bearing_array
+from .memo import get_result_cache
+from .zone_index import detect_kalianpur_zones
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+NDJSON_BATCH = 10_000
+JSON_TYPE = "application/json"
+NDJSON_TYPE = "application/x-ndjson"
+STATUS_BAD_DMS = "Error: invalid DMS"
+
+# point(record) -> result dict; bulk(DataFrame of records) -> result DataFrame with a status column
+Operation = namedtuple("Operation", ["point", "bulk", "help"])
+
+
+def _number(record, name):
+    value = record.get(name)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = float("nan")
+    if not np.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+def _esm_epsg(zone):
+    epsg = ESM_ZONE_ALIASES.get(str(zone).strip().lower())
+    if epsg is None:
+        raise ValueError(f"Unknown Kalianpur zone: {zone}")
+    return epsg
+
+
+def _dsm_zone(record):
+    zone = str(record.get("zone") or "").strip().upper()
+    if not zone:
+        raise ValueError("zone (DSM sheet, e.g. 6E) is required")
+    return zone
+
+
+def _cached(operation, zone, coords, compute):
+    return get_result_cache().get_or_compute(operation, zone, coords, compute)
+
+
+def grid_to_latlon_point(record):
+    e, n = _number(record, "easting"), _number(record, "northing")
+    epsg = _esm_epsg(record.get("zone") or DEFAULT_ESM_ZONE)
+    lat, lon = _cached("grid_to_latlon", epsg, (e, n), lambda: points.grid_to_latlon(e, n, epsg))
+    return {"zone": ESM_ZONE_NAMES[epsg], "lat": lat, "lon": lon}
+
+
+def latlon_to_grid_point(record):
+    lat, lon = _number(record, "lat"), _number(record, "lon")
+    zone, epsg, e, n = _cached("latlon_to_grid", None, (lat, lon), lambda: points.latlon_to_grid(lat, lon))
+    return {"zone": zone, "epsg": epsg, "easting": e, "northing": n}
+
+
+def esm_to_dsm_point(record):
+    e, n = _number(record, "easting"), _number(record, "northing")
+    esm_zone = ESM_ZONE_NAMES[_esm_epsg(record.get("zone") or DEFAULT_ESM_ZONE)]
+    dsm_zone, de, dn, lat, lon = _cached("esm_to_dsm", esm_zone, (e, n), lambda: points.esm_to_dsm(esm_zone, e, n))
+    return {"esm_zone": esm_zone, "dsm_zone": dsm_zone, "dsm_easting": de, "dsm_northing": dn, "lat": lat, "lon": lon}
+
+
+def dsm_to_latlon_point(record):
+    e, n, zone = _number(record, "easting"), _number(record, "northing"), _dsm_zone(record)
+    lat, lon = _cached("dsm_to_latlon", zone, (e, n), lambda: points.dsm_to_latlon(zone, e, n))
+    return {"zone": zone, "lat": lat, "lon": lon}
+
+
+def dsm_to_esm_point(record):
+    e, n, zone = _number(record, "easting"), _number(record, "northing"), _dsm_zone(record)
+    esm_zone, epsg, ee, en = _cached("dsm_to_esm", zone, (e, n), lambda: points.dsm_to_esm(zone, e, n))
+    return {"dsm_zone": zone, "esm_zone": esm_zone, "esm_epsg": epsg, "esm_easting": ee, "esm_northing": en}
+
+
+def distance_point(record):
+    coords = tuple(_number(record, name) for name in ("lat1", "lon1", "lat2", "lon2"))
+    method = record.get("method") or METHOD_SPHERICAL
+    ellipsoid = record.get("ellipsoid") or ELLIPSOID_WGS84
+    km, bearing, k1, e1, k2, e2 = _cached(*points.distance_cache_key(method, ellipsoid), coords,
+                                          lambda: points.distance_bearing(*coords, method, ellipsoid))
+    return {"distance_km": km, "bearing": bearing, "zone_a": k1, "epsg_a": e1, "zone_b": k2, "epsg_b": e2}
+
+
+def dd_to_dms_point(record):
+    return {"lat_dms": decimal_to_dms(_number(record, "lat"), "lat"),
+            "lon_dms": decimal_to_dms(_number(record, "lon"), "lon")}
+
+
+def dms_to_dd_point(record):
+    return {"lat_dd": dms_to_decimal(str(record.get("lat", ""))), "lon_dd": dms_to_decimal(str(record.get("lon", "")))}
+
+
+def _zone_column(df, default=None):
+    if "zone" not in df.columns:
+        return df.assign(zone=default)
+    return df if default is None else df.assign(zone=df["zone"].fillna(default))
+
+
+def _floats(df, *names):
+    return [to_float_array(df[name]) if name in df.columns else np.full(len(df), np.nan) for name in names]
+
+
+def _names(df, name, default):
+    # A per-record option column, or the default for every record
+    if name not in df.columns:
+        return default
+    return df[name].where(df[name].notna() & (df[name] != ""), default).to_numpy(dtype=object)
+
+
+def _status(ok, error):
+    return np.where(ok, STATUS_OK, error)
+
+
+def grid_to_latlon_bulk(df):
+    res = grid_to_latlon_frame(_zone_column(df, DEFAULT_ESM_ZONE), routing=ROUTING_COLUMN)
+    return res[["zone", "lat", "lon", "status"]]
+
+
+def dsm_to_latlon_bulk(df):
+    res = grid_to_latlon_frame(_zone_column(df), grid=GRID_DSM, routing=ROUTING_COLUMN)
+    return res[["zone", "lat", "lon", "status"]]
+
+
+def latlon_to_grid_bulk(df):
+    lat, lon = _floats(df, "lat", "lon")
+    res = latlon_to_grid(lon, lat)
+    # As in the tab, points outside every zone are projected in Zone I
+    zone = np.where(res["valid"] & (res["zone"] == None), points.DEFAULT_ESM_LABEL, res["zone"])
+    return pd.DataFrame({"zone": zone, "epsg": np.where(res["valid"], res["epsg"], None),
+                         "easting": res["easting"], "northing": res["northing"], "status": res["status"]})
+
+
+def esm_to_dsm_bulk(df):
+    res = esm_to_dsm_frame(_zone_column(df, DEFAULT_ESM_ZONE), routing=ROUTING_COLUMN)
+    return res[["esm_zone", "dsm_zone", "dsm_easting", "dsm_northing", "lat", "lon", "status"]]
+
+
+def dsm_to_esm_bulk(df):
+    res = dsm_to_esm_frame(_zone_column(df), routing=ROUTING_COLUMN)
+    return res[["dsm_zone", "esm_zone", "esm_epsg", "esm_easting", "esm_northing", "status"]]
+
+
+def distance_bulk(df):
+    lat1, lon1, lat2, lon2 = _floats(df, "lat1", "lon1", "lat2", "lon2")
+    zone_a, epsg_a = detect_kalianpur_zones(lat1, lon1)
+    zone_b, epsg_b = detect_kalianpur_zones(lat2, lon2)
+    ok = np.isfinite(lat1) & np.isfinite(lon1) & np.isfinite(lat2) & np.isfinite(lon2)
+    km, bearing = distance_bearing_array(lat1, lon1, lat2, lon2, _names(df, "method", METHOD_SPHERICAL),
+                                         _names(df, "ellipsoid", ELLIPSOID_WGS84))
+    return pd.DataFrame({
+        "distance_km": np.round(km, 3),
+        "bearing": np.round(bearing, 2),
+        "zone_a": zone_a, "epsg_a": epsg_a, "zone_b": zone_b, "epsg_b": epsg_b,
+        "status": _status(ok, STATUS_BAD_INPUT),
+    })
+
+
+def dd_to_dms_bulk(df):
+    lat, lon = _floats(df, "lat", "lon")
+    return pd.DataFrame({"lat_dms": format_dms_array(lat, "lat"), "lon_dms": format_dms_array(lon, "lon"),
+                         "status": _status(np.isfinite(lat) & np.isfinite(lon), STATUS_BAD_INPUT)})
+
+
+def dms_to_dd_bulk(df):
+    empty = pd.Series([None] * len(df), dtype=object)
+    lat, lat_err = parse_dms_array(df["lat"] if "lat" in df.columns else empty)
+    lon, lon_err = parse_dms_array(df["lon"] if "lon" in df.columns else empty)
+    return pd.DataFrame({"lat_dd": lat, "lon_dd": lon, "status": _status(~(lat_err | lon_err), STATUS_BAD_DMS)})
+
+
+OPERATIONS = {
+    "grid-to-latlon": Operation(grid_to_latlon_point, grid_to_latlon_bulk,
+                                "easting, northing, zone (Kalianpur, default Zone I) -> lat, lon"),
+    "latlon-to-grid": Operation(latlon_to_grid_point, latlon_to_grid_bulk,
+                                "lat, lon -> zone, epsg, easting, northing"),
+    "esm-to-dsm": Operation(esm_to_dsm_point, esm_to_dsm_bulk,
+                            "easting, northing, zone (Kalianpur) -> dsm_zone, dsm_easting, dsm_northing"),
+    "dsm-to-latlon": Operation(dsm_to_latlon_point, dsm_to_latlon_bulk,
+                               "easting, northing, zone (DSM sheet) -> lat, lon"),
+    "dsm-to-esm": Operation(dsm_to_esm_point, dsm_to_esm_bulk,
+                            "easting, northing, zone (DSM sheet) -> esm_zone, esm_easting, esm_northing"),
+    "distance": Operation(distance_point, distance_bulk,
+                          "lat1, lon1, lat2, lon2, method (spherical or ellipsoidal), "
+                          "ellipsoid (WGS84 or Everest 1830) -> distance_km, bearing"),
+    "dd-to-dms": Operation(dd_to_dms_point, dd_to_dms_bulk, "lat, lon (decimal) -> lat_dms, lon_dms"),
+    "dms-to-dd": Operation(dms_to_dd_point, dms_to_dd_bulk, "lat, lon (D°M'S\"H) -> lat_dd, lon_dd"),
+}
+
+
+class RequestError(Exception):
+    """A request the service answers with an HTTP error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(data):
+    return json.dumps(data, default=lambda o: o.item() if isinstance(o, np.generic) else str(o)).encode("utf-8")
+
+
+def _finite(result):
+    # NaN and inf are not JSON; points outside a projection come back as null
+    return {k: None if isinstance(v, float) and not math.isfinite(v) else v for k, v in result.items()}
+
+
+def convert_records(operation, records):
+    """Convert a list of record dicts with the bulk form of ``operation``; a result DataFrame."""
+    if not all(isinstance(r, dict) for r in records):
+        raise RequestError(400, "Every record must be a JSON object")
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_records(records)
+    try:
+        with metrics.timer("service_bulk", operation, len(df)):
+            res = OPERATIONS[operation].bulk(df).reset_index(drop=True)
+    except ValueError as e:
+        raise RequestError(422, str(e))
+    if "id" in df.columns:
+        # From the records rather than the frame, which turns integer ids with gaps into floats
+        res.insert(0, "id", pd.Series([r.get("id") for r in records], dtype=object))
+    return res
+
+
+def convert_ndjson(operation, lines):
+    """Convert NDJSON lines (bytes); returns the NDJSON result lines.
+
+    A line that is not a JSON object converts as an empty record, so it
+    keeps its place in the output with an error status.
+    """
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        records.append(record if isinstance(record, dict) else {})
+    return convert_records(operation, records).to_json(orient="records", lines=True).encode("utf-8")
+
+
+def health():
+    return {
+        "status": "ok",
+        "operations": {name: op.help for name, op in OPERATIONS.items()},
+        "transformer_cache": get_pool().stats(),
+        "result_cache": get_result_cache().stats(),
+    }
+
+
+def _operation(method, path):
+    name = path[len("/v1/"):] if path.startswith("/v1/") else None
+    if name not in OPERATIONS:
+        raise RequestError(404, f"Unknown path: {path}")
+    if method != "POST":
+        raise RequestError(405, "Use POST")
+    return name
+
+
+def handle(method, path, content_type, body):
+    """Answer one buffered request: ``(status, content_type, body bytes)``."""
+    try:
+        if path == "/health":
+            return 200, JSON_TYPE, _json(health())
+        operation = _operation(method, path)
+        if content_type == NDJSON_TYPE:
+            lines = [line for line in body.split(b"\n") if line.strip()]
+            out = b"".join(convert_ndjson(operation, lines[i:i + NDJSON_BATCH])
+                           for i in range(0, len(lines), NDJSON_BATCH))
+            return 200, NDJSON_TYPE, out
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            raise RequestError(400, f"Invalid JSON: {e}")
+        if isinstance(payload, list):
+            return 200, JSON_TYPE, convert_records(operation, payload).to_json(orient="records").encode("utf-8")
+        if not isinstance(payload, dict):
+            raise RequestError(400, "Send a JSON object, a JSON array of objects or NDJSON")
+        try:
+            with metrics.timer("service_point", operation, 1):
+                return 200, JSON_TYPE, _json(_finite(OPERATIONS[operation].point(payload)))
+        except (ValueError, KeyError, ProjError) as e:
+            # ProjError covers zones PROJ has no definition for (IVb, Va, Vb)
+            raise RequestError(422, str(e))
+    except RequestError as e:
+        return e.status, JSON_TYPE, _json({"error": str(e)})
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        threads = int(os.environ.get("FSS_SERVICE_THREADS") or min(32, (os.cpu_count() or 1) + 4))
+        _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="fss-service")
+    return _executor
+
+
+async def _send(send, status, content_type, body):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _stream_ndjson(operation, receive, send):
+    """Convert an NDJSON body batch by batch while it is still arriving."""
+    loop = asyncio.get_running_loop()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", NDJSON_TYPE.encode())]})
+    pending, partial, more = [], b"", True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        more = message.get("more_body", False)
+        lines = (partial + message.get("body", b"")).split(b"\n")
+        partial = b"" if not more else lines.pop()
+        pending.extend(line for line in lines if line.strip())
+        while len(pending) >= NDJSON_BATCH or (pending and not more):
+            batch, pending = pending[:NDJSON_BATCH], pending[NDJSON_BATCH:]
+            try:
+                out = await loop.run_in_executor(_get_executor(), convert_ndjson, operation, batch)
+            except RequestError as e:
+                # The status line is already sent; the error ends the stream as its last line
+                await send({"type": "http.response.body", "body": _json({"error": str(e)}) + b"\n"})
+                return
+            await send({"type": "http.response.body", "body": out, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def app(scope, receive, send):
+    """The service as an ASGI 3 application."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                start_warmup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    headers = dict(scope["headers"])
+    content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+    if content_type == NDJSON_TYPE and method == "POST" and path.startswith("/v1/"):
+        try:
+            operation = _operation(method, path)
+        except RequestError as e:
+            await _send(send, e.status, JSON_TYPE, _json({"error": str(e)}))
+            return
+        await _stream_ndjson(operation, receive, send)
+        return
+
+    body, more = b"", True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    loop = asyncio.get_running_loop()
+    await _send(send, *await loop.run_in_executor(_get_executor(), handle, method, path, content_type, body))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, keep-alive clients wait out a delayed ACK
+    disable_nagle_algorithm = True
+
+    def _answer(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        status, out_type, out = handle(method, self.path.split("?")[0], content_type, body)
+        self.send_response(status)
+        self.send_header("Content-Type", out_type)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_GET(self):
+        self._answer("GET")
+
+    def do_POST(self):
+        self._answer("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, stdlib=False):
+    """Serve until interrupted: uvicorn if it is installed, else the standard library."""
+    if not stdlib:
+        try:
+            import uvicorn
+        except ImportError:
+            stdlib = True
+    if stdlib:
+        start_warmup()
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        print(f"FSS Survey Calculator API on http://{host}:{server.server_port} (http.server)", file=sys.stderr, flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        return
+    print(f"FSS Survey Calculator API on http://{host}:{port} (uvicorn)", file=sys.stderr, flush=True)
+    uvicorn.run(app, host=host, port=port, log_level="warning", access_log=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.service", description="FSS Survey Calculator HTTP API")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--stdlib", action="store_true", help="use http.server even if uvicorn is installed")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.stdlib)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Point files imported once into a memory-mapped columnar store.
+
+Re-running one large point file through several conversions re-parses it
+every time. ``import_points`` reads a CSV, Parquet or Feather file once,
+chunk by chunk, into a store directory:
+
+    points.fsspts/
+        meta.json       row count, column order and kinds
+        easting.f64     one raw little-endian float64 array per numeric column
+        northing.f64
+        ids.arrow       the text columns (point IDs, zones) as an uncompressed Arrow IPC file
+
+``PointStore`` opens it with ``np.memmap`` and ``pyarrow.memory_map``.
+Nothing is parsed or copied: pages are read when a conversion touches
+them, and the OS page cache keeps them between runs. ``frame()`` wraps
+the mapped arrays in a DataFrame without copying, so the frame
+converters run on it as on a file read with ``read_frame``:
+
+    store = import_points("points.csv", "points.fsspts")   # once
+    store = PointStore("points.fsspts")                      # every later run
+    latlon = grid_to_latlon_frame(store.frame(), zone="Zone I")
+    dsm = esm_to_dsm_frame(store.frame(), zone="Zone I")
+
+``stream_table`` and ``parallel_stream_table`` take a store as their
+source and read it in slices. Numeric columns are float64, with
+unparseable entries as NaN. ``point_id``, ``zone`` and any
+``text_columns`` are kept as text, even when they look numeric.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .formats import ChunkReader, _arrow, format_from_name
+
+STORE_SUFFIX = ".fsspts"
+STORE_VERSION = 1
+META_FILE = "meta.json"
+IDS_FILE = "ids.arrow"
+FLOAT_SUFFIX = ".f64"
+TEXT_COLUMNS = ("point_id", "zone")
+DEFAULT_CHUNK_ROWS = 500_000
+FLOAT_KIND = "float64"
+TEXT_KIND = "text"
+
+
+def store_dir():
+    return os.environ.get("FSS_STORE_DIR") or os.path.join(tempfile.gettempdir(), "fss_stores")
+
+
+def is_store(path):
+    """Whether ``path`` is a point store directory."""
+    return os.path.isfile(os.path.join(str(path), META_FILE))
+
+
+def remove_store(path):
+    """Delete the store at ``path``; anything that is not a point store is left alone."""
+    if is_store(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _column_kinds(chunk, text_columns):
+    kinds = {}
+    for name in chunk.columns:
+        numeric = pd.api.types.is_numeric_dtype(chunk[name]) and not pd.api.types.is_bool_dtype(chunk[name])
+        kinds[str(name)] = FLOAT_KIND if numeric and name not in text_columns else TEXT_KIND
+    return kinds
+
+
+def _float_files(kinds):
+    """File names for the float columns: the column name where it is a safe one."""
+    files = {}
+    for i, (name, kind) in enumerate(kinds.items()):
+        if kind == FLOAT_KIND:
+            safe = re.sub(r"[^A-Za-z0-9_-]", "_", name)[:64] or "column"
+            files[name] = safe + FLOAT_SUFFIX if safe + FLOAT_SUFFIX not in files.values() else f"{safe}_{i}{FLOAT_SUFFIX}"
+    return files
+
+
+def import_points(source, path, input_format=None, columns=None, text_columns=(), chunk_rows=DEFAULT_CHUNK_ROWS,
+                  progress=None):
+    """Read a point file once into a store at ``path`` and return it opened.
+
+    ``source`` is a path or a file object. ``input_format`` defaults to the
+    one named by its extension. ``columns`` limits the columns kept. The
+    store is written beside ``path`` and renamed into place when complete.
+    An existing store at ``path`` is replaced. Any other existing file or
+    directory raises ``FileExistsError``.
+    """
+    path = os.fspath(path)
+    if os.path.exists(path) and not is_store(path):
+        raise FileExistsError(f"{path} exists and is not a point store")
+    if input_format is None:
+        input_format = format_from_name(source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", ""))
+    text_columns = set(TEXT_COLUMNS) | set(text_columns)
+    pa = _arrow()
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    kinds, names, files, ids_writer, rows = None, {}, {}, None, 0
+    try:
+        reader = ChunkReader(source, input_format, chunk_rows, columns)
+        with metrics.timer("store_import", input_format) as timer:
+            for chunk in reader:
+                if kinds is None:
+                    kinds = _column_kinds(chunk, text_columns)
+                    names = _float_files(kinds)
+                    files = {name: open(os.path.join(tmp, file), "wb") for name, file in names.items()}
+                missing = [name for name in kinds if name not in chunk.columns]
+                if missing:
+                    raise ValueError(f"Column(s) missing from a later chunk: {', '.join(missing)}")
+                for name, f in files.items():
+                    values = pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype="<f8")
+                    values.tofile(f)
+                text = [name for name, kind in kinds.items() if kind == TEXT_KIND]
+                if text:
+                    table = pa.table({name: pa.array(chunk[name].astype("string"), type=pa.string(), from_pandas=True)
+                                      for name in text})
+                    if ids_writer is None:
+                        ids_writer = pa.ipc.new_file(os.path.join(tmp, IDS_FILE), table.schema)
+                    ids_writer.write_table(table)
+                rows += len(chunk)
+                if progress is not None:
+                    progress(reader.fraction())
+            timer.points = rows
+    finally:
+        for f in files.values():
+            f.close()
+        if ids_writer is not None:
+            ids_writer.close()
+    if kinds is None:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise ValueError("The point file has no rows")
+
+    meta = {
+        "version": STORE_VERSION,
+        "rows": rows,
+        "columns": [{"name": name, "kind": kind, **({"file": names[name]} if name in names else {})}
+                    for name, kind in kinds.items()],
+        "source": os.path.basename(str(getattr(source, "name", source))),
+        "input_format": input_format,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    if is_store(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    if progress is not None:
+        progress(1.0)
+    return PointStore(path)
+
+
+class PointStore:
+    """A point store opened read-only by memory mapping (see ``import_points``)."""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        try:
+            with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"{self.path} is not a point store") from None
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{self.path}: unsupported point store version {meta.get('version')}")
+        self.meta = meta
+        self.rows = int(meta["rows"])
+        self.kinds = {c["name"]: c["kind"] for c in meta["columns"]}
+        self._files = {c["name"]: os.path.join(self.path, c["file"]) for c in meta["columns"] if c["kind"] == FLOAT_KIND}
+        self._arrays = {}
+        self._ids = None
+        for name, file in self._files.items():
+            size = os.path.getsize(file)
+            if size != self.rows * 8:
+                raise ValueError(f"{self.path}: column {name!r} holds {size // 8} values, expected {self.rows}")
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return list(self.kinds)
+
+    def _ids_table(self):
+        if self._ids is None:
+            pa = _arrow()
+            # Uncompressed IPC from a memory map: the string buffers are not copied
+            self._ids = pa.ipc.open_file(pa.memory_map(os.path.join(self.path, IDS_FILE))).read_all()
+        return self._ids
+
+    def array(self, name):
+        """A float64 column as a read-only memory map, or a text column as a pandas Series."""
+        kind = self.kinds.get(name)
+        if kind is None:
+            raise KeyError(f"No column {name!r} in {self.path} (columns: {', '.join(self.kinds)})")
+        if kind == TEXT_KIND:
+            return self._ids_table().column(name).to_pandas()
+        if name not in self._arrays:
+            if self.rows:
+                self._arrays[name] = np.memmap(self._files[name], dtype="<f8", mode="r", shape=(self.rows,))
+            else:
+                self._arrays[name] = np.empty(0)
+        return self._arrays[name]
+
+    def frame(self, columns=None, start=0, stop=None):
+        """Rows ``start:stop`` as a DataFrame over the mapped arrays.
+
+        ``columns`` lists the columns wanted; names the store does not have
+        are ignored, as in ``read_frame``.
+        """
+        names = self.columns if columns is None else [c for c in self.kinds if c in set(columns)]
+        stop = self.rows if stop is None else min(stop, self.rows)
+        data = {}
+        for name in names:
+            if self.kinds[name] == FLOAT_KIND:
+                data[name] = self.array(name)[start:stop]
+            else:
+                # The array, not the Series: a Series would be aligned on its own 0-based index
+                data[name] = self._ids_table().column(name).slice(start, stop - start).to_pandas().array
+        return pd.DataFrame(data, index=pd.RangeIndex(start, stop), copy=False)
+
+    def reader(self, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None):
+        """A ``ChunkReader`` look-alike over slices of the store, for ``stream_table``."""
+        return StoreReader(self, chunk_rows, columns)
+
+    def info(self):
+        """Rows, columns and sizes on disk."""
+        files = [os.path.join(self.path, name) for name in os.listdir(self.path)]
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "columns": dict(self.kinds),
+            "bytes": sum(os.path.getsize(f) for f in files),
+            "source": self.meta.get("source"),
+            "created": self.meta.get("created"),
+        }
+
+
+class StoreReader:
+    """Iterates a ``PointStore`` as DataFrames of at most ``chunk_rows`` rows."""
+
+    def __init__(self, store, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None):
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self.columns = columns
+        self._done = 0
+
+    def __iter__(self):
+        rows = self.store.rows
+        for start in range(0, rows, self.chunk_rows):
+            self._done = min(start + self.chunk_rows, rows)
+            yield self.store.frame(self.columns, start, self._done)
+
+    def fraction(self):
+        return self._done / self.store.rows if self.store.rows else 1.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fss_survey.store",
+                                     description="Import a point file into a memory-mapped point store")
+    parser.add_argument("input", help="CSV, Parquet or Feather point file")
+    parser.add_argument("store", nargs="?", help=f"store directory (default: the input name with {STORE_SUFFIX})")
+    parser.add_argument("--text-col", action="append", default=[],
+                        help="keep this column as text (point_id and zone always are); repeatable")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_ROWS, help="rows per chunk")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        raise SystemExit("error: --chunk-size must be positive")
+
+    path = args.store or os.path.splitext(args.input)[0] + STORE_SUFFIX
+    start = time.perf_counter()
+    store = import_points(args.input, path, text_columns=args.text_col, chunk_rows=args.chunk_size)
+    info = store.info()
+    print(f"{info['rows']:,} rows in {time.perf_counter() - start:.2f} s -> {path} "
+          f"({info['bytes'] / 2**20:.1f} MiB)", file=sys.stderr)
+    for name, kind in info["columns"].items():
+        print(f"  {name:<20} {kind}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
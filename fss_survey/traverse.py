@@ -0,0 +1,274 @@
+"""Traverse computation from a table of bearing/distance legs.
+
+Each leg moves ``distance * sin(bearing)`` east and ``distance *
+cos(bearing)`` north, as in the Deg & Dist Calc tab, with bearings in
+degrees clockwise from grid north (the ``bearing_grid`` convention).
+Station coordinates are cumulative sums of those deltas from the start
+point, one ``np.cumsum`` per column.
+
+A traverse that ends on its start or on a known point has a misclosure.
+``"bowditch"`` (compass rule) spreads it along the traverse in proportion
+to cumulative leg length. ``"transit"`` spreads the easting part in
+proportion to cumulative ``|delta_e|`` and the northing part in
+proportion to cumulative ``|delta_n|``. Height misclosure is spread by
+leg length under either rule.
+
+The misclosure must be known before any station can be adjusted, so a
+streamed traverse reads its legs twice: once for the totals and once to
+write the stations. Only one chunk is held in memory at a time.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from .batch import PREVIEW_ROWS, require_columns, to_float_array
+from .convert import DEFAULT_CHUNK_SIZE
+from .dms_arrays import format_bearing_array, parse_bearing_array
+from .formats import FORMAT_CSV, ChunkReader, FrameWriter
+from .geodesy_arrays import bearing_grid_array
+
+ADJUST_NONE = "none"
+ADJUST_BOWDITCH = "bowditch"
+ADJUST_TRANSIT = "transit"
+ADJUSTMENTS = (ADJUST_NONE, ADJUST_BOWDITCH, ADJUST_TRANSIT)
+LEG_COLUMNS = ("bearing", "distance", "height_diff", "point_id")
+
+
+def leg_arrays(df, offset=0):
+    """``(bearing, distance, height_diff)`` float arrays from a leg table.
+
+    ``bearing`` may hold decimal degrees or ``format_bearing`` strings and
+    ``height_diff`` is optional. Raises ``ValueError`` naming the legs
+    (1-based, counted from ``offset``) that have no usable bearing or
+    distance, since every later station depends on them.
+    """
+    require_columns(df, ["bearing", "distance"])
+    if pd.api.types.is_numeric_dtype(df["bearing"]):
+        bearing = to_float_array(df["bearing"])
+    else:
+        bearing, _ = parse_bearing_array(df["bearing"].to_numpy())
+    distance = to_float_array(df["distance"])
+    if "height_diff" in df.columns:
+        height_diff = np.nan_to_num(to_float_array(df["height_diff"]))
+    else:
+        height_diff = np.zeros(len(df))
+    bad = np.flatnonzero(~(np.isfinite(bearing) & np.isfinite(distance) & (distance >= 0)))
+    if len(bad):
+        legs = ", ".join(str(i + offset + 1) for i in bad[:10].tolist()) + (", ..." if len(bad) > 10 else "")
+        raise ValueError(f"Invalid bearing or distance on leg(s) {legs}")
+    return bearing, distance, height_diff
+
+
+def leg_deltas(bearing, distance):
+    """Easting and northing deltas of each leg."""
+    rad = np.radians(bearing)
+    return distance * np.sin(rad), distance * np.cos(rad)
+
+
+def closure(totals, start, closing):
+    """Misclosure of a traverse from its leg ``totals`` (see ``_Totals``).
+
+    ``start`` and ``closing`` are ``(easting, northing, height)``. The
+    misclosure is computed minus known, so the correction is its negative.
+    ``precision`` is the traverse length over the linear misclosure, the N
+    of "1:N".
+    """
+    mis_e = start[0] + totals.delta_e - closing[0]
+    mis_n = start[1] + totals.delta_n - closing[1]
+    mis_h = start[2] + totals.height_diff - closing[2]
+    linear = math.hypot(mis_e, mis_n)
+    return {
+        "legs": totals.legs,
+        "length": totals.length,
+        "misclosure_e": mis_e,
+        "misclosure_n": mis_n,
+        "misclosure_h": mis_h,
+        "linear": linear,
+        "precision": totals.length / linear if linear else math.inf,
+    }
+
+
+class _Totals:
+    """Running sums over the legs, accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.legs = 0
+        self.length = self.delta_e = self.delta_n = 0.0
+        self.abs_e = self.abs_n = self.height_diff = 0.0
+
+    def add(self, de, dn, distance, height_diff):
+        self.legs += len(distance)
+        self.length += float(distance.sum())
+        self.delta_e += float(de.sum())
+        self.delta_n += float(dn.sum())
+        self.abs_e += float(np.abs(de).sum())
+        self.abs_n += float(np.abs(dn).sum())
+        self.height_diff += float(height_diff.sum())
+
+
+def _share(cumulative, total):
+    return cumulative / total if total else np.zeros_like(cumulative)
+
+
+class _Stations:
+    """Turns chunks of legs into station rows, carrying the running sums
+    from one chunk to the next."""
+
+    def __init__(self, start, adjustment=ADJUST_NONE, totals=None, closure=None):
+        # An open traverse has nothing to distribute
+        self.adjustment = adjustment if closure is not None else ADJUST_NONE
+        self.totals = totals
+        self.closure = closure
+        self.legs = 0
+        self.e, self.n, self.h = start
+        self.adj_e, self.adj_n = start[0], start[1]
+        self.length = self.abs_e = self.abs_n = 0.0
+
+    def frame(self, df, bearing, distance, height_diff):
+        de, dn = leg_deltas(bearing, distance)
+        easting = self.e + np.cumsum(de)
+        northing = self.n + np.cumsum(dn)
+        height = self.h + np.cumsum(height_diff)
+        cum_length = self.length + np.cumsum(distance)
+        cum_abs_e = self.abs_e + np.cumsum(np.abs(de))
+        cum_abs_n = self.abs_n + np.cumsum(np.abs(dn))
+
+        leg = np.arange(self.legs + 1, self.legs + len(df) + 1)
+        out = {
+            "leg": leg,
+            "point_id": df["point_id"].to_numpy() if "point_id" in df.columns else
+                        np.array([f"P{i}" for i in leg.tolist()], dtype=object),
+            "bearing": bearing,
+            "distance": distance,
+            "height_diff": height_diff,
+            "delta_e": de,
+            "delta_n": dn,
+            "easting": easting,
+            "northing": northing,
+            "height": height,
+        }
+
+        if self.adjustment != ADJUST_NONE:
+            c, t = self.closure, self.totals
+            length_share = _share(cum_length, t.length)
+            if self.adjustment == ADJUST_BOWDITCH:
+                share_e = share_n = length_share
+            else:
+                share_e, share_n = _share(cum_abs_e, t.abs_e), _share(cum_abs_n, t.abs_n)
+            adj_e = easting - c["misclosure_e"] * share_e
+            adj_n = northing - c["misclosure_n"] * share_n
+            prev_e = np.concatenate(([self.adj_e], adj_e[:-1]))
+            prev_n = np.concatenate(([self.adj_n], adj_n[:-1]))
+            adj_bearing = bearing_grid_array(prev_e, prev_n, adj_e, adj_n)
+            out.update({
+                "adj_easting": adj_e,
+                "adj_northing": adj_n,
+                "adj_height": height - c["misclosure_h"] * length_share,
+                "adj_bearing": adj_bearing,
+                "adj_bearing_dms": format_bearing_array(adj_bearing),
+                "adj_distance": np.hypot(adj_e - prev_e, adj_n - prev_n),
+            })
+
+        if len(df):
+            if self.adjustment != ADJUST_NONE:
+                self.adj_e, self.adj_n = float(out["adj_easting"][-1]), float(out["adj_northing"][-1])
+            self.legs += len(df)
+            self.e, self.n, self.h = float(easting[-1]), float(northing[-1]), float(height[-1])
+            self.length, self.abs_e, self.abs_n = float(cum_length[-1]), float(cum_abs_e[-1]), float(cum_abs_n[-1])
+        return pd.DataFrame(out)
+
+
+def _start_point(start):
+    e, n, *h = start
+    return float(e), float(n), float(h[0]) if h else 0.0
+
+
+def _closing_point(closing, start):
+    if closing is None:
+        return None
+    if closing == "start":
+        return start
+    e, n, *h = closing
+    # Without a known closing height the heights are not closed
+    return float(e), float(n), float(h[0]) if h else None
+
+
+def _totals(legs):
+    totals = _Totals()
+    for bearing, distance, height_diff in legs:
+        totals.add(*leg_deltas(bearing, distance), distance, height_diff)
+    return totals
+
+
+def _prepare(legs, start, closing, adjustment):
+    """First pass: ``(start, totals, closure)`` with the closure None for an open traverse."""
+    if adjustment not in ADJUSTMENTS:
+        raise ValueError(f"Unknown adjustment: {adjustment} (expected one of {', '.join(ADJUSTMENTS)})")
+    start = _start_point(start)
+    closing = _closing_point(closing, start)
+    if closing is None:
+        return start, None, None
+    totals = _totals(legs)
+    if closing[2] is None:
+        closing = (closing[0], closing[1], start[2] + totals.height_diff)
+    return start, totals, closure(totals, start, closing)
+
+
+def traverse_frame(df, start, closing=None, adjustment=ADJUST_BOWDITCH):
+    """Compute every station of a traverse from a leg table.
+
+    ``df`` has ``bearing`` and ``distance`` columns and optional
+    ``height_diff`` and ``point_id`` columns. ``start`` is ``(easting,
+    northing)`` or ``(easting, northing, height)``. ``closing`` is None for
+    an open traverse, ``"start"`` for a loop, or the known closing point.
+    ``adjustment`` is ``"bowditch"``, ``"transit"`` or ``"none"`` and is
+    ignored for an open traverse.
+
+    Returns ``(stations, closure)``: one row per leg holding the station
+    at its end, and the ``closure`` dict, or None when open.
+    """
+    legs = leg_arrays(df)
+    start, totals, closed = _prepare([legs], start, closing, adjustment)
+    stations = _Stations(start, adjustment, totals, closed)
+    return stations.frame(df, *legs), closed
+
+
+def stream_traverse(source, out, start, closing=None, adjustment=ADJUST_BOWDITCH, chunk_rows=DEFAULT_CHUNK_SIZE,
+                    progress=None, input_format=FORMAT_CSV, output_format=FORMAT_CSV):
+    """``traverse_frame`` over a leg file of any length, written to ``out``
+    chunk by chunk.
+
+    ``source`` is a path or a seekable file, since a closed traverse reads
+    it twice. Returns a dict with ``legs``, ``chunks``, ``closure`` and a
+    ``preview`` of the first ``PREVIEW_ROWS`` stations.
+    """
+    def chunks():
+        if hasattr(source, "seekable") and source.seekable():
+            source.seek(0)
+        return ChunkReader(source, input_format, chunk_rows, LEG_COLUMNS)
+
+    def legs():
+        offset = 0
+        for chunk in chunks():
+            yield leg_arrays(chunk, offset)
+            offset += len(chunk)
+
+    start, totals, closed = _prepare(legs(), start, closing, adjustment)
+    stations = _Stations(start, adjustment, totals, closed)
+    preview = None
+    reader = chunks()
+
+    with FrameWriter(out, output_format) as writer:
+        for chunk in reader:
+            res = stations.frame(chunk, *leg_arrays(chunk, stations.legs))
+            writer.write(res)
+            if preview is None:
+                preview = res.head(PREVIEW_ROWS)
+            if progress is not None:
+                progress(reader.fraction())
+
+    if progress is not None:
+        progress(1.0)
+    return {"legs": stations.legs, "chunks": writer.chunks, "closure": closed, "preview": preview}
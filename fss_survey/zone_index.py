@@ -0,0 +1,101 @@
+"""Vectorized zone detection over whole coordinate arrays.
+
+Each zone table is a list of closed lat/lon boxes matched in table order.
+``ZoneIndex`` precomputes the first-matching zone for every elementary cell
+formed by the box edges, with coordinates lying exactly on an edge treated
+as their own class. Classifying a point is then two ``searchsorted`` calls and
+one table lookup, and gives exactly the same answer as the ``detect_*``
+loops in ``fss_survey.zones``, including on shared boundaries.
+
+For the regular 8 x 6 degree DSM sheet grid this reduces to sheet-number
+arithmetic, without the float rounding a division-based formula would
+introduce at sheet edges.
+"""
+
+import numpy as np
+
+from . import metrics
+from .zones import DSM_LCC_ZONES, ENHANCED_KALIANPUR_ZONES, WGS84_ZONES
+
+
+def _edge_classes(edges, values):
+    """Map values to classes: ``2*i`` for the open interval below ``edges[i]``,
+    ``2*i + 1`` for exactly ``edges[i]``. NaN falls above every edge.
+    Keeps the shape of ``values``, so a scalar gives a 0-d array."""
+    shape = np.shape(values)
+    values = np.atleast_1d(values)
+    idx = np.searchsorted(edges, values, side="left")
+    on_edge = idx < len(edges)
+    on_edge[on_edge] = edges[idx[on_edge]] == values[on_edge]
+    return (2 * idx + on_edge).reshape(shape)
+
+
+def _class_representatives(edges):
+    below = np.concatenate(([edges[0] - 1.0], (edges[:-1] + edges[1:]) / 2, [edges[-1] + 1.0]))
+    reps = np.empty(2 * len(edges) + 1)
+    reps[0::2] = below
+    reps[1::2] = edges
+    return reps
+
+
+class ZoneIndex:
+    """First-match lookup table over closed ``(lat_min, lat_max, lon_min, lon_max)`` boxes."""
+
+    def __init__(self, names, boxes, codes):
+        boxes = np.asarray(boxes, dtype=np.float64)
+        # A trailing None so that "no zone" (-1) indexes straight into it
+        self.names = np.array(list(names) + [None], dtype=object)
+        self.codes = np.array(list(codes) + [None], dtype=object)
+        self.lat_edges = np.unique(boxes[:, :2])
+        self.lon_edges = np.unique(boxes[:, 2:])
+
+        lat = _class_representatives(self.lat_edges)[None, :, None]
+        lon = _class_representatives(self.lon_edges)[None, None, :]
+        lat_min, lat_max, lon_min, lon_max = (boxes[:, i, None, None] for i in range(4))
+        inside = (lat_min <= lat) & (lat <= lat_max) & (lon_min <= lon) & (lon <= lon_max)
+        self.table = np.where(inside.any(axis=0), inside.argmax(axis=0), -1)
+
+    def lookup(self, lat, lon):
+        """Zone positions in table order for each point, -1 outside every zone."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        return self.table[_edge_classes(self.lat_edges, lat), _edge_classes(self.lon_edges, lon)]
+
+    def classify(self, lat, lon):
+        """``(zone_names, epsg_codes)`` object arrays, None outside every zone;
+        plain values for scalar ``lat`` and ``lon``."""
+        pos = self.lookup(lat, lon)
+        return self.names[pos], self.codes[pos]
+
+
+def _bounds_index(table):
+    return ZoneIndex(
+        table.keys(),
+        [(z['bounds']['lat_min'], z['bounds']['lat_max'], z['bounds']['lon_min'], z['bounds']['lon_max'])
+         for z in table.values()],
+        [z['epsg'] for z in table.values()],
+    )
+
+
+KALIANPUR_INDEX = _bounds_index(ENHANCED_KALIANPUR_ZONES)
+WGS84_INDEX = _bounds_index(WGS84_ZONES)
+DSM_INDEX = ZoneIndex(
+    DSM_LCC_ZONES.keys(),
+    [(z['extent'][1], z['extent'][3], z['extent'][0], z['extent'][2]) for z in DSM_LCC_ZONES.values()],
+    [z['epsg'] for z in DSM_LCC_ZONES.values()],
+)
+
+
+def detect_kalianpur_zones(lat, lon):
+    with metrics.timer("zone_detection", "kalianpur", np.size(lat)):
+        return KALIANPUR_INDEX.classify(lat, lon)
+
+
+def detect_dsm_zones(lat, lon):
+    with metrics.timer("zone_detection", "dsm", np.size(lat)):
+        return DSM_INDEX.classify(lat, lon)
+
+
+def detect_wgs84_zones(lat, lon):
+    with metrics.timer("zone_detection", "wgs84", np.size(lat)):
+        return WGS84_INDEX.classify(lat, lon)
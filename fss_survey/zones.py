@@ -0,0 +1,78 @@
+"""Zone tables for the Kalianpur (ESM), DSM and WGS84 grid systems, and
+point-in-zone lookups.
+
+Zones are matched in table order and the first match wins, so where
+bounds overlap the earlier entry takes precedence.
+"""
+
+# --- ZONE DEFINITIONS (Ported exactly from Kivy App) ---
+
+ENHANCED_KALIANPUR_ZONES = {
+    'Zone I': {'epsg': 24378, 'bounds': {'lat_min': 28.0, 'lat_max': 35.51, 'lon_min': 70.35, 'lon_max': 81.64}, 'description': 'Northern India (J&K, HP, Punjab, Haryana, Uttarakhand, North UP)', 'central_meridian': 78.0},
+    'Zone IIa': {'epsg': 24379, 'bounds': {'lat_min': 21.0, 'lat_max': 28.01, 'lon_min': 68.13, 'lon_max': 82.01}, 'description': 'Northwest India (Rajasthan, Gujarat, West MP, South UP)', 'central_meridian': 75.0},
+    'Zone IIb': {'epsg': 24380, 'bounds': {'lat_min': 21.0, 'lat_max': 29.47, 'lon_min': 82.0, 'lon_max': 97.42}, 'description': 'Northeast India (Assam, Meghalaya, Manipur, Mizoram)', 'central_meridian': 90.0},
+    'Zone IIIa': {'epsg': 24381, 'bounds': {'lat_min': 15.0, 'lat_max': 21.01, 'lon_min': 70.14, 'lon_max': 87.15}, 'description': 'Central India (Maharashtra, East MP, Chhattisgarh)', 'central_meridian': 78.0},
+    'Zone IIIb': {'epsg': 24382, 'bounds': {'lat_min': 15.0, 'lat_max': 21.01, 'lon_min': 87.15, 'lon_max': 97.42}, 'description': 'East Central India (Jharkhand, Odisha, East Bengal)', 'central_meridian': 92.0},
+    'Zone IVa': {'epsg': 24383, 'bounds': {'lat_min': 8.02, 'lat_max': 15.01, 'lon_min': 73.94, 'lon_max': 80.4}, 'description': 'Southwest India (Karnataka, Kerala, Tamil Nadu West)', 'central_meridian': 77.0},
+    'Zone IVb': {'epsg': 24384, 'bounds': {'lat_min': 8.02, 'lat_max': 15.01, 'lon_min': 80.4, 'lon_max': 87.18}, 'description': 'Southeast India (Andhra Pradesh, Tamil Nadu East)', 'central_meridian': 84.0},
+    'Zone Va': {'epsg': 24385, 'bounds': {'lat_min': 5.0, 'lat_max': 8.02, 'lon_min': 73.94, 'lon_max': 80.4}, 'description': 'Far South India (South Kerala, South Tamil Nadu)', 'central_meridian': 77.0},
+    'Zone Vb': {'epsg': 24386, 'bounds': {'lat_min': 5.0, 'lat_max': 8.02, 'lon_min': 80.4, 'lon_max': 87.18}, 'description': 'Far Southeast India (South Tamil Nadu, South Andhra)', 'central_meridian': 84.0}
+}
+
+DSM_LCC_ZONES = {
+    "5C": {"epsg": 2001, "extent": (68.00, 36.00, 76.00, 42.00)}, "5D": {"epsg": 2007, "extent": (68.00, 30.00, 76.00, 36.00)},
+    "5E": {"epsg": 2013, "extent": (68.00, 24.00, 76.00, 30.00)}, "5F": {"epsg": 2019, "extent": (68.00, 18.00, 76.00, 24.00)},
+    "5G": {"epsg": 2025, "extent": (68.00, 12.00, 76.00, 18.00)}, "5H": {"epsg": 2031, "extent": (68.00, 6.00, 76.00, 12.00)},
+    "6C": {"epsg": 2002, "extent": (76.00, 36.00, 84.00, 42.00)}, "6D": {"epsg": 2008, "extent": (76.00, 30.00, 84.00, 36.00)},
+    "6E": {"epsg": 2014, "extent": (76.00, 24.00, 84.00, 30.00)}, "6F": {"epsg": 2020, "extent": (76.00, 18.00, 84.00, 24.00)},
+    "6G": {"epsg": 2026, "extent": (76.00, 12.00, 84.00, 18.00)}, "6H": {"epsg": 2032, "extent": (76.00, 6.00, 84.00, 12.00)},
+    "7C": {"epsg": 2003, "extent": (84.00, 36.00, 92.00, 42.00)}, "7D": {"epsg": 2009, "extent": (84.00, 30.00, 92.00, 36.00)},
+    "7E": {"epsg": 2015, "extent": (84.00, 24.00, 92.00, 30.00)}, "7F": {"epsg": 2021, "extent": (84.00, 18.00, 92.00, 24.00)},
+    "7G": {"epsg": 2027, "extent": (84.00, 12.00, 92.00, 18.00)}, "7H": {"epsg": 2033, "extent": (84.00, 6.00, 92.00, 12.00)},
+    "8C": {"epsg": 2004, "extent": (92.00, 36.00, 100.00, 42.00)}, "8D": {"epsg": 2010, "extent": (92.00, 30.00, 100.00, 36.00)},
+    "8E": {"epsg": 2016, "extent": (92.00, 24.00, 100.00, 30.00)}, "8F": {"epsg": 2022, "extent": (92.00, 18.00, 100.00, 24.00)},
+    "8G": {"epsg": 2028, "extent": (92.00, 12.00, 100.00, 18.00)}, "8H": {"epsg": 2034, "extent": (92.00, 6.00, 100.00, 12.00)},
+}
+
+WGS84_ZONES = {
+    'India Northeast': {'epsg': 7771, 'bounds': {'lat_min': 21.94, 'lat_max': 29.47, 'lon_min': 89.69, 'lon_max': 97.42}},
+    'India NSF LCC': {'epsg': 7755, 'bounds': {'lat_min': 3.87, 'lat_max': 35.51, 'lon_min': 65.6, 'lon_max': 97.42}},
+    'Uttar Pradesh': {'epsg': 7775, 'bounds': {'lat_min': 25.0, 'lat_max': 31.5, 'lon_min': 78.0, 'lon_max': 84.0}},
+    'Kerala': {'epsg': 7781, 'bounds': {'lat_min': 8.0, 'lat_max': 13.0, 'lon_min': 74.0, 'lon_max': 77.0}},
+    'Lakshadweep': {'epsg': 7782, 'bounds': {'lat_min': 10.0, 'lat_max': 13.0, 'lon_min': 71.0, 'lon_max': 74.0}},
+    'Tamil Nadu': {'epsg': 7785, 'bounds': {'lat_min': 8.02, 'lat_max': 13.59, 'lon_min': 76.22, 'lon_max': 80.4}},
+    'Jammu and Kashmir': {'epsg': 7764, 'bounds': {'lat_min': 32.0, 'lat_max': 37.0, 'lon_min': 73.0, 'lon_max': 78.0}},
+    'Gujarat': {'epsg': 7761, 'bounds': {'lat_min': 20.0, 'lat_max': 24.0, 'lon_min': 68.0, 'lon_max': 74.0}},
+    'Maharashtra': {'epsg': 7767, 'bounds': {'lat_min': 17.0, 'lat_max': 22.0, 'lon_min': 72.0, 'lon_max': 80.0}},
+}
+
+DSM_PARAMS = {
+    "5": {"central_meridian": 72, "latitude_of_origin": 4, "false_easting": 500000, "false_northing": -2010760, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"},
+    "6": {"central_meridian": 80, "latitude_of_origin": 4, "false_easting": 500010, "false_northing": -2010750, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"},
+    "7": {"central_meridian": 88, "latitude_of_origin": 4, "false_easting": 500000, "false_northing": -2010760, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"},
+    "8": {"central_meridian": 96, "latitude_of_origin": 4, "false_easting": 500000, "false_northing": -2010760, "scale_factor": 0.9999, "semi_major": 6377276.345, "semi_minor": 6356075.413, "projection": "tmerc"}
+}
+
+
+def detect_kalianpur_zone(lat, lon):
+    for zone_name, zone_info in ENHANCED_KALIANPUR_ZONES.items():
+        bounds = zone_info['bounds']
+        if bounds['lat_min'] <= lat <= bounds['lat_max'] and bounds['lon_min'] <= lon <= bounds['lon_max']:
+            return zone_name, zone_info['epsg'], zone_info['description']
+    return None, None, None
+
+
+def detect_dsm_zone(lat, lon):
+    for zone_name, zone_info in DSM_LCC_ZONES.items():
+        extent = zone_info['extent']
+        if extent[1] <= lat <= extent[3] and extent[0] <= lon <= extent[2]:
+            return zone_name, zone_info['epsg']
+    return None, None
+
+
+def detect_wgs84_zone(lat, lon):
+    for zone_name, zone_info in WGS84_ZONES.items():
+        bounds = zone_info['bounds']
+        if bounds['lat_min'] <= lat <= bounds['lat_max'] and bounds['lon_min'] <= lon <= bounds['lon_max']:
+            return zone_name, zone_info['epsg']
+    return None, None